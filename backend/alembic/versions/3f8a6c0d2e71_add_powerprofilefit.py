@@ -0,0 +1,47 @@
+"""Add PowerProfileFit
+
+Revision ID: 3f8a6c0d2e71
+Revises: 9d4b7e21c6a8
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8a6c0d2e71'
+down_revision: Union[str, None] = '9d4b7e21c6a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('powerprofilefit',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('max_watts', sa.LargeBinary(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.Column('cp', sa.Float(), nullable=True),
+    sa.Column('w_prime', sa.Float(), nullable=True),
+    sa.Column('cp_3p', sa.Float(), nullable=True),
+    sa.Column('w_prime_3p', sa.Float(), nullable=True),
+    sa.Column('pmax', sa.Float(), nullable=True),
+    sa.Column('ftp', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'period', name='unique_user_profile_period')
+    )
+    op.create_index(op.f('ix_powerprofilefit_period'), 'powerprofilefit', ['period'], unique=False)
+    op.create_index(op.f('ix_powerprofilefit_user_id'), 'powerprofilefit', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_powerprofilefit_user_id'), table_name='powerprofilefit')
+    op.drop_index(op.f('ix_powerprofilefit_period'), table_name='powerprofilefit')
+    op.drop_table('powerprofilefit')
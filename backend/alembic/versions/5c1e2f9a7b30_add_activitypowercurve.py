@@ -0,0 +1,40 @@
+"""Add ActivityPowerCurve
+
+Revision ID: 5c1e2f9a7b30
+Revises: 26fb1a703709
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e2f9a7b30'
+down_revision: Union[str, None] = '26fb1a703709'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('activitypowercurve',
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('max_watts', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('activity_id')
+    )
+    op.create_index(op.f('ix_activitypowercurve_date'), 'activitypowercurve', ['date'], unique=False)
+    op.create_index(op.f('ix_activitypowercurve_owner_id'), 'activitypowercurve', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_activitypowercurve_owner_id'), table_name='activitypowercurve')
+    op.drop_index(op.f('ix_activitypowercurve_date'), table_name='activitypowercurve')
+    op.drop_table('activitypowercurve')
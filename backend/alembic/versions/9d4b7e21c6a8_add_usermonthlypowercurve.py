@@ -0,0 +1,40 @@
+"""Add UserMonthlyPowerCurve
+
+Revision ID: 9d4b7e21c6a8
+Revises: 5c1e2f9a7b30
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b7e21c6a8'
+down_revision: Union[str, None] = '5c1e2f9a7b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('usermonthlypowercurve',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('max_watts', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'month', name='unique_user_month_curve')
+    )
+    op.create_index(op.f('ix_usermonthlypowercurve_month'), 'usermonthlypowercurve', ['month'], unique=False)
+    op.create_index(op.f('ix_usermonthlypowercurve_user_id'), 'usermonthlypowercurve', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_usermonthlypowercurve_user_id'), table_name='usermonthlypowercurve')
+    op.drop_index(op.f('ix_usermonthlypowercurve_month'), table_name='usermonthlypowercurve')
+    op.drop_table('usermonthlypowercurve')
@@ -0,0 +1,37 @@
+"""Add heart rate curves, histograms and zones
+
+Revision ID: a4d7e9b2c618
+Revises: f0c2d8e6a413
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d7e9b2c618'
+down_revision: Union[str, None] = 'f0c2d8e6a413'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('hr_zones', sa.JSON(), nullable=True))
+    op.add_column('activitypowercurve', sa.Column('max_bpm', sa.LargeBinary(), nullable=True))
+    op.add_column('activitypowercurve', sa.Column('hr_offsets', sa.LargeBinary(), nullable=True))
+    op.add_column('activitypowercurve', sa.Column('hr_histogram', sa.LargeBinary(), nullable=True))
+    op.add_column('usermonthlypowercurve', sa.Column('max_bpm', sa.LargeBinary(), nullable=True))
+    op.add_column('usermonthlypowercurve', sa.Column('hr_histogram', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('usermonthlypowercurve', 'hr_histogram')
+    op.drop_column('usermonthlypowercurve', 'max_bpm')
+    op.drop_column('activitypowercurve', 'hr_histogram')
+    op.drop_column('activitypowercurve', 'hr_offsets')
+    op.drop_column('activitypowercurve', 'max_bpm')
+    op.drop_column('user', 'hr_zones')
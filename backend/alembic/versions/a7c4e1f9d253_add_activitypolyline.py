@@ -0,0 +1,38 @@
+"""Add activity polylines
+
+Revision ID: a7c4e1f9d253
+Revises: f3a9d2c7b184
+Create Date: 2026-10-20 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e1f9d253'
+down_revision: Union[str, None] = 'f3a9d2c7b184'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('activitypolyline',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('tolerance', sa.Float(), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.Column('polyline', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('activity_id', 'tolerance', name='unique_activity_polyline_tolerance')
+    )
+    op.create_index(op.f('ix_activitypolyline_activity_id'), 'activitypolyline', ['activity_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_activitypolyline_activity_id'), table_name='activitypolyline')
+    op.drop_table('activitypolyline')
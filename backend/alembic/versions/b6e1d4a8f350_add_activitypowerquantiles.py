@@ -0,0 +1,35 @@
+"""Add activity power quantiles
+
+Revision ID: b6e1d4a8f350
+Revises: d2f7a4c9e816
+Create Date: 2026-10-23 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d4a8f350'
+down_revision: Union[str, None] = 'd2f7a4c9e816'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('activitypowerquantiles',
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('laps', sa.Integer(), nullable=False),
+    sa.Column('quantiles', sa.LargeBinary(), nullable=False),
+    sa.Column('lap_quantiles', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.PrimaryKeyConstraint('activity_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('activitypowerquantiles')
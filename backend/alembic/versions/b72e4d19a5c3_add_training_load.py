@@ -0,0 +1,43 @@
+"""Add training load columns and TrainingLoadSeries
+
+Revision ID: b72e4d19a5c3
+Revises: 3f8a6c0d2e71
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b72e4d19a5c3'
+down_revision: Union[str, None] = '3f8a6c0d2e71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('trainingloadseries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('start_day', sa.Date(), nullable=False),
+    sa.Column('daily_tss', sa.LargeBinary(), nullable=False),
+    sa.Column('ctl', sa.LargeBinary(), nullable=False),
+    sa.Column('atl', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.add_column('activitytable', sa.Column('normalized_power', sa.Float(), nullable=True))
+    op.add_column('activitytable', sa.Column('intensity_factor', sa.Float(), nullable=True))
+    op.add_column('activitytable', sa.Column('tss', sa.Float(), nullable=True))
+    op.add_column('user', sa.Column('threshold_heartrate', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'threshold_heartrate')
+    op.drop_column('activitytable', 'tss')
+    op.drop_column('activitytable', 'intensity_factor')
+    op.drop_column('activitytable', 'normalized_power')
+    op.drop_table('trainingloadseries')
@@ -0,0 +1,60 @@
+"""Add distance best efforts
+
+Revision ID: c6e1f4a8d035
+Revises: a4d7e9b2c618
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e1f4a8d035'
+down_revision: Union[str, None] = 'a4d7e9b2c618'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('activitydistanceeffort',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('distance', sa.Integer(), nullable=False),
+    sa.Column('seconds', sa.Float(), nullable=False),
+    sa.Column('start_offset', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_activitydistanceeffort_activity_id'), 'activitydistanceeffort', ['activity_id'], unique=False)
+    op.create_index('ix_activitydistanceeffort_owner_distance_date', 'activitydistanceeffort', ['owner_id', 'distance', 'date'], unique=False)
+    op.create_table('userdistancebest',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('distance', sa.Integer(), nullable=False),
+    sa.Column('seconds', sa.Float(), nullable=False),
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('start_offset', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'period', 'distance', name='unique_user_period_distance')
+    )
+    op.create_index(op.f('ix_userdistancebest_activity_id'), 'userdistancebest', ['activity_id'], unique=False)
+    op.create_index(op.f('ix_userdistancebest_user_id'), 'userdistancebest', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_userdistancebest_user_id'), table_name='userdistancebest')
+    op.drop_index(op.f('ix_userdistancebest_activity_id'), table_name='userdistancebest')
+    op.drop_table('userdistancebest')
+    op.drop_index('ix_activitydistanceeffort_owner_distance_date', table_name='activitydistanceeffort')
+    op.drop_index(op.f('ix_activitydistanceeffort_activity_id'), table_name='activitydistanceeffort')
+    op.drop_table('activitydistanceeffort')
@@ -0,0 +1,51 @@
+"""Add personal heatmap tiles
+
+Revision ID: c8e3b5f1d947
+Revises: a7c4e1f9d253
+Create Date: 2026-10-21 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e3b5f1d947'
+down_revision: Union[str, None] = 'a7c4e1f9d253'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('userheatmaptile',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('zoom', sa.Integer(), nullable=False),
+    sa.Column('x', sa.Integer(), nullable=False),
+    sa.Column('y', sa.Integer(), nullable=False),
+    sa.Column('pixels', sa.LargeBinary(), nullable=False),
+    sa.Column('counts', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'zoom', 'x', 'y', name='unique_user_heatmap_tile')
+    )
+    op.create_index(op.f('ix_userheatmaptile_user_id'), 'userheatmaptile', ['user_id'], unique=False)
+    op.create_table('heatmapactivity',
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('activity_id')
+    )
+    op.create_index(op.f('ix_heatmapactivity_owner_id'), 'heatmapactivity', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_heatmapactivity_owner_id'), table_name='heatmapactivity')
+    op.drop_table('heatmapactivity')
+    op.drop_index(op.f('ix_userheatmaptile_user_id'), table_name='userheatmaptile')
+    op.drop_table('userheatmaptile')
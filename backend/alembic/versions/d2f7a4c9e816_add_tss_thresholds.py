@@ -0,0 +1,28 @@
+"""Add the thresholds of the stored TSS
+
+Revision ID: d2f7a4c9e816
+Revises: c8e3b5f1d947
+Create Date: 2026-10-22 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f7a4c9e816'
+down_revision: Union[str, None] = 'c8e3b5f1d947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('activitytable', sa.Column('tss_ftp', sa.Float(), nullable=True))
+    op.add_column('activitytable', sa.Column('tss_threshold_heartrate', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('activitytable', 'tss_threshold_heartrate')
+    op.drop_column('activitytable', 'tss_ftp')
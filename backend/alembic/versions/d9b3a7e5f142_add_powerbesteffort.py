@@ -0,0 +1,44 @@
+"""Add power best efforts
+
+Revision ID: d9b3a7e5f142
+Revises: c6e1f4a8d035
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b3a7e5f142'
+down_revision: Union[str, None] = 'c6e1f4a8d035'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('powerbesteffort',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=False),
+    sa.Column('watts', sa.Float(), nullable=False),
+    sa.Column('start_offset', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_powerbesteffort_activity_id'), 'powerbesteffort', ['activity_id'], unique=False)
+    op.create_index('ix_powerbesteffort_owner_duration_watts', 'powerbesteffort', ['owner_id', 'duration', 'watts'], unique=False)
+    op.create_index('ix_powerbesteffort_owner_duration_date', 'powerbesteffort', ['owner_id', 'duration', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_powerbesteffort_owner_duration_date', table_name='powerbesteffort')
+    op.drop_index('ix_powerbesteffort_owner_duration_watts', table_name='powerbesteffort')
+    op.drop_index(op.f('ix_powerbesteffort_activity_id'), table_name='powerbesteffort')
+    op.drop_table('powerbesteffort')
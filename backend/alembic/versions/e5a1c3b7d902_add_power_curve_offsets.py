@@ -0,0 +1,29 @@
+"""Add best effort offsets to ActivityPowerCurve
+
+Revision ID: e5a1c3b7d902
+Revises: b72e4d19a5c3
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a1c3b7d902'
+down_revision: Union[str, None] = 'b72e4d19a5c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('activitypowercurve', sa.Column('offsets', sa.LargeBinary(), nullable=True))
+    op.add_column('activitypowercurve', sa.Column('start_time', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('activitypowercurve', 'start_time')
+    op.drop_column('activitypowercurve', 'offsets')
@@ -0,0 +1,50 @@
+"""Add activity climbs
+
+Revision ID: e8f2c5b1a796
+Revises: d9b3a7e5f142
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f2c5b1a796'
+down_revision: Union[str, None] = 'd9b3a7e5f142'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('activityclimb',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('from_ix', sa.Integer(), nullable=False),
+    sa.Column('to_ix', sa.Integer(), nullable=False),
+    sa.Column('start_offset', sa.Float(), nullable=True),
+    sa.Column('start_distance', sa.Float(), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.Column('elevation_gain', sa.Float(), nullable=False),
+    sa.Column('avg_gradient', sa.Float(), nullable=False),
+    sa.Column('max_gradient', sa.Float(), nullable=False),
+    sa.Column('duration', sa.Float(), nullable=True),
+    sa.Column('vam', sa.Float(), nullable=True),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_activityclimb_activity_id'), 'activityclimb', ['activity_id'], unique=False)
+    op.create_index('ix_activityclimb_owner_date', 'activityclimb', ['owner_id', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_activityclimb_owner_date', table_name='activityclimb')
+    op.drop_index(op.f('ix_activityclimb_activity_id'), table_name='activityclimb')
+    op.drop_table('activityclimb')
@@ -0,0 +1,29 @@
+"""Add power histograms to the stored power curves
+
+Revision ID: f0c2d8e6a413
+Revises: e5a1c3b7d902
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0c2d8e6a413'
+down_revision: Union[str, None] = 'e5a1c3b7d902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('activitypowercurve', sa.Column('histogram', sa.LargeBinary(), nullable=True))
+    op.add_column('usermonthlypowercurve', sa.Column('histogram', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('usermonthlypowercurve', 'histogram')
+    op.drop_column('activitypowercurve', 'histogram')
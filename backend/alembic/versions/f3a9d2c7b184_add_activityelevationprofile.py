@@ -0,0 +1,42 @@
+"""Add activity elevation profiles
+
+Revision ID: f3a9d2c7b184
+Revises: e8f2c5b1a796
+Create Date: 2026-10-19 23:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d2c7b184'
+down_revision: Union[str, None] = 'e8f2c5b1a796'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('activityelevationprofile',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('lowest', sa.Float(), nullable=False),
+    sa.Column('highest', sa.Float(), nullable=False),
+    sa.Column('distance', sa.LargeBinary(), nullable=False),
+    sa.Column('altitude', sa.LargeBinary(), nullable=False),
+    sa.Column('gradient', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activitytable.activity_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('activity_id', 'points', name='unique_activity_profile_points')
+    )
+    op.create_index(op.f('ix_activityelevationprofile_activity_id'), 'activityelevationprofile', ['activity_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_activityelevationprofile_activity_id'), table_name='activityelevationprofile')
+    op.drop_table('activityelevationprofile')
@@ -2,7 +2,7 @@
 """
 
 import os
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, Union, Sequence, List
 
 from pydantic import BaseModel, EmailStr
@@ -34,14 +34,18 @@ class UserCreate(UserLogin):
 class UserUpdate(BaseModel):
     fullname: Optional[str] = None
     ftp: Optional[int] = None
+    threshold_heartrate: Optional[int] = None
     power_zones: Optional[List[int]] = None
+    hr_zones: Optional[List[int]] = None
     power_curve: Optional[dict] = None
 
 class User(UserCreate, table=True):
     id: int = Field(default=None, primary_key=True)
     ftp: Optional[int] = Field(default=None)
     ftp: Optional[int] = Field(default=None)
+    threshold_heartrate: Optional[int] = Field(default=None) # Lactate threshold HR, for HR based TSS
     power_zones: Optional[List[int]] = Field(default=None, sa_column=Column(JSON))
+    hr_zones: Optional[List[int]] = Field(default=None, sa_column=Column(JSON)) # Upper bpm of each HR zone
     power_curve: Optional[dict] = Field(default=None, sa_column=Column(JSON))
 
 class UserProfile(BaseModel):
@@ -50,11 +54,13 @@ class UserProfile(BaseModel):
     fullname: Optional[str] = None
     ftp: Optional[int] = None
     ftp: Optional[int] = None
+    threshold_heartrate: Optional[int] = None
     power_zones: Optional[List[int]] = None
+    hr_zones: Optional[List[int]] = None
     power_curve: Optional[dict] = None
 
 # Import UniqueConstraint for table args
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 
 class HistoricalStats(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -110,6 +116,7 @@ class ElevationSummary(BaseModel):
     highest: Optional[float] = None
     elev_series: Sequence[Optional[float]]
     dist_series: Sequence[Optional[float]]
+    gradient_series: Optional[Sequence[Optional[float]]] = None # %, on the distance-uniform profile
 
 class Climb(BaseModel):
     from_ix: int
@@ -134,6 +141,7 @@ class ActivitySummary(BaseModel):
     power_summary: Optional[PowerSummary] = None
     elev_summary: Optional[ElevationSummary] = None
     time_in_zones: Optional[List[float]] = None
+    time_in_hr_zones: Optional[List[float]] = None
     average_heartrate: Optional[float] = None
     max_heartrate: Optional[float] = None
     average_temperature: Optional[float] = None
@@ -160,6 +168,11 @@ class ActivityBase(SQLModel):
     average_temperature: Optional[float] = Field(default=None)
     val_hash: Optional[str] = Field(default=None, index=True)
 
+    # Training load, computed at ingest with the owner's FTP (or threshold HR)
+    normalized_power: Optional[float] = Field(default=None)
+    intensity_factor: Optional[float] = Field(default=None)
+    tss: Optional[float] = Field(default=None)
+
 class ActivityResponse(BaseModel):
     activity_base: Optional[ActivityBase] = None
     activity_analysis: Optional[ActivitySummary] = None
@@ -176,6 +189,226 @@ class ActivityTable(ActivityBase, table=True):
     laps_data: Optional[bytes] = Field(default=None)
     fit_file: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
     fit_file_parsed_at: Optional[datetime] = Field(default=None, nullable=True)
+    # User thresholds the stored NP/IF/TSS were computed with
+    tss_ftp: Optional[float] = Field(default=None)
+    tss_threshold_heartrate: Optional[float] = Field(default=None)
+
+class ActivityPowerCurve(SQLModel, table=True):
+    """Mean-maximal power and heart rate curves and histograms of an activity, stored at ingest."""
+    activity_id: str = Field(primary_key=True, foreign_key="activitytable.activity_id")
+    owner_id: int = Field(foreign_key="user.id", index=True)
+    date: datetime = Field(index=True) # Activity date, used by the period curves
+    # power.STORED_CURVE_VERSION the curve was computed with
+    version: int = Field(...)
+    # float64 max watts on the leading power.STORED_CURVE_DURATIONS
+    max_watts: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    # int64 start offsets (s from start_time) of the best window of each duration
+    offsets: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    start_time: Optional[datetime] = Field(default=None) # First second of the power data, UTC
+    # float64 seconds per 1 W bin (power.power_histogram)
+    histogram: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    # Heart rate counterparts: float64 max bpm, int64 offsets and seconds per 1 bpm bin
+    max_bpm: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    hr_offsets: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    hr_histogram: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+
+class UserMonthlyPowerCurve(SQLModel, table=True):
+    """Best power and heart rate curves and summed histograms of a user's activities in one calendar month."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    month: str = Field(index=True) # "2025-01"
+    # power.STORED_CURVE_VERSION of the merged curves
+    version: int = Field(...)
+    # float64 max watts on the leading power.STORED_CURVE_DURATIONS
+    max_watts: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    # float64 seconds per 1 W bin, summed over the month's activities
+    histogram: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    # Heart rate counterparts: float64 max bpm and seconds per 1 bpm bin
+    max_bpm: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    hr_histogram: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "month", name="unique_user_month_curve"),
+    )
+
+class PowerBestEffort(SQLModel, table=True):
+    """Best power of an activity at one of power.POWER_CURVE_DURATIONS, from its stored curve."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    owner_id: int = Field(foreign_key="user.id")
+    activity_id: str = Field(foreign_key="activitytable.activity_id", index=True)
+    duration: int = Field(...) # s
+    watts: float = Field(...)
+    start_offset: int = Field(...) # s from ActivityPowerCurve.start_time
+    date: datetime = Field(...) # Activity date
+
+    __table_args__ = (
+        # Top-K of a duration over all time, and over a date range
+        Index("ix_powerbesteffort_owner_duration_watts", "owner_id", "duration", "watts"),
+        Index("ix_powerbesteffort_owner_duration_date", "owner_id", "duration", "date"),
+    )
+
+class PowerProfile(BaseModel):
+    # 2-parameter Critical Power model
+    cp: Optional[float] = None
+    w_prime: Optional[float] = None
+    # 3-parameter Critical Power model
+    cp_3p: Optional[float] = None
+    w_prime_3p: Optional[float] = None
+    pmax: Optional[float] = None
+    ftp: Optional[float] = None
+
+class PowerProfileEntry(PowerProfile):
+    month: str # Last month of the window, "2025-01"
+
+class PowerProfileFit(SQLModel, table=True):
+    """PowerProfile fitted to a user's power envelope over a date window."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    # "all", "3m" (trailing, as the user power curves) or "2025-01" (history
+    # point: the critical_power.PROFILE_HISTORY_MONTHS ending with that month)
+    period: str = Field(index=True)
+    # critical_power.MODEL_VERSION of the fit
+    version: int = Field(...)
+    # Envelope (trimmed float64 max watts on power.STORED_CURVE_DURATIONS) the fit was made on
+    max_watts: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    computed_at: datetime = Field(default_factory=datetime.utcnow)
+    cp: Optional[float] = Field(default=None)
+    w_prime: Optional[float] = Field(default=None)
+    cp_3p: Optional[float] = Field(default=None)
+    w_prime_3p: Optional[float] = Field(default=None)
+    pmax: Optional[float] = Field(default=None)
+    ftp: Optional[float] = Field(default=None)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", name="unique_user_profile_period"),
+    )
+
+class TrainingLoadSeries(SQLModel, table=True):
+    """Daily TSS, CTL and ATL of a user, from the day of their first load."""
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    start_day: date = Field(...)
+    # float64 arrays, one value per day from start_day
+    daily_tss: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    ctl: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    atl: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+class ActivityDistanceEffort(SQLModel, table=True):
+    """Fastest time of an activity over one of distance_efforts.BEST_EFFORT_DISTANCES, stored at ingest."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    activity_id: str = Field(foreign_key="activitytable.activity_id", index=True)
+    owner_id: int = Field(foreign_key="user.id")
+    date: datetime = Field(...) # Activity date, used by the period bests
+    distance: int = Field(...) # m
+    seconds: float = Field(...)
+    start_offset: float = Field(...) # s from the first sample of the activity
+
+    __table_args__ = (
+        # Range bests: the efforts of one distance in a date range, then the fastest
+        Index("ix_activitydistanceeffort_owner_distance_date", "owner_id", "distance", "date"),
+    )
+
+class UserDistanceBest(SQLModel, table=True):
+    """Fastest ActivityDistanceEffort of a user per distance, all time and per calendar year."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    period: str = Field(...) # "all" or "2025"
+    distance: int = Field(...) # m
+    seconds: float = Field(...)
+    activity_id: str = Field(index=True)
+    date: datetime = Field(...)
+    start_offset: float = Field(...)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "distance", name="unique_user_period_distance"),
+    )
+
+class ActivityClimb(SQLModel, table=True):
+    """Climb of an activity (climbs.activity_climbs), stored at ingest."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    activity_id: str = Field(foreign_key="activitytable.activity_id", index=True)
+    owner_id: int = Field(foreign_key="user.id")
+    date: datetime = Field(...) # Activity date, used by the user climb stats
+    from_ix: int = Field(...) # Row positions in the activity data
+    to_ix: int = Field(...)
+    start_offset: Optional[float] = Field(default=None) # s from the first sample
+    start_distance: float = Field(...) # m
+    distance: float = Field(...) # m
+    elevation_gain: float = Field(...) # m
+    avg_gradient: float = Field(...) # %
+    max_gradient: float = Field(...) # %
+    duration: Optional[float] = Field(default=None) # s
+    vam: Optional[float] = Field(default=None) # m/h
+    category: Optional[str] = Field(default=None) # "4" (easiest) to "1", "HC"; None if uncategorized
+
+    __table_args__ = (
+        Index("ix_activityclimb_owner_date", "owner_id", "date"),
+    )
+
+class ActivityElevationProfile(SQLModel, table=True):
+    """Distance-uniform elevation profile of an activity at one resolution, stored at ingest."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    activity_id: str = Field(foreign_key="activitytable.activity_id", index=True)
+    points: int = Field(...) # Grid size, one of elevation_profiles.ELEVATION_PROFILE_RESOLUTIONS
+    # elevation_profiles.PROFILE_VERSION the profile was computed with
+    version: int = Field(...)
+    lowest: float = Field(...) # m, over all samples
+    highest: float = Field(...)
+    # float64 distance (km), altitude (m) and gradient (%) at every grid point
+    distance: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    altitude: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    gradient: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+    __table_args__ = (
+        UniqueConstraint("activity_id", "points", name="unique_activity_profile_points"),
+    )
+
+class ActivityPowerQuantiles(SQLModel, table=True):
+    """Power quantiles of an activity and of its laps, stored at ingest (see services/power_quantiles.py)."""
+    activity_id: str = Field(primary_key=True, foreign_key="activitytable.activity_id")
+    # power_quantiles.QUANTILES_VERSION the quantiles were computed with
+    version: int = Field(...)
+    laps: int = Field(default=0) # Rows of lap_quantiles
+    # float64 power at each of power.QUANTILE_LEVELS, for the activity and
+    # (laps x 101) for its laps, NaN rows for laps without power
+    quantiles: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    lap_quantiles: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+class ActivityPolyline(SQLModel, table=True):
+    """Encoded polyline of an activity track at one simplification tolerance, stored at ingest."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    activity_id: str = Field(foreign_key="activitytable.activity_id", index=True)
+    tolerance: float = Field(...) # m, one of polylines.POLYLINE_TOLERANCES
+    points: int = Field(...) # Points kept by the simplification
+    polyline: str = Field(...) # Google encoded polyline, 1e-5 degrees
+
+    __table_args__ = (
+        UniqueConstraint("activity_id", "tolerance", name="unique_activity_polyline_tolerance"),
+    )
+
+class UserHeatmapTile(SQLModel, table=True):
+    """Sparse counts of a user's personal heatmap on one slippy-map tile (see services/heatmaps.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    zoom: int = Field(...) # One of heatmaps.HEATMAP_ZOOMS
+    x: int = Field(...)
+    y: int = Field(...)
+    # uint16 pixel positions (row * 256 + column) and uint32 activity counts
+    pixels: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    counts: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    updated_at: datetime = Field(...)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "zoom", "x", "y", name="unique_user_heatmap_tile"),
+    )
+
+class HeatmapActivity(SQLModel, table=True):
+    """Activity counted in its owner's heatmap tiles."""
+    activity_id: str = Field(primary_key=True, foreign_key="activitytable.activity_id")
+    owner_id: int = Field(foreign_key="user.id", index=True)
+
+class ActivityListItem(ActivityBase):
+    """Activity of the activity list, with the thumbnail polyline if requested."""
+    polyline: Optional[str] = None
 
 class ActivityUpdate(BaseModel):
     name: Optional[str] = None
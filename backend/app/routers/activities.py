@@ -1,25 +1,71 @@
 import os
 import logging
 import msgpack
+import numpy as np
 import pandas as pd
 import hashlib
 from datetime import datetime, timezone
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Body, status
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Body, Header, Query, status
 from fastapi.responses import StreamingResponse, Response
 from sqlmodel import Session, select
 
 from app import model, fit_parsing, gpx_parsing
 from app.auth import auth_handler, crypto
 from app.database import get_db_session
-from app.services import analysis, maps, data_processing, activity_crud, stats, power, utils
+from app.services import analysis, maps, data_processing, activity_crud, stats, power, utils, http_cache, result_cache, serialization, power_curves, training_load, distance_efforts, climbs, elevation, elevation_profiles, map_renderer, polylines, heatmaps, power_quantiles
 from dateutil import parser as date_parser
 
 logger = logging.getLogger('uvicorn.error')
 
 router = APIRouter()
 
+def _fit_recomputation_pending(fit_file_parsed_at: Optional[datetime]) -> bool:
+    """
+    True if TRIGGER_FIT_RECOMPUTATION_BEFORE asks for a FIT file parsed at
+    `fit_file_parsed_at` to be parsed again on the next read.
+    """
+    env_var_str = os.getenv("TRIGGER_FIT_RECOMPUTATION_BEFORE")
+    if not env_var_str or not fit_file_parsed_at:
+        return False
+    try:
+        parsed_date = date_parser.parse(env_var_str).date()
+    except (ValueError, OverflowError):
+        return False
+    recomputation_trigger_datetime = datetime.combine(parsed_date, datetime.min.time(), tzinfo=timezone.utc)
+    if fit_file_parsed_at.tzinfo is None:
+        fit_file_parsed_at = fit_file_parsed_at.replace(tzinfo=timezone.utc)
+    return fit_file_parsed_at < recomputation_trigger_datetime
+
+
+def _check_not_modified(
+        validators,
+        if_none_match: Optional[str],
+        *variant,
+        cache_control: str = http_cache.REVALIDATE_CACHE_CONTROL):
+    """
+    Builds the ETag of an activity representation from the row validators
+    (see activity_crud.fetch_activity_validators) only. Returns
+    (etag, response) where response is a 304 if the client already holds
+    this representation, or None if it must be generated. Both are None if
+    the activity does not exist.
+    """
+    if validators is None:
+        return None, None
+    etag = http_cache.activity_etag(
+        validators.activity_id, validators.last_modified, validators.val_hash, *variant)
+    if http_cache.etag_matches(if_none_match, etag) and \
+       not _fit_recomputation_pending(validators.fit_file_parsed_at):
+        return etag, http_cache.not_modified(etag, cache_control)
+    return etag, None
+
+
+def _last_modified(validators) -> Optional[datetime]:
+    """Version of the activity for result_cache keys (None disables caching)."""
+    return validators.last_modified if validators else None
+
+
 def _trigger_activity_recomputation_if_needed(activity: model.ActivityTable, session: Session) -> bool:
     """
     Checks if an activity's FIT data needs re-computation based on an environment variable
@@ -57,6 +103,8 @@ def _trigger_activity_recomputation_if_needed(activity: model.ActivityTable, ses
             logger.warning(f"Re-computation of FIT file for activity {activity.activity_id} failed or resulted in empty data. Original data will be served.")
             return False
 
+        # Subtract the old track from the heatmap before the data is replaced
+        heatmaps.remove_activity_heat(session, activity)
         activity.data = data_processing.serialize_dataframe(recomputed_ride_df)
         summary = analysis.compute_activity_summary(ride_df=recomputed_ride_df)
 
@@ -66,6 +114,20 @@ def _trigger_activity_recomputation_if_needed(activity: model.ActivityTable, ses
         activity.average_temperature = summary.average_temperature
 
         activity.fit_file_parsed_at = datetime.now(datetime.now().astimezone().tzinfo)
+        activity.last_modified = activity.fit_file_parsed_at
+        power_curves.store_activity_curve(session, activity, recomputed_ride_df)
+        owner = session.get(model.User, activity.owner_id)
+        if owner is not None:
+            power_curves.rebuild_user_curves(session, owner)
+        training_load.remove_activity_load(session, activity)
+        training_load.apply_activity_load(activity, recomputed_ride_df, owner)
+        training_load.add_activity_load(session, activity)
+        distance_efforts.store_activity_efforts(session, activity, recomputed_ride_df)
+        climbs.store_activity_climbs(session, activity, recomputed_ride_df)
+        elevation_profiles.store_activity_profiles(session, activity, recomputed_ride_df)
+        power_quantiles.store_activity_quantiles(session, activity, recomputed_ride_df)
+        polylines.store_activity_polylines(session, activity, recomputed_ride_df)
+        heatmaps.add_activity_heat(session, activity, recomputed_ride_df)
 
         if activity.laps_data: # Check if laps_data was originally present
             go_executable = os.getenv("FIT_PARSE_GO_EXECUTABLE")
@@ -227,14 +289,23 @@ async def upload_activity(
     if laps_df is not None and not laps_df.empty:
         activity_db.laps_data = data_processing.serialize_dataframe(laps_df)
 
+    user = session.get(model.User, current_user_id.id)
+    if activity_type != "route":
+        training_load.apply_activity_load(activity_db, ride_df, user)
+
     session.add(activity_db)
 
-    # Update user power curve
-    user = session.get(model.User, current_user_id.id)
-    if user and ride_df is not None and not ride_df.empty:
-        new_curve = power.calculate_power_curve(ride_df)
-        user.power_curve = power.update_user_curves_incremental(user.power_curve, new_curve, activity_db.date)
-        session.add(user)
+    # Store the activity power curve and refresh the user curves
+    power_curves.store_activity_curve(session, activity_db, ride_df)
+    if user:
+        power_curves.rebuild_user_curves(session, user)
+    training_load.add_activity_load(session, activity_db)
+    distance_efforts.store_activity_efforts(session, activity_db, ride_df)
+    climbs.store_activity_climbs(session, activity_db, ride_df)
+    elevation_profiles.store_activity_profiles(session, activity_db, ride_df)
+    power_quantiles.store_activity_quantiles(session, activity_db, ride_df)
+    polylines.store_activity_polylines(session, activity_db, ride_df)
+    heatmaps.add_activity_heat(session, activity_db, ride_df)
         
     # Update Historical Stats
     stats.update_stats_incremental(session, current_user_id.id, activity_db, operation="add")
@@ -242,69 +313,266 @@ async def upload_activity(
 
     session.commit()
     session.refresh(activity_db)
+    if maps.has_gps_data(ride_df):
+        map_renderer.get_map_renderer().submit(activity_db.activity_id)
     return activity_db
 
 @router.get("/activity/{activity_id}", response_model=model.ActivityResponse)
 async def get_activity_endpoint(
     *,
     session: Session = Depends(get_db_session),
-    activity_id: str):
-    
-    # Using raw sqlmodel select instead of fetch_activity because we might want to check recomputation before fetching full response
-    q = select(model.ActivityTable).where(
-        model.ActivityTable.activity_id == activity_id)
-    activity = session.exec(q).first()
-    if not activity:
+    activity_id: str,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)):
+    """
+    Returns an activity with its analysis.
+
+    `fields` and `exclude` are comma separated lists of response sections
+    (activity_base, activity_analysis, power_summary, quantiles,
+    elev_summary, time_in_zones, laps, has_gps_data) or presets
+    (summary-only). Sections that are not selected are returned as null and
+    are not computed.
+    """
+    try:
+        selected_fields = analysis.resolve_activity_fields(fields, exclude)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    validators = activity_crud.fetch_activity_validators(activity_id, session)
+    if not validators:
         raise HTTPException(status_code=404, detail="Activity not found")
+    user_zones = user_hr_zones = None
+    if "time_in_zones" in selected_fields:
+        owner = session.get(model.User, validators.owner_id)
+        if owner:
+            user_zones, user_hr_zones = owner.power_zones, owner.hr_zones
+    variant = (sorted(selected_fields), user_zones, user_hr_zones)
+
+    etag, not_modified = _check_not_modified(validators, if_none_match, *variant)
+    if not_modified:
+        return not_modified
+
+    last_modified = validators.last_modified
+    if _fit_recomputation_pending(validators.fit_file_parsed_at):
+        activity = activity_crud.fetch_activity(activity_id, session)
+        if _trigger_activity_recomputation_if_needed(activity, session):
+            logging.info(f"Activity {activity_id} data was recomputed based on trigger.")
+            result_cache.invalidate_activity(activity_id)
+            last_modified = activity.last_modified
+            etag = http_cache.activity_etag(activity_id, activity.last_modified, activity.val_hash, *variant)
+
+    body = _activity_response(
+        activity_id, last_modified, tuple(sorted(selected_fields)), user_zones, user_hr_zones, session=session)
+    return serialization.SerializedJSONResponse(body, headers=http_cache.cache_headers(etag))
+
+@result_cache.cached_result("activity")
+def _activity_response(
+        activity_id: str, last_modified: Optional[datetime], fields: tuple, user_zones, user_hr_zones,
+        *, session: Session) -> bytes:
+    activity = activity_crud.fetch_activity(activity_id, session)
+    elev_summary = elevation_profiles.stored_summary(session, activity_id) if "elev_summary" in fields else None
+    quantiles = power_quantiles.stored_quantiles(session, activity_id) if "quantiles" in fields else None
+    activity_response = analysis.get_activity_response(
+        activity, include_raw_data=False, user_zones=user_zones, fields=set(fields), user_hr_zones=user_hr_zones,
+        elev_summary=elev_summary, power_quantiles=quantiles)
+    # Cached as JSON so repeated views skip model_dump and serialization.
+    # NaN/Inf are written as null.
+    return serialization.dumps(activity_response.model_dump())
+
+@router.get("/activity/{activity_id}/power-curve")
+async def get_activity_power_curve(
+    *,
+    session: Session = Depends(get_db_session),
+    activity_id: str,
+    grid: str = "standard",
+    compact: bool = False,
+    if_none_match: Optional[str] = Header(None)):
+    """
+    Mean-maximal power curve of the activity. `grid` selects the durations:
+    'standard' (1 s to 5 h), 'log' (dense log-spaced grid) or 'full' (every
+    second up to 1 h, then the log grid). Returns a list of {duration, max_watts, start_offset,
+    start_time}, or with `compact` a single object of those columns.
+    start_offset (s from the first sample) and start_time locate the best
+    window of each duration.
+    """
+    if grid not in power.POWER_CURVE_GRIDS:
+        raise HTTPException(status_code=400, detail=f"Unknown grid '{grid}'. Valid grids: {', '.join(power.POWER_CURVE_GRIDS)}")
 
-    if _trigger_activity_recomputation_if_needed(activity, session):
-        logging.info(f"Activity {activity_id} data was recomputed based on trigger.")
+    validators = activity_crud.fetch_activity_validators(activity_id, session)
+    etag, not_modified = _check_not_modified(validators, if_none_match, "power-curve", grid, compact)
+    if not_modified:
+        return not_modified
 
-    owner = session.get(model.User, activity.owner_id)
-    user_zones = owner.power_zones if owner else None
+    body = _activity_power_curve(activity_id, _last_modified(validators), grid, compact, session=session)
+    return serialization.SerializedJSONResponse(body, headers=http_cache.cache_headers(etag))
 
-    activity_response = analysis.get_activity_response(activity, include_raw_data=False, user_zones=user_zones)
-    # Convert to dict and sanitize for NaN/Inf (JSON requires null instead)
-    response_dict = activity_response.model_dump()
-    return utils.sanitize_nan(response_dict)
+@result_cache.cached_result("power-curve")
+def _activity_power_curve(activity_id: str, last_modified: Optional[datetime], grid: str, compact: bool, *, session: Session) -> bytes:
+    # fetch_activity raises 404 if not found
+    activity_df = activity_crud.fetch_activity_df(activity_id, session)
+    if compact:
+        return serialization.dumps(power.compact_power_curve(*power.calculate_power_curve_efforts(activity_df, grid)))
+    return serialization.dumps(power.calculate_power_curve(activity_df, grid))
 
-@router.get("/activity/{activity_id}/power-curve", response_model=list[dict[str, float]])
-async def get_activity_power_curve(
+@router.get("/activity/{activity_id}/hr-curve")
+async def get_activity_hr_curve(
+    *,
+    session: Session = Depends(get_db_session),
+    activity_id: str,
+    grid: str = "standard",
+    compact: bool = False,
+    if_none_match: Optional[str] = Header(None)):
+    """
+    Best sustained heart rate curve of the activity, as the power curve
+    with max_bpm instead of max_watts. Short dropouts of the HR strap (up
+    to power.MAX_SAMPLE_SECONDS) hold the last reading.
+    """
+    if grid not in power.POWER_CURVE_GRIDS:
+        raise HTTPException(status_code=400, detail=f"Unknown grid '{grid}'. Valid grids: {', '.join(power.POWER_CURVE_GRIDS)}")
+
+    validators = activity_crud.fetch_activity_validators(activity_id, session)
+    etag, not_modified = _check_not_modified(validators, if_none_match, "hr-curve", grid, compact)
+    if not_modified:
+        return not_modified
+
+    body = _activity_hr_curve(activity_id, _last_modified(validators), grid, compact, session=session)
+    return serialization.SerializedJSONResponse(body, headers=http_cache.cache_headers(etag))
+
+@result_cache.cached_result("hr-curve")
+def _activity_hr_curve(activity_id: str, last_modified: Optional[datetime], grid: str, compact: bool, *, session: Session) -> bytes:
+    activity_df = activity_crud.fetch_activity_df(activity_id, session)
+    if compact:
+        return serialization.dumps(power.compact_power_curve(
+            *power.calculate_curve_efforts(activity_df, grid, 'heart_rate'), value_key="max_bpm"))
+    return serialization.dumps(power.calculate_hr_curve(activity_df, grid))
+
+@router.get("/activity/{activity_id}/best-efforts")
+async def get_activity_best_efforts(
     *,
     session: Session = Depends(get_db_session),
     activity_id: str):
-    
-    activity = activity_crud.fetch_activity(activity_id, session)
-    # fetch_activity raises 404 if not found
-    
-    activity_df = data_processing.get_activity_df(activity)
-    power_curve = power.calculate_power_curve(activity_df)
-    
-    return power_curve
+    """
+    Fastest time of the activity over each of the standard distances it
+    covers, as {distance, seconds, activity_id, date, start_offset}.
+    Read from the efforts stored at ingest.
+    """
+    if not activity_crud.fetch_activity_validators(activity_id, session):
+        raise HTTPException(status_code=404, detail="Activity not found")
+    return distance_efforts.activity_efforts(session, activity_id)
+
+@router.get("/activity/{activity_id}/climbs", response_model=list[model.ActivityClimb])
+async def get_activity_climbs(
+    *,
+    session: Session = Depends(get_db_session),
+    activity_id: str):
+    """
+    Climbs of the activity in the order they are ridden, with distance,
+    elevation gain, average and max gradient (%), duration, VAM (m/h) and
+    category. Read from the catalogue stored at ingest.
+    """
+    if not activity_crud.fetch_activity_validators(activity_id, session):
+        raise HTTPException(status_code=404, detail="Activity not found")
+    return climbs.stored_climbs(session, activity_id)
+
+@router.get("/activity/{activity_id}/elevation-profile", response_model=model.ElevationSummary)
+async def get_activity_elevation_profile(
+    *,
+    session: Session = Depends(get_db_session),
+    activity_id: str,
+    points: int = elevation_profiles.SUMMARY_PROFILE_POINTS):
+    """
+    Elevation profile of the activity on `points` evenly spaced distances
+    (km), with altitude (m) and smoothed gradient (%) at each of them.
+    `points` is one of the stored resolutions (ELEVATION_PROFILE_RESOLUTIONS).
+    """
+    if points not in elevation_profiles.ELEVATION_PROFILE_RESOLUTIONS:
+        valid = ', '.join(str(n) for n in elevation_profiles.ELEVATION_PROFILE_RESOLUTIONS)
+        raise HTTPException(status_code=400, detail=f"Unknown resolution {points}. Valid resolutions: {valid}")
+    if not activity_crud.fetch_activity_validators(activity_id, session):
+        raise HTTPException(status_code=404, detail="Activity not found")
+    profile = elevation_profiles.stored_summary(session, activity_id, points)
+    if profile is None:
+        # Not stored yet; the stats recalculation backfills it
+        activity = activity_crud.fetch_activity(activity_id, session)
+        if activity.data:
+            activity_df = data_processing.deserialize_dataframe(
+                activity.data, columns=elevation_profiles.PROFILE_COLUMNS)
+            profile = elevation.profile_summary(activity_df, points)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Activity has no elevation data")
+    return profile
+
+@router.get("/activity/{activity_id}/polyline")
+async def get_activity_polyline(
+    *,
+    session: Session = Depends(get_db_session),
+    activity_id: str,
+    zoom: Optional[float] = Query(None, ge=0, le=24)):
+    """
+    Track of the activity as a Google encoded polyline, {tolerance,
+    points, polyline}. With `zoom`, the simplification is the coarsest
+    stored one that stays within half a pixel at that zoom; without it,
+    the most detailed one.
+    """
+    if not activity_crud.fetch_activity_validators(activity_id, session):
+        raise HTTPException(status_code=404, detail="Activity not found")
+    polyline = polylines.stored_polyline(session, activity_id, zoom)
+    if polyline is None:
+        # Not stored yet; the stats recalculation backfills it
+        activity = activity_crud.fetch_activity(activity_id, session)
+        if activity.data and set(polylines.POLYLINE_COLUMNS).issubset(data_processing.dataframe_columns(activity.data)):
+            activity_df = data_processing.deserialize_dataframe(activity.data, columns=polylines.POLYLINE_COLUMNS)
+            polyline = polylines.pick_polyline(
+                polylines.activity_polylines(activity_df, polylines.POLYLINE_TOLERANCES), zoom)
+    if polyline is None:
+        raise HTTPException(status_code=404, detail="GPS data not available")
+    return polyline
 
 @router.get("/activity_map/{activity_id}")
 async def get_activity_map_endpoint(
     *,
     session: Session = Depends(get_db_session),
-    activity_id: str):
+    activity_id: str,
+    if_none_match: Optional[str] = Header(None)):
+    cache_control = http_cache.activity_map_cache_control()
+    etag, not_modified = _check_not_modified(
+        activity_crud.fetch_activity_validators(activity_id, session), if_none_match, "map",
+        cache_control=cache_control)
+    if not_modified:
+        return not_modified
+
     activity = activity_crud.fetch_activity(activity_id, session)
     if not activity.static_map:
-        activity_df = data_processing.get_activity_df(activity)
-        activity.static_map = maps.get_activity_map(ride_df=activity_df, num_samples=200)
-        if not activity.static_map:
+        if not map_renderer.has_gps_track(activity):
             raise HTTPException(status_code=404, detail="GPS data not available")
-        session.add(activity)
-        session.commit()
-    return Response(activity.static_map, media_type="image/png")
+        renderer = map_renderer.get_map_renderer()
+        retry_after = renderer.retry_after(activity_id)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Map rendering failed",
+                headers={"Retry-After": str(int(np.ceil(retry_after)))})
+        # Rendered in the background; the client retries for the map
+        renderer.submit(activity_id)
+        return Response(
+            maps.placeholder_map(), status_code=status.HTTP_202_ACCEPTED, media_type="image/png",
+            headers={"Cache-Control": "no-store", "Retry-After": "2"})
+    return Response(
+        activity.static_map, media_type="image/png",
+        headers=http_cache.cache_headers(etag, cache_control))
 
 @router.get("/activity/{activity_id}/gpx")
 async def get_activity_gpx_route(
     *,
     session: Session = Depends(get_db_session),
-    activity_id: str):
-    activity = activity_crud.fetch_activity(activity_id, session)
-    activity_df = data_processing.get_activity_df(activity)
-    gpx_content = maps.get_activity_gpx(activity_df)
+    activity_id: str,
+    if_none_match: Optional[str] = Header(None)):
+    validators = activity_crud.fetch_activity_validators(activity_id, session)
+    etag, not_modified = _check_not_modified(validators, if_none_match, "gpx")
+    if not_modified:
+        return not_modified
+
+    gpx_content = _activity_gpx(activity_id, _last_modified(validators), session=session)
 
     def iterfile():
         yield gpx_content
@@ -312,15 +580,40 @@ async def get_activity_gpx_route(
     return StreamingResponse(
         iterfile(),
         media_type="application/gpx+xml",
-        headers={"Content-Disposition": f"attachment; filename={activity_id}.gpx"}
+        headers={
+            "Content-Disposition": f"attachment; filename={activity_id}.gpx",
+            **http_cache.cache_headers(etag),
+        }
     )
 
+@result_cache.cached_result("gpx")
+def _activity_gpx(activity_id: str, last_modified: Optional[datetime], *, session: Session) -> str:
+    activity_df = activity_crud.fetch_activity_df(activity_id, session)
+    return maps.get_activity_gpx(activity_df)
+
 @router.get("/activity/{activity_id}/raw")
 async def get_activity_raw_columns(
     *,
     session: Session = Depends(get_db_session),
     activity_id: str,
-    columns: str = None):
+    columns: str = None,
+    if_none_match: Optional[str] = Header(None)):
+    validators = activity_crud.fetch_activity_validators(activity_id, session)
+    etag, not_modified = _check_not_modified(validators, if_none_match, "raw", columns)
+    if not_modified:
+        return not_modified
+
+    serialized_data = _activity_raw_columns(activity_id, _last_modified(validators), columns, session=session)
+
+    def generate_data():
+        yield serialized_data
+
+    return StreamingResponse(
+        generate_data(), media_type="application/x-msgpack",
+        headers=http_cache.cache_headers(etag))
+
+@result_cache.cached_result("raw")
+def _activity_raw_columns(activity_id: str, last_modified: Optional[datetime], columns: Optional[str], *, session: Session) -> bytes:
     activity_df = activity_crud.fetch_activity_df(activity_id, session)
     activity_dict = activity_df.to_dict(orient="list")
     if columns:
@@ -331,22 +624,33 @@ async def get_activity_raw_columns(
             "position_lat", "position_long", "temperature", "heart_rate"]
     available_cols = set(activity_df.columns)
     activity_dict = {col: activity_dict[col] for col in column_list if col in available_cols}
-    serialized_data = msgpack.packb(activity_dict)
-    
-    def generate_data():
-        yield serialized_data
-
-    return StreamingResponse(generate_data(), media_type="application/x-msgpack")
+    return msgpack.packb(activity_dict)
 
 @router.get("/activity/{activity_id}/processed_series")
 async def get_activity_processed_series(
     *,
     session: Session = Depends(get_db_session),
-    activity_id: str):
+    activity_id: str,
+    if_none_match: Optional[str] = Header(None)):
     """
     Returns time-summarized and smoothed data for charting.
     Resamples to 1Hz, applies smoothing, and then downsamples to a target point limit.
     """
+    try:
+        limit = int(os.getenv("CHART_POINTS_LIMIT", 1000))
+    except (ValueError, TypeError):
+        limit = 1000
+
+    validators = activity_crud.fetch_activity_validators(activity_id, session)
+    etag, not_modified = _check_not_modified(validators, if_none_match, "processed_series", limit)
+    if not_modified:
+        return not_modified
+
+    body = _activity_processed_series(activity_id, _last_modified(validators), limit, session=session)
+    return serialization.SerializedJSONResponse(body, headers=http_cache.cache_headers(etag))
+
+@result_cache.cached_result("processed_series")
+def _activity_processed_series(activity_id: str, last_modified: Optional[datetime], limit: int, *, session: Session) -> bytes:
     activity_df = activity_crud.fetch_activity_df(activity_id, session)
     if activity_df is None or activity_df.empty:
         raise HTTPException(status_code=404, detail="Activity data not found")
@@ -362,11 +666,6 @@ async def get_activity_processed_series(
     df_processed = data_processing.prepare_processed_series(activity_df, metrics_config)
     
     # 3. Downsample for frontend performance
-    try:
-        limit = int(os.getenv("CHART_POINTS_LIMIT", 1000))
-    except (ValueError, TypeError):
-        limit = 1000
-
     df_downsampled = data_processing.downsample_dataframe(df_processed, target_points=limit)
     
     # 4. Response Formatting
@@ -374,18 +673,17 @@ async def get_activity_processed_series(
     if not pd.api.types.is_datetime64_any_dtype(df_downsampled['timestamp']):
         df_downsampled['timestamp'] = pd.to_datetime(df_downsampled['timestamp'])
     
-    df_downsampled['time'] = df_downsampled['timestamp'].apply(lambda x: x.timestamp() if not pd.isna(x) else None)
-    
-    # Select columns and rename
-    available_metrics = [m for m in metrics_config.keys() if f"{m}_smoothed" in df_downsampled.columns]
-    rename_map = {f"{m}_smoothed": m for m in available_metrics}
-    
-    result_df = df_downsampled[['time'] + [f"{m}_smoothed" for m in available_metrics]].rename(columns=rename_map)
-    result_df = result_df.fillna(0) # Final safety for JSON
+    timestamps_ns = utils.to_epoch_ns(df_downsampled['timestamp'])
+    columns = {'time': np.where(timestamps_ns == utils.NAT_NS, 0.0, timestamps_ns / 1e9)}
 
-    return result_df.to_dict(orient="records")
+    # Select columns and rename
+    for m in metrics_config.keys():
+        if f"{m}_smoothed" in df_downsampled.columns:
+            values = pd.to_numeric(df_downsampled[f"{m}_smoothed"], errors='coerce').to_numpy(dtype=float)
+            columns[m] = np.where(np.isnan(values), 0.0, values) # Final safety for JSON
+    return serialization.dumps(serialization.records(columns))
 
-@router.get("/activities", response_model=list[model.ActivityBase])
+@router.get("/activities", response_model=list[model.ActivityListItem])
 async def get_activities(
     *,
     session: Session = Depends(get_db_session),
@@ -394,10 +692,13 @@ async def get_activities(
     search_query: Optional[str] = None,
     limit: int = 10,
     cursor_date: Optional[datetime] = None,
-    cursor_id: Optional[str] = None
+    cursor_id: Optional[str] = None,
+    polyline: bool = False
 ):
     """
     Fetches a list of activities for the current user, sorted by date descending.
+    With `polyline`, each activity includes its coarsest stored encoded
+    polyline for thumbnails.
     """
     q = select(model.ActivityTable).where(
         model.ActivityTable.owner_id == current_user_id.id)
@@ -418,6 +719,12 @@ async def get_activities(
         q = q.order_by(model.ActivityTable.date.desc(), model.ActivityTable.activity_id.desc()).limit(limit)
         results = session.exec(q).all()
 
+    if polyline:
+        thumbnails = polylines.thumbnail_polylines(session, [a.activity_id for a in results])
+        return [
+            model.ActivityListItem.model_validate(a, update={"polyline": thumbnails.get(a.activity_id)})
+            for a in results
+        ]
     return results
 
 @router.patch("/activity/{activity_id}", response_model=model.ActivityBase)
@@ -432,10 +739,20 @@ async def update_activity(
     activity_db = session.exec(q).one()
     if activity_db.owner_id != current_user_id.id:
         return Response(status_code=401)
+    old_date = activity_db.date
+    date_changed = activity_update.date is not None and activity_update.date != old_date
     activity_db.sqlmodel_update(activity_update.model_dump(exclude_unset=True))
+    activity_db.last_modified = datetime.now(datetime.now().astimezone().tzinfo)
     session.add(activity_db)
+    if date_changed:
+        power_curves.update_activity_date(session, activity_db)
+        training_load.remove_activity_load(session, activity_db, old_date)
+        training_load.add_activity_load(session, activity_db)
+        distance_efforts.update_activity_date(session, activity_db, old_date)
+        climbs.update_activity_date(session, activity_db)
     session.commit()
     session.refresh(activity_db)
+    result_cache.invalidate_activity(activity_id)
     return activity_db
 
 @router.delete("/activity/{activity_id}")
@@ -455,8 +772,22 @@ async def delete_activity(
     if activity_db.owner_id != current_user_id.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized: User doesn't own activity")
 
+    power_curves.remove_activity_curve(session, activity_db)
+    training_load.remove_activity_load(session, activity_db)
+    distance_efforts.remove_activity_efforts(session, activity_db)
+    climbs.remove_activity_climbs(session, activity_db)
+    elevation_profiles.remove_activity_profiles(session, activity_db)
+    power_quantiles.remove_activity_quantiles(session, activity_db)
+    polylines.remove_activity_polylines(session, activity_db)
+    heatmaps.remove_activity_heat(session, activity_db)
     session.delete(activity_db)
+    session.flush()
+    # Retract the activity from the user curves
+    user = session.get(model.User, activity_db.owner_id)
+    if user is not None:
+        power_curves.rebuild_user_curves(session, user)
     session.commit()
+    result_cache.invalidate_activity(activity_id)
 
     return Response(status_code=200)
 
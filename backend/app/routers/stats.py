@@ -5,7 +5,7 @@ from sqlmodel import Session, select, func
 from app import model
 from app.auth import auth_handler
 from app.database import get_db_session
-from app.services import stats
+from app.services import stats, training_load, power_curves, distance_efforts, climbs, elevation_profiles, power_quantiles, polylines, heatmaps
 
 router = APIRouter(prefix="/users/me/stats", tags=["stats"])
 
@@ -36,9 +36,22 @@ async def recalculate_stats(
     current_user_id: model.UserId = Depends(auth_handler.get_current_user_id)
 ):
     """
-    Triggers a full rebuild of the user's historical stats.
+    Triggers a full rebuild of the user's historical stats, training load
+    series and distance bests, and stores the missing climb catalogues,
+    elevation profiles, power quantiles and polylines, and adds the
+    activities missing from the heatmap.
     """
     stats.rebuild_user_stats(session, current_user_id.id)
+    user = session.get(model.User, current_user_id.id)
+    if user:
+        training_load.rebuild_user_load(session, user)
+        distance_efforts.rebuild_user_efforts(session, user)
+        climbs.backfill_user_climbs(session, user.id)
+        elevation_profiles.backfill_user_profiles(session, user.id)
+        power_quantiles.backfill_user_quantiles(session, user.id)
+        polylines.backfill_user_polylines(session, user.id)
+        heatmaps.backfill_user_heatmap(session, user.id)
+        session.commit()
     return {"status": "ok", "message": "Stats rebuilt successfully"}
 
 
@@ -155,3 +168,74 @@ async def get_training_volume(
     
     return data
 
+
+
+@router.get("/training-load")
+async def get_training_load(
+    session: Session = Depends(get_db_session),
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None)
+):
+    """
+    Returns daily TSS, CTL (fitness), ATL (fatigue) and TSB (form) from
+    the stored training load series. Defaults to the last 90 days.
+    """
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=89)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    return training_load.load_between(session, current_user_id.id, start_date, end_date)
+
+
+@router.get("/time-in-zones")
+async def get_time_in_zones(
+    session: Session = Depends(get_db_session),
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    zones: Optional[str] = Query(None, description="Comma separated zone upper bounds (W or bpm), defaults to the user's zones"),
+    metric: str = Query("power", description="'power' or 'heart_rate'")
+):
+    """
+    Returns the seconds spent in each power (or heart rate) zone by
+    activities dated from start_date to end_date (inclusive, default all
+    time). Computed from the stored histograms, so any zone configuration
+    is cheap.
+    """
+    if metric not in power_curves.METRIC_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {metric}")
+    if zones:
+        try:
+            zone_bounds = [int(z) for z in zones.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="zones must be comma separated integers")
+    else:
+        user = session.get(model.User, current_user_id.id)
+        zone_bounds = []
+        if user:
+            zone_bounds = (user.power_zones if metric == 'power' else user.hr_zones) or []
+    if not zone_bounds:
+        raise HTTPException(status_code=400, detail=f"No {metric.replace('_', ' ')} zones configured")
+    start = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
+    seconds = power_curves.time_in_zones_between(session, current_user_id.id, zone_bounds, start, end, metric)
+    return {"zones": sorted(zone_bounds), "seconds": seconds}
+
+
+@router.get("/climbs")
+async def get_climb_stats(
+    session: Session = Depends(get_db_session),
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None)
+):
+    """
+    Returns the count, distance, elevation gain, best VAM and steepest
+    gradient of the climbs of activities dated from start_date to end_date
+    (inclusive, default all time), overall and per category. Aggregated in
+    SQL from the stored climb catalogues.
+    """
+    start = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
+    return climbs.user_climb_stats(session, current_user_id.id, start, end)
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, Body
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from fastapi import APIRouter, Depends, Body, HTTPException, Query, Response
 from sqlmodel import Session
 
 from app import model
 from app.database import get_db_session
 from app.auth import auth_handler, crypto
+from app.services import power, power_curves, serialization, distance_efforts, heatmaps
 
 router = APIRouter()
 
@@ -50,3 +56,159 @@ async def update_user_me(
     session.commit()
     session.refresh(user)
     return user
+
+@router.get("/user/me/power-curve", tags=["user"])
+async def get_user_power_curve(
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    session: Session = Depends(get_db_session),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    compact: bool = False,
+    efforts: bool = False
+):
+    """
+    Best power curve over the user's activities dated in [start, end)
+    (unbounded if omitted). Answered from the stored monthly and
+    per-activity curves. Returns {duration, max_watts} records at the
+    standard durations, or with `compact` the full stored grid as
+    {duration: [...], max_watts: [...]}. With `efforts` the records also
+    hold the activity_id, start_offset and start_time of each best.
+    """
+    return _curve_response(session, current_user_id.id, start, end, compact, efforts, 'power')
+
+@router.get("/user/me/top-efforts", tags=["user"])
+async def get_user_top_efforts(
+    duration: int,
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    session: Session = Depends(get_db_session),
+    limit: int = Query(10, ge=1, le=100),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    Leaderboard of the user's best efforts at `duration` (s, one of the
+    standard power curve durations) dated in [start, end): the `limit`
+    best activities as {duration, max_watts, activity_id, start_offset,
+    date} records, read from an index.
+    """
+    if duration not in power.POWER_CURVE_DURATIONS:
+        raise HTTPException(status_code=400, detail=f"duration must be one of {list(power.POWER_CURVE_DURATIONS)}")
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return power_curves.top_efforts(session, current_user_id.id, duration, limit, start, end)
+
+@router.get("/user/me/hr-curve", tags=["user"])
+async def get_user_hr_curve(
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    session: Session = Depends(get_db_session),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    compact: bool = False,
+    efforts: bool = False
+):
+    """
+    Best sustained heart rate curve over the user's activities dated in
+    [start, end), as the power curve with max_bpm instead of max_watts.
+    """
+    return _curve_response(session, current_user_id.id, start, end, compact, efforts, 'heart_rate')
+
+@router.get("/user/me/best-efforts", tags=["user"])
+async def get_user_best_efforts(
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    session: Session = Depends(get_db_session),
+    period: str = "all",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    Fastest time over each standard distance, as {distance, seconds,
+    activity_id, date, start_offset} records. Either the stored bests of a
+    `period` ("all" or a calendar year, e.g. "2025") or the fastest efforts
+    dated in any [start, end) range, one indexed query per distance.
+    """
+    if start is not None or end is not None:
+        if start is not None and end is not None and start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        return distance_efforts.fastest_between(session, current_user_id.id, start, end)
+    try:
+        return distance_efforts.user_bests(session, current_user_id.id, period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _curve_response(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        compact: bool,
+        efforts: bool,
+        metric: str):
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if efforts:
+        return serialization.FastJSONResponse(
+            power_curves.best_efforts_between(session, user_id, start, end, metric=metric))
+    value_key = power_curves.METRIC_COLUMNS[metric][0]
+    curve = power_curves.curve_between(session, user_id, start, end, metric)
+    if compact:
+        defined = ~np.isnan(curve)
+        content = power.compact_power_curve(
+            power.STORED_CURVE_DURATIONS[defined], curve[defined], value_key=value_key)
+    else:
+        content = power.stored_curve_records(curve, value_key=value_key)
+    return serialization.FastJSONResponse(content)
+
+@router.get("/user/me/power-profile", response_model=model.PowerProfile, tags=["user"])
+async def get_user_power_profile(
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    session: Session = Depends(get_db_session),
+    period: str = "all",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    2- and 3-parameter Critical Power fits and FTP estimate of the user's
+    best power envelope. Either a named `period` ("all" or a trailing
+    period of the power curves, e.g. "3m"), whose fit is stored and reused
+    until the envelope changes, or any [start, end) range.
+    """
+    if start is not None or end is not None:
+        if start is not None and end is not None and start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        return power_curves.power_profile_between(session, current_user_id.id, start, end)
+    if period not in power_curves.profile_periods():
+        raise HTTPException(status_code=400, detail=f"Unknown period: {period}")
+    profile = power_curves.power_profile(session, current_user_id.id, period)
+    session.commit()
+    return profile
+
+@router.get("/user/me/power-profile/history", response_model=list[model.PowerProfileEntry], tags=["user"])
+async def get_user_power_profile_history(
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    session: Session = Depends(get_db_session)
+):
+    """
+    Monthly history of the power profile: for every month, the fits over
+    the PROFILE_HISTORY_MONTHS calendar months ending with it.
+    """
+    history = power_curves.power_profile_history(session, current_user_id.id)
+    session.commit()
+    return history
+
+@router.get("/user/me/heatmap/{zoom}/{x}/{y}.png", tags=["user"])
+async def get_user_heatmap_tile(
+    zoom: int,
+    x: int,
+    y: int,
+    current_user_id: model.UserId = Depends(auth_handler.get_current_user_id),
+    session: Session = Depends(get_db_session),
+):
+    """
+    Slippy-map tile of the user's personal heatmap: how many of their
+    activities pass each pixel, on a log color scale. Transparent where
+    there are none.
+    """
+    if not 0 <= zoom <= 22 or not (0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+        raise HTTPException(status_code=404, detail="Tile not found")
+    png = heatmaps.heatmap_tile(session, current_user_id.id, zoom, x, y)
+    return Response(png, media_type="image/png", headers={"Cache-Control": "private, no-cache"})
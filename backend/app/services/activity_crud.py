@@ -14,3 +14,18 @@ def fetch_activity(activity_id: str, session: Session):
 def fetch_activity_df(activity_id: str, session: Session):
     activity = fetch_activity(activity_id, session)
     return data_processing.get_activity_df(activity)
+
+def fetch_activity_validators(activity_id: str, session: Session):
+    """
+    Returns the columns used to build HTTP validators for an activity
+    (activity_id, owner_id, last_modified, val_hash, fit_file_parsed_at)
+    without loading its data blobs, or None if the activity does not exist.
+    """
+    q = select(
+        model.ActivityTable.activity_id,
+        model.ActivityTable.owner_id,
+        model.ActivityTable.last_modified,
+        model.ActivityTable.val_hash,
+        model.ActivityTable.fit_file_parsed_at,
+    ).where(model.ActivityTable.activity_id == activity_id)
+    return session.exec(q).first()
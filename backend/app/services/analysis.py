@@ -5,7 +5,7 @@ import os
 from datetime import datetime
 from typing import Sequence, Optional
 from app import model
-from app.services import utils, data_processing, maps, power, elevation
+from app.services import utils, data_processing, maps, power, elevation, summary
 from rapidfuzz import fuzz
 
 # Re-exporting for compatibility if needed, but we should update callers
@@ -24,145 +24,278 @@ from app.services.elevation import (
 )
 
 
+def _lap_value(lap_row: pd.Series, key: str):
+    value = lap_row.get(key)
+    if value is None or pd.isna(value):
+        return None
+    return float(value)
+
+
+def _optional_float(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def compute_laps_metrics(
+        laps_df: pd.DataFrame,
+        activity_df: pd.DataFrame,
+        power_distribution: Optional[power.PowerDistribution] = None,
+        lap_quantiles: Optional[np.ndarray] = None) -> list[model.LapMetrics]:
+    """
+    Computes the metrics of all laps in a single pass over the activity.
+
+    Lap boundaries are located with a binary search on the time-ordered
+    samples of the activity's power distribution, so every lap becomes a
+    contiguous slice and its sums, maxima, work and quantiles are read from
+    the same structure as the activity summary. Pass `power_distribution`
+    to share it with the activity summary. Laps without a valid start or
+    end time are skipped. `lap_quantiles` are stored quantiles of the
+    returned laps (power_quantiles.stored_quantiles), used instead of
+    computing them when they match the laps.
+    """
+    if laps_df is None or laps_df.empty or \
+       'start_time' not in laps_df.columns or 'timestamp' not in laps_df.columns or \
+       activity_df is None or 'timestamp' not in activity_df.columns:
+        return []
+
+    laps_df = laps_df[laps_df['start_time'].notna() & laps_df['timestamp'].notna()]
+    if laps_df.empty:
+        return []
+
+    lap_starts = pd.to_datetime(laps_df['start_time'])
+    lap_ends = pd.to_datetime(laps_df['timestamp'])
+
+    if power_distribution is None:
+        power_distribution = power.PowerDistribution.from_frame(activity_df)
+    power_summaries = [None] * len(laps_df)
+    max_powers = np.full(len(laps_df), np.nan)
+    if power_distribution is not None:
+        stored = lap_quantiles is not None and len(lap_quantiles) == len(laps_df)
+        power_stats = power_distribution.segment_stats(
+            utils.to_epoch_ns(lap_starts), utils.to_epoch_ns(lap_ends), include_quantiles=not stored)
+        if stored:
+            power_stats['quantiles'] = lap_quantiles
+        power_summaries = power.segment_power_summaries(power_stats)
+        max_powers = power_stats['max']
+
+    laps = []
+    for i, (lap_start, lap_end, (_, lap_row)) in enumerate(zip(lap_starts, lap_ends, laps_df.iterrows())):
+        # Missing lap max power is filled from the samples
+        max_power = _lap_value(lap_row, 'max_power')
+        if max_power is None and power_summaries[i] is not None:
+            max_power = float(max_powers[i])
+
+        laps.append(model.LapMetrics.model_construct(
+            start_time=str(lap_start),
+            timestamp=str(lap_end),
+            total_distance=_lap_value(lap_row, 'total_distance'),
+            total_elapsed_time=_lap_value(lap_row, 'total_elapsed_time'),
+            total_timer_time=_lap_value(lap_row, 'total_timer_time'),
+            avg_speed=_lap_value(lap_row, 'avg_speed'),
+            max_speed=_lap_value(lap_row, 'max_speed'),
+            total_ascent=_lap_value(lap_row, 'total_ascent'),
+            total_descent=_lap_value(lap_row, 'total_descent'),
+            max_power=max_power,
+            power_summary=power_summaries[i],
+            avg_heart_rate=_lap_value(lap_row, 'avg_heart_rate'),
+            max_heart_rate=_lap_value(lap_row, 'max_heart_rate'),
+            average_temperature=_lap_value(lap_row, 'avg_temperature')
+        ))
+    return laps
+
+
 def compute_lap_metrics(lap_data_row: pd.Series, activity_df: pd.DataFrame) -> model.LapMetrics:
-    lap_start_time = pd.to_datetime(lap_data_row['start_time'])
-    lap_end_time = pd.to_datetime(lap_data_row['timestamp'])
-
-    activity_df_copy = activity_df.copy()
-    if not pd.api.types.is_datetime64_any_dtype(activity_df_copy['timestamp']):
-        activity_df_copy['timestamp'] = pd.to_datetime(activity_df_copy['timestamp'])
-
-    lap_segment_df = activity_df_copy[
-        (activity_df_copy['timestamp'] >= lap_start_time) & \
-        (activity_df_copy['timestamp'] <= lap_end_time)
-    ].copy()
-
-    power_summary_for_lap = power.compute_power_summary(lap_segment_df)
-
-    lap_metrics_obj = model.LapMetrics(
-        start_time=str(lap_start_time),
-        timestamp=str(lap_end_time),
-        total_distance=lap_data_row.get('total_distance'),
-        total_elapsed_time=lap_data_row.get('total_elapsed_time'),
-        total_timer_time=lap_data_row.get('total_timer_time'),
-        avg_speed=lap_data_row.get('avg_speed'),
-        max_speed=lap_data_row.get('max_speed'),
-        total_ascent=lap_data_row.get('total_ascent'),
-        total_descent=lap_data_row.get('total_descent'),
-        max_power=lap_data_row.get('max_power'),
-        power_summary=power_summary_for_lap,
-        avg_heart_rate=lap_data_row.get('avg_heart_rate'),
-        max_heart_rate=lap_data_row.get('max_heart_rate'),
-        average_temperature=lap_data_row.get('avg_temperature')
-    )
-    return lap_metrics_obj
-
-
-def compute_activity_summary(ride_df: pd.DataFrame, num_samples: int = 200, user_zones: Optional[list[int]] = None):
-    total_time_seconds = len(ride_df)
-
-    elevation_gain_val = elevation.compute_elevation_gain(ride_df, tolerance=2, min_elev=4.0) if 'altitude' in ride_df.columns and not ride_df['altitude'].dropna().empty else 0.0
-
-    distance_km = (ride_df['distance'].iloc[-1] / 1000.0) if 'distance' in ride_df.columns and not ride_df['distance'].empty else 0.0
-
-    avg_speed_kmh = (ride_df['speed'].mean() * 3.6) if 'speed' in ride_df.columns and not ride_df['speed'].dropna().empty else 0.0
-
-    actual_elapsed_time_seconds = 0.0
-    if 'timestamp' in ride_df.columns and not ride_df['timestamp'].dropna().empty:
-        if not pd.api.types.is_datetime64_any_dtype(ride_df['timestamp']):
-            ride_df['timestamp'] = pd.to_datetime(ride_df['timestamp'])
-        sorted_timestamps = ride_df['timestamp'].dropna().sort_values()
-        if not sorted_timestamps.empty:
-            actual_elapsed_time_seconds = (sorted_timestamps.iloc[-1] - sorted_timestamps.iloc[0]).total_seconds()
-
-    avg_hr = None
-    max_hr = None
-    if 'heart_rate' in ride_df.columns and not ride_df['heart_rate'].dropna().empty:
-        avg_hr_tmp = ride_df['heart_rate'].mean()
-        max_hr_tmp = ride_df['heart_rate'].max()
-        if not pd.isna(avg_hr_tmp):
-            avg_hr = int(avg_hr_tmp)
-        if not pd.isna(max_hr_tmp):
-            max_hr = int(max_hr_tmp)
-
-    avg_temp = None
-    if 'temperature' in ride_df.columns and not ride_df['temperature'].dropna().empty:
-        avg_temp_tmp = ride_df['temperature'].mean()
-        if not pd.isna(avg_temp_tmp):
-            avg_temp = float(avg_temp_tmp)
-
-    summary = model.ActivitySummary(
-        distance=distance_km,
-        total_elapsed_time=actual_elapsed_time_seconds,
-        active_time=float(total_time_seconds),
-        elevation_gain=elevation_gain_val,
-        average_speed=avg_speed_kmh,
-        average_heartrate=avg_hr,
-        max_heartrate=max_hr,
-        average_temperature=avg_temp
+    laps = compute_laps_metrics(lap_data_row.to_frame().T, activity_df)
+    return laps[0] if laps else None
+
+
+def compute_activity_summary(
+        ride_df: pd.DataFrame,
+        num_samples: int = 200,
+        user_zones: Optional[list[int]] = None,
+        power_distribution: Optional[power.PowerDistribution] = None,
+        fields: Optional[set[str]] = None,
+        user_hr_zones: Optional[list[int]] = None,
+        elev_summary: Optional[model.ElevationSummary] = None):
+    """
+    Computes the activity summary. `fields` (see ACTIVITY_FIELDS) selects
+    which of the power summary, quantiles and elevation summary are
+    computed; by default all of them are. Time in zones is computed for the
+    given power and heart rate zones. A stored `elev_summary` is used
+    instead of computing it.
+    """
+    if fields is None:
+        fields = set(ACTIVITY_FIELDS)
+    arrays = summary.activity_arrays(ride_df)
+    if "power_summary" not in fields:
+        arrays.pop('power', None)
+    stats = summary.summarize_arrays(
+        arrays, len(ride_df), power_distribution,
+        include_power_quantiles="quantiles" in fields)
+    activity_summary = model.ActivitySummary.model_construct(
+        distance=stats['distance'],
+        total_elapsed_time=stats['total_elapsed_time'],
+        active_time=stats['active_time'],
+        elevation_gain=float(stats['elevation_gain']),
+        average_speed=stats['average_speed'],
+        average_heartrate=_optional_float(stats['average_heartrate']),
+        max_heartrate=_optional_float(stats['max_heartrate']),
+        average_temperature=stats['average_temperature'],
+        power_summary=stats['power_summary']
     )
 
-    summary.power_summary = power.compute_power_summary(ride_df)
-
     if user_zones:
-        summary.time_in_zones = power.calculate_time_in_zones(ride_df, user_zones)
-
-    if 'altitude' in ride_df.columns and not ride_df['altitude'].dropna().empty:
-        summary.elev_summary = elevation.elev_summary(ride_df, num_samples)
-    return summary
+        activity_summary.time_in_zones = power.calculate_time_in_zones(ride_df, user_zones)
+    if user_hr_zones:
+        activity_summary.time_in_hr_zones = power.calculate_time_in_zones(ride_df, user_hr_zones, 'heart_rate')
+
+    if "elev_summary" in fields and elev_summary is not None:
+        activity_summary.elev_summary = elev_summary
+    elif "elev_summary" in fields and 'altitude' in ride_df.columns and not ride_df['altitude'].dropna().empty:
+        activity_summary.elev_summary = elevation.elev_summary(ride_df, num_samples)
+    return activity_summary
+
+
+# Sections of ActivityResponse that can be selected with `fields`/`exclude`.
+# Sub-sections imply their parent, e.g. `quantiles` implies `power_summary`
+# and `activity_analysis`.
+ACTIVITY_FIELDS = (
+    "activity_base", "activity_analysis", "power_summary", "quantiles",
+    "elev_summary", "time_in_zones", "laps", "has_gps_data")
+_ACTIVITY_FIELD_PARENTS = {
+    "power_summary": "activity_analysis",
+    "quantiles": "power_summary",
+    "elev_summary": "activity_analysis",
+    "time_in_zones": "activity_analysis",
+}
+# Named field sets; `summary-only` is meant for list cards and previews.
+ACTIVITY_FIELD_PRESETS = {
+    "summary-only": ("activity_base", "activity_analysis", "power_summary", "has_gps_data"),
+}
+
+
+def _parse_activity_fields(value: str) -> set[str]:
+    selected = set()
+    for name in (item.strip() for item in value.split(",")):
+        if not name:
+            continue
+        if name in ACTIVITY_FIELD_PRESETS:
+            selected.update(ACTIVITY_FIELD_PRESETS[name])
+        elif name in ACTIVITY_FIELDS:
+            selected.add(name)
+        else:
+            raise ValueError(f"Unknown activity field '{name}'")
+    return selected
+
+
+def resolve_activity_fields(fields: Optional[str] = None, exclude: Optional[str] = None) -> set[str]:
+    """
+    Resolves the comma separated `fields` and `exclude` query values (field
+    names or presets) into the set of response sections to compute.
+    Raises ValueError for unknown names.
+    """
+    selected = _parse_activity_fields(fields) if fields else set(ACTIVITY_FIELDS)
+    for name in list(selected):
+        while name in _ACTIVITY_FIELD_PARENTS:
+            name = _ACTIVITY_FIELD_PARENTS[name]
+            selected.add(name)
+    if exclude:
+        excluded = _parse_activity_fields(exclude)
+        # Excluding a section also drops everything below it.
+        for name in ACTIVITY_FIELDS:
+            parent = name
+            while parent not in excluded and parent in _ACTIVITY_FIELD_PARENTS:
+                parent = _ACTIVITY_FIELD_PARENTS[parent]
+            if parent in excluded:
+                selected.discard(name)
+    return selected
+
+
+def _required_columns(fields: set[str]) -> set[str]:
+    columns = set()
+    if "activity_analysis" in fields:
+        columns.update(summary.SUMMARY_COLUMNS)
+        columns.add("timestamp")
+        if "power_summary" not in fields and "time_in_zones" not in fields:
+            columns.discard("power")
+    if "laps" in fields:
+        columns.update(("timestamp", "power"))
+    if "has_gps_data" in fields:
+        columns.update(("position_lat", "position_long"))
+    return columns
 
 
 def get_activity_response(
         activity_db: model.ActivityTable,
         include_raw_data: bool = False,
-        user_zones: Optional[list[int]] = None):
+        user_zones: Optional[list[int]] = None,
+        fields: Optional[set[str]] = None,
+        user_hr_zones: Optional[list[int]] = None,
+        elev_summary: Optional[model.ElevationSummary] = None,
+        power_quantiles: Optional[tuple[np.ndarray, np.ndarray]] = None):
+    """
+    Builds the activity response. `fields` restricts the response to the
+    given sections (see ACTIVITY_FIELDS; default all of them). Sections
+    that are not requested are left empty and never computed, and only the
+    data columns they need are deserialized. `elev_summary` is a stored
+    elevation profile (elevation_profiles.stored_summary) and
+    `power_quantiles` the stored activity and lap quantiles
+    (power_quantiles.stored_quantiles), if any.
+    """
+    if fields is None:
+        fields = set(ACTIVITY_FIELDS)
 
     activity_df = None
     if activity_db.data:
-        activity_df = data_processing.deserialize_dataframe(activity_db.data)
+        columns = None if include_raw_data else _required_columns(fields)
+        if columns is None or columns:
+            activity_df = data_processing.deserialize_dataframe(activity_db.data, columns=columns)
         if activity_df is not None and not activity_df.empty and 'timestamp' in activity_df.columns and \
            not pd.api.types.is_datetime64_any_dtype(activity_df['timestamp']):
             activity_df['timestamp'] = pd.to_datetime(activity_df['timestamp'])
 
-    if activity_df is not None and not activity_df.empty:
-        activity_analysis_summary = compute_activity_summary(activity_df, user_zones=user_zones)
-        has_gps = maps.has_gps_data(activity_df)
-    else:
-        activity_analysis_summary = model.ActivitySummary(total_elapsed_time=0, active_time=0)
-        has_gps = False
-
+    has_data = activity_df is not None and not activity_df.empty
 
-    ans = model.ActivityResponse(
-        activity_base=activity_db,
-        activity_analysis=activity_analysis_summary,
-        has_gps_data=has_gps
+    # The response is built from values computed here, so the models are
+    # constructed without validation (model_construct). Values must already
+    # have the Python types of the fields.
+    ans = model.ActivityResponse.model_construct(
+        activity_base=activity_db if "activity_base" in fields else None,
+        activity_analysis=None,
     )
 
-    if include_raw_data and activity_df is not None and not activity_df.empty:
+    if "has_gps_data" in fields and activity_df is not None:
+        # Indoor rides store all-NaN position columns
+        ans.has_gps_data = maps.has_gps_data(activity_df)
+
+    power_distribution = None
+    if has_data and ("power_summary" in fields or "laps" in fields):
+        power_distribution = power.PowerDistribution.from_frame(activity_df)
+
+    if "activity_analysis" in fields:
+        if has_data:
+            ans.activity_analysis = compute_activity_summary(
+                activity_df,
+                user_zones=user_zones if "time_in_zones" in fields else None,
+                user_hr_zones=user_hr_zones if "time_in_zones" in fields else None,
+                power_distribution=power_distribution,
+                fields=fields - {"quantiles"} if power_quantiles is not None else fields,
+                elev_summary=elev_summary)
+            power_summary = ans.activity_analysis.power_summary
+            if power_quantiles is not None and "quantiles" in fields and power_summary is not None:
+                power_summary.quantiles = power_quantiles[0].tolist()
+        else:
+            ans.activity_analysis = model.ActivitySummary(total_elapsed_time=0, active_time=0)
+
+    if include_raw_data and has_data:
         ans.activity_data = activity_df.to_json()
 
-    if activity_db.laps_data and activity_df is not None and not activity_df.empty:
+    if "laps" in fields and activity_db.laps_data and has_data:
         laps_df_raw = data_processing.deserialize_dataframe(activity_db.laps_data)
-        if laps_df_raw is not None and not laps_df_raw.empty:
-            processed_laps_list = []
-
-            if 'start_time' in laps_df_raw.columns and \
-               not pd.api.types.is_datetime64_any_dtype(laps_df_raw['start_time']):
-                 laps_df_raw['start_time'] = pd.to_datetime(laps_df_raw['start_time'])
-            if 'timestamp' in laps_df_raw.columns and \
-               not pd.api.types.is_datetime64_any_dtype(laps_df_raw['timestamp']):
-                 laps_df_raw['timestamp'] = pd.to_datetime(laps_df_raw['timestamp'])
-
-            for index, lap_row_series in laps_df_raw.iterrows():
-                if 'start_time' not in lap_row_series or pd.isna(lap_row_series['start_time']) or \
-                   'timestamp' not in lap_row_series or pd.isna(lap_row_series['timestamp']):
-                    continue
-
-                lap_metrics_instance = compute_lap_metrics(lap_row_series, activity_df)
-                processed_laps_list.append(lap_metrics_instance)
-
-            if processed_laps_list:
-                ans.laps = processed_laps_list
+        processed_laps_list = compute_laps_metrics(
+            laps_df_raw, activity_df, power_distribution,
+            power_quantiles[1] if power_quantiles is not None else None)
+        if processed_laps_list:
+            ans.laps = processed_laps_list
     return ans
 
 
@@ -0,0 +1,246 @@
+"""Climb catalogue: the climbs of each activity with gradient, VAM and category.
+
+Climbs are the elevation.detect_climbs segments of the altitude series,
+with a wider tolerance than the elevation gain so that short dips do not
+split a climb. Their lengths, gradients and times come from the cumulative
+distance and timestamp at the segment ends. The max gradient is the
+steepest MAX_GRADIENT_WINDOW of the climb: the window ending at every
+sample starts at the last sample at least that distance before it (one
+np.searchsorted over the whole activity) and each climb takes the max over
+its samples (one reduceat).
+
+Climbs are stored at ingest (model.ActivityClimb), so the activity endpoint
+and the per-user statistics are plain queries.
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select, func
+
+from app import model
+from app.services import data_processing, elevation, utils
+
+logger = logging.getLogger(__name__)
+
+# Hysteresis (m) and minimum gain (m) of a catalogued climb.
+CLIMB_TOLERANCE = 10.0
+CLIMB_MIN_GAIN = 20.0
+
+# Distance (m) over which the max gradient of a climb is measured.
+MAX_GRADIENT_WINDOW = 100.0
+
+# Category thresholds on distance (m) x average gradient (%), hardest first.
+CLIMB_CATEGORIES = (("HC", 80000.0), ("1", 64000.0), ("2", 32000.0), ("3", 16000.0), ("4", 8000.0))
+
+# Data columns the climbs are computed from.
+CLIMB_COLUMNS = ('timestamp', 'altitude', 'distance')
+
+
+def climb_category(distance: float, avg_gradient: float) -> Optional[str]:
+    """Category of a climb ("4" easiest to "1", then "HC"), None if uncategorized."""
+    score = distance * avg_gradient
+    for category, threshold in CLIMB_CATEGORIES:
+        if score >= threshold:
+            return category
+    return None
+
+
+def _climb_of(n: int, from_ix: np.ndarray) -> np.ndarray:
+    """Index of the last climb starting at or before each of `n` samples, -1 before the first."""
+    return np.searchsorted(from_ix, np.arange(n), side='right') - 1
+
+
+def _max_gradients(
+        altitude: np.ndarray,
+        distance: np.ndarray,
+        from_ix: np.ndarray,
+        to_ix: np.ndarray) -> np.ndarray:
+    """Steepest MAX_GRADIENT_WINDOW (%) inside each climb, NaN for climbs shorter than it."""
+    n = len(distance)
+    start = np.searchsorted(distance, distance - MAX_GRADIENT_WINDOW, side='right') - 1
+    has_window = start >= 0
+    start = np.maximum(start, 0)
+    span = distance - distance[start]
+    gradient = np.divide(altitude - altitude[start], span, out=np.zeros(n), where=span > 0) * 100.0
+    # Windows must start inside the climb of their end sample
+    climb = _climb_of(n, from_ix)
+    inside = has_window & (climb >= 0) & (start >= from_ix[np.maximum(climb, 0)])
+    steepest = utils.segment_reduce(np.maximum, np.where(inside, gradient, -np.inf), from_ix + 1, to_ix + 1)
+    return np.where(np.isfinite(steepest), steepest, np.nan)
+
+
+def activity_climbs(ride_df: Optional[pd.DataFrame]) -> list[dict]:
+    """
+    Climbs of an activity as {from_ix, to_ix, start_offset, start_distance,
+    distance, elevation_gain, avg_gradient, max_gradient, duration, vam,
+    category} records. Indices are row positions of `ride_df`, distances
+    in m, gradients in %, durations in s and VAM in m/h. Times are None
+    without timestamps.
+    """
+    if ride_df is None or ride_df.empty or 'altitude' not in ride_df.columns or 'distance' not in ride_df.columns:
+        return []
+    altitude = pd.to_numeric(ride_df['altitude'], errors='coerce').to_numpy(dtype=float)
+    distance = pd.to_numeric(ride_df['distance'], errors='coerce').to_numpy(dtype=float)
+    rows = np.flatnonzero(~np.isnan(altitude) & ~np.isnan(distance))
+    if len(rows) < 2:
+        return []
+    altitude = altitude[rows]
+    # GPS distance can step back slightly
+    distance = np.maximum.accumulate(distance[rows])
+    seconds = None
+    if 'timestamp' in ride_df.columns:
+        timestamps = ride_df['timestamp']
+        if not pd.api.types.is_datetime64_any_dtype(timestamps) and pd.api.types.is_numeric_dtype(timestamps):
+            timestamps = pd.to_datetime(timestamps, unit='s')
+        timestamps_ns = utils.to_epoch_ns(timestamps)[rows]
+        if np.all(timestamps_ns != utils.NAT_NS):
+            seconds = (timestamps_ns - timestamps_ns[0]) / 1e9
+
+    from_ix, to_ix, gains = elevation.detect_climbs(altitude, CLIMB_TOLERANCE, CLIMB_MIN_GAIN)
+    if len(from_ix) == 0:
+        return []
+    # Climbs start at the first sample of their low point; a flat lead-in is
+    # not part of the climb, so start at the last one instead
+    climb = _climb_of(len(altitude), from_ix)
+    at_low = (climb >= 0) & (altitude <= altitude[from_ix[np.maximum(climb, 0)]])
+    from_ix = utils.segment_reduce(
+        np.maximum, np.where(at_low, np.arange(len(altitude)), -1), from_ix, to_ix + 1).astype(np.int64)
+    lengths = distance[to_ix] - distance[from_ix]
+    keep = lengths > 0
+    from_ix, to_ix, gains, lengths = from_ix[keep], to_ix[keep], gains[keep], lengths[keep]
+    if len(from_ix) == 0:
+        return []
+    avg_gradients = gains / lengths * 100.0
+    max_gradients = _max_gradients(altitude, distance, from_ix, to_ix)
+    max_gradients = np.where(np.isnan(max_gradients), avg_gradients, max_gradients)
+    if seconds is not None:
+        durations = seconds[to_ix] - seconds[from_ix]
+        vams = np.divide(gains * 3600.0, durations, out=np.full(len(gains), np.nan), where=durations > 0)
+
+    climbs = []
+    for k in range(len(from_ix)):
+        climb = {
+            "from_ix": int(rows[from_ix[k]]),
+            "to_ix": int(rows[to_ix[k]]),
+            "start_offset": None,
+            "start_distance": float(distance[from_ix[k]]),
+            "distance": float(lengths[k]),
+            "elevation_gain": float(gains[k]),
+            "avg_gradient": float(avg_gradients[k]),
+            "max_gradient": float(max_gradients[k]),
+            "duration": None,
+            "vam": None,
+            "category": climb_category(float(lengths[k]), float(avg_gradients[k])),
+        }
+        if seconds is not None:
+            climb["start_offset"] = float(seconds[from_ix[k]])
+            climb["duration"] = float(durations[k])
+            climb["vam"] = None if np.isnan(vams[k]) else float(vams[k])
+        climbs.append(climb)
+    return climbs
+
+
+def _delete_activity_climbs(session: Session, activity_id: str):
+    for climb in session.exec(select(model.ActivityClimb).where(model.ActivityClimb.activity_id == activity_id)):
+        session.delete(climb)
+
+
+def _add_activity_climbs(session: Session, activity: model.ActivityTable, ride_df: Optional[pd.DataFrame]):
+    for climb in activity_climbs(ride_df):
+        session.add(model.ActivityClimb(
+            activity_id=activity.activity_id, owner_id=activity.owner_id, date=activity.date, **climb))
+
+
+def store_activity_climbs(session: Session, activity: model.ActivityTable, ride_df: Optional[pd.DataFrame]):
+    """Computes and stores (or replaces) the climb catalogue of `activity`."""
+    _delete_activity_climbs(session, activity.activity_id)
+    _add_activity_climbs(session, activity, ride_df)
+    session.flush()
+
+
+def remove_activity_climbs(session: Session, activity: model.ActivityTable):
+    """Deletes the stored climbs of `activity`."""
+    _delete_activity_climbs(session, activity.activity_id)
+    session.flush()
+
+
+def update_activity_date(session: Session, activity: model.ActivityTable):
+    """Moves the stored climbs of `activity` to its new date."""
+    for climb in session.exec(select(model.ActivityClimb).where(
+            model.ActivityClimb.activity_id == activity.activity_id)):
+        climb.date = activity.date
+        session.add(climb)
+
+
+def backfill_user_climbs(session: Session, user_id: int):
+    """Stores the climbs of the user's activities that gained enough elevation and have none."""
+    stored = select(model.ActivityClimb.activity_id).where(model.ActivityClimb.owner_id == user_id)
+    activities = session.exec(select(model.ActivityTable).where(
+        model.ActivityTable.owner_id == user_id,
+        model.ActivityTable.elevation_gain >= CLIMB_MIN_GAIN,
+        model.ActivityTable.activity_id.not_in(stored))).all()
+    for activity in activities:
+        if not activity.data:
+            continue
+        try:
+            df = data_processing.deserialize_dataframe(activity.data, columns=CLIMB_COLUMNS)
+            _add_activity_climbs(session, activity, df)
+        except Exception as e:
+            logger.warning(f"Failed to compute climbs of activity {activity.activity_id}: {e}")
+    session.flush()
+
+
+def stored_climbs(session: Session, activity_id: str) -> list[model.ActivityClimb]:
+    """Stored climbs of an activity, in the order they are ridden."""
+    return session.exec(select(model.ActivityClimb).where(
+        model.ActivityClimb.activity_id == activity_id).order_by(model.ActivityClimb.start_distance)).all()
+
+
+def user_climb_stats(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None) -> dict:
+    """
+    Aggregates of the user's stored climbs in activities (not routes)
+    dated in [start, end): count, distance, elevation gain, best VAM and
+    steepest gradient, overall and per category ("none" for uncategorized).
+    """
+    q = select(
+        model.ActivityClimb.category,
+        func.count(model.ActivityClimb.id),
+        func.sum(model.ActivityClimb.distance),
+        func.sum(model.ActivityClimb.elevation_gain),
+        func.max(model.ActivityClimb.vam),
+        func.max(model.ActivityClimb.max_gradient),
+    ).join(model.ActivityTable, model.ActivityTable.activity_id == model.ActivityClimb.activity_id).where(
+        model.ActivityClimb.owner_id == user_id,
+        model.ActivityTable.activity_type != "route")
+    if start is not None:
+        q = q.where(model.ActivityClimb.date >= start)
+    if end is not None:
+        q = q.where(model.ActivityClimb.date < end)
+    q = q.group_by(model.ActivityClimb.category)
+
+    def _max(values):
+        values = [v for v in values if v is not None]
+        return max(values) if values else None
+
+    by_category = {}
+    for category, count, distance, gain, vam, gradient in session.exec(q):
+        by_category[category or "none"] = {
+            "count": count, "distance": distance or 0.0, "elevation_gain": gain or 0.0,
+            "max_vam": vam, "max_gradient": gradient}
+    groups = by_category.values()
+    return {
+        "count": sum(g["count"] for g in groups),
+        "distance": sum(g["distance"] for g in groups),
+        "elevation_gain": sum(g["elevation_gain"] for g in groups),
+        "max_vam": _max(g["max_vam"] for g in groups),
+        "max_gradient": _max(g["max_gradient"] for g in groups),
+        "by_category": by_category,
+    }
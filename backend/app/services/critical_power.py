@@ -0,0 +1,109 @@
+"""Critical Power models fitted to a mean-maximal power envelope.
+
+2-parameter model, fitted as the linear work-time relation
+    W(t) = P(t) * t = CP * t + W'
+3-parameter model (Morton), fitted in the power domain
+    P(t) = CP + W' / (t + k),  k = W' / (Pmax - CP)
+For a fixed k the 3-parameter model is linear in (CP, W'), so it is solved
+in closed form for a whole grid of k values at once and the k with the
+lowest squared error is kept (then refined on a finer grid around it).
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+from app import model
+
+# Bump whenever the fit ranges or the fitting changes, stored fits are refitted.
+MODEL_VERSION = 1
+
+# Durations (s) of the envelope each model is fitted on.
+CP2_DURATIONS = (120, 1200)
+CP3_DURATIONS = (1, 1200)
+
+# FTP estimate: FTP_FACTOR times the best FTP_DURATION power.
+FTP_DURATION = 1200
+FTP_FACTOR = 0.95
+
+# Calendar months of each power profile history point (trailing window).
+PROFILE_HISTORY_MONTHS = int(os.getenv("PROFILE_HISTORY_MONTHS", "3"))
+
+_K_GRID = np.geomspace(0.1, 1000.0, 256)
+_K_REFINE_POINTS = 64
+
+
+def _in_range(durations: np.ndarray, max_watts: np.ndarray, bounds: tuple[int, int]):
+    durations = np.asarray(durations, dtype=float)[:len(max_watts)]
+    max_watts = np.asarray(max_watts, dtype=float)[:len(durations)]
+    keep = (durations >= bounds[0]) & (durations <= bounds[1]) & ~np.isnan(max_watts) & (max_watts > 0)
+    return durations[keep], max_watts[keep]
+
+
+def fit_cp_2p(durations: np.ndarray, max_watts: np.ndarray) -> Optional[tuple[float, float]]:
+    """(CP, W') least-squares fit of the work-time model, None without enough data."""
+    t, p = _in_range(durations, max_watts, CP2_DURATIONS)
+    if len(t) < 2:
+        return None
+    design = np.stack([t, np.ones_like(t)], axis=1)
+    (cp, w_prime), *_ = np.linalg.lstsq(design, p * t, rcond=None)
+    if cp <= 0 or w_prime <= 0:
+        return None
+    return float(cp), float(w_prime)
+
+
+def _fit_3p_grid(k: np.ndarray, t: np.ndarray, p: np.ndarray):
+    """CP, W' and squared error of the 3-parameter model for every k."""
+    x = 1.0 / (t[None, :] + k[:, None])
+    x_mean = x.mean(axis=1)
+    dx = x - x_mean[:, None]
+    dp = p - p.mean()
+    w_prime = (dx @ dp) / np.einsum('ij,ij->i', dx, dx)
+    cp = p.mean() - w_prime * x_mean
+    residuals = p[None, :] - cp[:, None] - w_prime[:, None] * x
+    sse = np.einsum('ij,ij->i', residuals, residuals)
+    sse[(cp <= 0) | (w_prime <= 0)] = np.inf
+    return cp, w_prime, sse
+
+
+def fit_cp_3p(durations: np.ndarray, max_watts: np.ndarray) -> Optional[tuple[float, float, float]]:
+    """(CP, W', Pmax) least-squares fit of the 3-parameter model, None without enough data."""
+    t, p = _in_range(durations, max_watts, CP3_DURATIONS)
+    if len(t) < 3:
+        return None
+    cp, w_prime, sse = _fit_3p_grid(_K_GRID, t, p)
+    best = int(np.argmin(sse))
+    if not np.isfinite(sse[best]):
+        return None
+    fine_k = np.geomspace(_K_GRID[max(best - 1, 0)], _K_GRID[min(best + 1, len(_K_GRID) - 1)], _K_REFINE_POINTS)
+    fine_cp, fine_w_prime, fine_sse = _fit_3p_grid(fine_k, t, p)
+    fine_best = int(np.argmin(fine_sse))
+    if fine_sse[fine_best] <= sse[best]:
+        k, cp, w_prime = fine_k[fine_best], fine_cp[fine_best], fine_w_prime[fine_best]
+    else:
+        k, cp, w_prime = _K_GRID[best], cp[best], w_prime[best]
+    return float(cp), float(w_prime), float(cp + w_prime / k)
+
+
+def estimate_ftp(durations: np.ndarray, max_watts: np.ndarray, cp: Optional[float] = None) -> Optional[float]:
+    """FTP_FACTOR x best FTP_DURATION power, or `cp` if the envelope does not reach it."""
+    durations = np.asarray(durations)[:len(max_watts)]
+    ix = np.flatnonzero(durations == FTP_DURATION)
+    if len(ix) and not np.isnan(max_watts[ix[0]]):
+        return float(FTP_FACTOR * max_watts[ix[0]])
+    return cp
+
+
+def fit_power_profile(durations: np.ndarray, max_watts: np.ndarray) -> model.PowerProfile:
+    """Fits both models and estimates FTP on one envelope. Missing values are None."""
+    cp2 = fit_cp_2p(durations, max_watts)
+    cp3 = fit_cp_3p(durations, max_watts)
+    return model.PowerProfile.model_construct(
+        cp=cp2[0] if cp2 else None,
+        w_prime=cp2[1] if cp2 else None,
+        cp_3p=cp3[0] if cp3 else None,
+        w_prime_3p=cp3[1] if cp3 else None,
+        pmax=cp3[2] if cp3 else None,
+        ftp=estimate_ftp(durations, max_watts, cp2[0] if cp2 else None),
+    )
@@ -4,7 +4,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from sqlmodel import Session, select
 from app import model
 from app.database import engine
-from app.services import analysis, data_processing, stats, power
+from app.services import stats, power_curves
 
 logger = logging.getLogger(__name__)
 
@@ -22,31 +22,10 @@ def recompute_all_users_curves():
     logger.info("Finished full recomputation of user power curves.")
 
 def recompute_user_curves(session: Session, user: model.User):
-    # Reset curves
-    user_curves = {}
-    
-    # Fetch all activities for user
-    activities = session.exec(
-        select(model.ActivityTable).where(model.ActivityTable.owner_id == user.id)
-    ).all()
-    
-    for activity in activities:
-        try:
-            if not activity.data:
-                continue
-                
-            df = data_processing.deserialize_dataframe(activity.data)
-            if df is None or df.empty:
-                continue
-                
-            curve = power.calculate_power_curve(df)
-            user_curves = power.update_user_curves_incremental(user_curves, curve, activity.date)
-        except Exception as e:
-            logger.warning(f"Failed to process activity {activity.activity_id} for power curve: {e}")
-            
-    user.power_curve = user_curves
-    user.power_curve = user_curves
-    session.add(user)
+    # Rebuilds the monthly buckets from the stored per-activity curves, so
+    # the period curves drop efforts that aged out. Only activities without
+    # an up-to-date stored curve are deserialized.
+    power_curves.rebuild_user_curves(session, user, rebuild_buckets=True)
 
 def recompute_all_users_stats():
     logger.info("Starting full recomputation of user historical stats.")
@@ -1,7 +1,8 @@
 import io
 import pandas as pd
 import pyarrow.feather as feather
-from typing import Sequence
+import pyarrow.ipc as pa_ipc
+from typing import Optional, Sequence
 from app import model
 
 def remove_columns(df: pd.DataFrame, cols: Sequence[str]):
@@ -15,8 +16,20 @@ def serialize_dataframe(df: pd.DataFrame):
         serialized = buffer.getvalue()
     return serialized
 
-def deserialize_dataframe(serialized: bytes):
-    return feather.read_feather(io.BytesIO(serialized))
+def deserialize_dataframe(serialized: bytes, columns: Optional[Sequence[str]] = None):
+    """
+    Deserializes a DataFrame. If `columns` is given only those columns are
+    decoded; names missing from the data are ignored.
+    """
+    if columns is not None:
+        available = set(dataframe_columns(serialized))
+        columns = [col for col in columns if col in available]
+    return feather.read_feather(io.BytesIO(serialized), columns=columns)
+
+def dataframe_columns(serialized: bytes) -> list[str]:
+    """Column names of a serialized DataFrame, read from the schema only."""
+    with pa_ipc.open_file(io.BytesIO(serialized)) as reader:
+        return [name for name in reader.schema.names if not name.startswith('__index_level_')]
 
 def get_activity_raw_df(activity_db: model.ActivityTable):
     return deserialize_dataframe(activity_db.data)
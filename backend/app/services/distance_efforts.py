@@ -0,0 +1,302 @@
+"""Fastest times over standard distances (1 km, 5 km, ...).
+
+The shortest window that ends at sample j and covers a distance d starts
+at the last sample i with distance[i] <= distance[j] - d. The cumulative
+distance never decreases, so i only moves forward as j does: this is a
+two-pointer sweep, done for all the ends at once with one np.searchsorted
+of the shifted distances. The start time is interpolated to the point
+where the window covers exactly d.
+
+Each activity's efforts are stored at ingest (model.ActivityDistanceEffort,
+indexed by owner, distance and date) and the user's all-time and calendar
+year bests are kept in model.UserDistanceBest. Adding an activity only
+compares its efforts with the stored bests; deleting or re-dating one
+re-reads the bests it held with one indexed query each.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+
+from app import model
+from app.services import data_processing, utils
+
+logger = logging.getLogger(__name__)
+
+# Distances (m) of the stored best efforts.
+BEST_EFFORT_DISTANCES = tuple(
+    int(d) for d in os.getenv("BEST_EFFORT_DISTANCES", "1000,5000,10000,40000").split(","))
+
+# Data columns the efforts are computed from.
+EFFORT_COLUMNS = ('timestamp', 'distance')
+
+
+def fastest_distances(
+        distance: np.ndarray,
+        seconds: np.ndarray,
+        targets: Sequence[float]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fastest time (s) to cover each of `targets` (m) and where it starts
+    (s from the first sample), NaN for targets longer than the data.
+    `distance` is the cumulative distance (m) and `seconds` the time of
+    each sample; samples missing either are ignored.
+    """
+    distance = np.asarray(distance, dtype=float)
+    seconds = np.asarray(seconds, dtype=float)
+    best = np.full(len(targets), np.nan)
+    starts = np.full(len(targets), np.nan)
+    keep = ~np.isnan(distance) & ~np.isnan(seconds)
+    order = np.argsort(seconds[keep], kind='stable')
+    seconds = seconds[keep][order]
+    # GPS distance can step back slightly; the sweep needs it non-decreasing
+    distance = np.maximum.accumulate(distance[keep][order]) if len(order) else distance[:0]
+    for k, target in enumerate(targets):
+        if target <= 0 or len(distance) < 2 or distance[-1] - distance[0] < target:
+            continue
+        # Ends covering the target from the first sample on, and their starts
+        ends = np.arange(np.searchsorted(distance, distance[0] + target, side='left'), len(distance))
+        start_distance = distance[ends] - target
+        i = np.searchsorted(distance, start_distance, side='right') - 1
+        fraction = (start_distance - distance[i]) / (distance[i + 1] - distance[i])
+        start_seconds = seconds[i] + fraction * (seconds[i + 1] - seconds[i])
+        elapsed = seconds[ends] - start_seconds
+        fastest = int(np.argmin(elapsed))
+        best[k] = elapsed[fastest]
+        starts[k] = start_seconds[fastest] - seconds[0]
+    return best, starts
+
+
+def activity_distance_efforts(ride_df: Optional[pd.DataFrame]) -> list[tuple[int, float, float]]:
+    """(distance, seconds, start_offset) of the BEST_EFFORT_DISTANCES the activity covers."""
+    if ride_df is None or ride_df.empty or 'distance' not in ride_df.columns or 'timestamp' not in ride_df.columns:
+        return []
+    timestamps = ride_df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps) and pd.api.types.is_numeric_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, unit='s')
+    timestamps_ns = utils.to_epoch_ns(timestamps)
+    seconds = np.where(timestamps_ns != utils.NAT_NS, timestamps_ns / 1e9, np.nan)
+    distance = pd.to_numeric(ride_df['distance'], errors='coerce').to_numpy(dtype=float)
+    best, starts = fastest_distances(distance, seconds, BEST_EFFORT_DISTANCES)
+    return [
+        (d, float(b), float(s))
+        for d, b, s in zip(BEST_EFFORT_DISTANCES, best, starts) if not np.isnan(b)
+    ]
+
+
+def _year_period(date: datetime) -> str:
+    return f"{date.year:04d}"
+
+
+def _period_bounds(period: str) -> tuple[Optional[datetime], Optional[datetime]]:
+    """Date window [start, end) of "all" or a calendar year ("2025"); ValueError otherwise."""
+    if period == 'all':
+        return None, None
+    if len(period) != 4 or not period.isdigit():
+        raise ValueError(f"Unknown period: {period}")
+    year = int(period)
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def _fastest(
+        session: Session,
+        user_id: int,
+        distance: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None) -> Optional[model.ActivityDistanceEffort]:
+    q = select(model.ActivityDistanceEffort).where(
+        model.ActivityDistanceEffort.owner_id == user_id,
+        model.ActivityDistanceEffort.distance == distance)
+    if start is not None:
+        q = q.where(model.ActivityDistanceEffort.date >= start)
+    if end is not None:
+        q = q.where(model.ActivityDistanceEffort.date < end)
+    return session.exec(q.order_by(model.ActivityDistanceEffort.seconds).limit(1)).first()
+
+
+def _set_best(best: model.UserDistanceBest, effort: model.ActivityDistanceEffort):
+    best.seconds = effort.seconds
+    best.activity_id = effort.activity_id
+    best.date = effort.date
+    best.start_offset = effort.start_offset
+
+
+def _user_best(session: Session, user_id: int, period: str, distance: int) -> Optional[model.UserDistanceBest]:
+    return session.exec(select(model.UserDistanceBest).where(
+        model.UserDistanceBest.user_id == user_id,
+        model.UserDistanceBest.period == period,
+        model.UserDistanceBest.distance == distance)).first()
+
+
+def _raise_user_best(session: Session, period: str, effort: model.ActivityDistanceEffort):
+    """Makes `effort` the user's best of `period` if it is faster than the stored one."""
+    best = _user_best(session, effort.owner_id, period, effort.distance)
+    if best is not None and best.seconds <= effort.seconds:
+        return
+    if best is None:
+        best = model.UserDistanceBest(user_id=effort.owner_id, period=period, distance=effort.distance)
+    _set_best(best, effort)
+    session.add(best)
+
+
+def _refresh_user_best(
+        session: Session,
+        user_id: int,
+        period: str,
+        distance: int,
+        best: Optional[model.UserDistanceBest] = None):
+    """Re-reads the best of `period` from the stored activity efforts (one indexed query)."""
+    if best is None:
+        best = _user_best(session, user_id, period, distance)
+    effort = _fastest(session, user_id, distance, *_period_bounds(period))
+    if effort is None:
+        if best is not None:
+            session.delete(best)
+        return
+    if best is None:
+        best = model.UserDistanceBest(user_id=user_id, period=period, distance=distance)
+    _set_best(best, effort)
+    session.add(best)
+
+
+def store_activity_efforts(session: Session, activity: model.ActivityTable, ride_df: Optional[pd.DataFrame]):
+    """
+    Computes and stores (or replaces) the distance efforts of `activity`
+    and raises its owner's all-time and year bests. Routes have none.
+    """
+    remove_activity_efforts(session, activity)
+    if activity.activity_type == "route":
+        return
+    for distance, seconds, start_offset in activity_distance_efforts(ride_df):
+        effort = model.ActivityDistanceEffort(
+            activity_id=activity.activity_id, owner_id=activity.owner_id, date=activity.date,
+            distance=distance, seconds=seconds, start_offset=start_offset)
+        session.add(effort)
+        for period in ('all', _year_period(activity.date)):
+            _raise_user_best(session, period, effort)
+    session.flush()
+
+
+def remove_activity_efforts(session: Session, activity: model.ActivityTable):
+    """Deletes the efforts of `activity` and re-reads the user bests it held."""
+    efforts = session.exec(select(model.ActivityDistanceEffort).where(
+        model.ActivityDistanceEffort.activity_id == activity.activity_id)).all()
+    if not efforts:
+        return
+    for effort in efforts:
+        session.delete(effort)
+    session.flush()
+    held = session.exec(select(model.UserDistanceBest).where(
+        model.UserDistanceBest.activity_id == activity.activity_id)).all()
+    for best in held:
+        _refresh_user_best(session, best.user_id, best.period, best.distance, best)
+    session.flush()
+
+
+def update_activity_date(session: Session, activity: model.ActivityTable, old_date: datetime):
+    """Moves the efforts of `activity` to its new date and re-reads the bests of both years."""
+    efforts = session.exec(select(model.ActivityDistanceEffort).where(
+        model.ActivityDistanceEffort.activity_id == activity.activity_id)).all()
+    for effort in efforts:
+        effort.date = activity.date
+        session.add(effort)
+    session.flush()
+    periods = {'all', _year_period(old_date), _year_period(activity.date)}
+    for effort in efforts:
+        for period in periods:
+            _refresh_user_best(session, activity.owner_id, period, effort.distance)
+    session.flush()
+
+
+def _backfill_efforts(session: Session, user_id: int):
+    """Stores the efforts of the user's activities that are long enough and have none."""
+    stored = select(model.ActivityDistanceEffort.activity_id).where(
+        model.ActivityDistanceEffort.owner_id == user_id)
+    activities = session.exec(select(model.ActivityTable).where(
+        model.ActivityTable.owner_id == user_id,
+        model.ActivityTable.activity_type != "route",
+        model.ActivityTable.distance >= min(BEST_EFFORT_DISTANCES) / 1000.0,
+        model.ActivityTable.activity_id.not_in(stored))).all()
+    for activity in activities:
+        if not activity.data:
+            continue
+        try:
+            df = data_processing.deserialize_dataframe(activity.data, columns=EFFORT_COLUMNS)
+            for distance, seconds, start_offset in activity_distance_efforts(df):
+                session.add(model.ActivityDistanceEffort(
+                    activity_id=activity.activity_id, owner_id=user_id, date=activity.date,
+                    distance=distance, seconds=seconds, start_offset=start_offset))
+        except Exception as e:
+            logger.warning(f"Failed to compute distance efforts of activity {activity.activity_id}: {e}")
+    session.flush()
+
+
+def rebuild_user_efforts(session: Session, user: model.User):
+    """
+    Computes the missing activity efforts (e.g. activities ingested before
+    they were stored) and rebuilds all the user's all-time and year bests.
+    """
+    _backfill_efforts(session, user.id)
+    fastest = {}
+    for effort in session.exec(select(model.ActivityDistanceEffort).where(
+            model.ActivityDistanceEffort.owner_id == user.id)):
+        for period in ('all', _year_period(effort.date)):
+            key = (period, effort.distance)
+            if key not in fastest or effort.seconds < fastest[key].seconds:
+                fastest[key] = effort
+    existing = {
+        (best.period, best.distance): best
+        for best in session.exec(select(model.UserDistanceBest).where(model.UserDistanceBest.user_id == user.id))
+    }
+    for key, best in existing.items():
+        if key not in fastest:
+            session.delete(best)
+    for (period, distance), effort in fastest.items():
+        best = existing.get((period, distance))
+        if best is None:
+            best = model.UserDistanceBest(user_id=user.id, period=period, distance=distance)
+        _set_best(best, effort)
+        session.add(best)
+    session.flush()
+
+
+def _record(effort) -> dict:
+    return {"distance": effort.distance, "seconds": effort.seconds, "activity_id": effort.activity_id,
+            "date": effort.date, "start_offset": effort.start_offset}
+
+
+def user_bests(session: Session, user_id: int, period: str = 'all') -> list[dict]:
+    """
+    Stored {distance, seconds, activity_id, date, start_offset} bests of
+    "all" or a calendar year ("2025"), by distance. Raises ValueError for
+    other periods.
+    """
+    _period_bounds(period)
+    bests = session.exec(select(model.UserDistanceBest).where(
+        model.UserDistanceBest.user_id == user_id,
+        model.UserDistanceBest.period == period).order_by(model.UserDistanceBest.distance)).all()
+    return [_record(best) for best in bests]
+
+
+def fastest_between(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        distances: Sequence[int] = BEST_EFFORT_DISTANCES) -> list[dict]:
+    """Fastest effort per distance over activities dated in [start, end), one indexed query each."""
+    # Activity dates are stored as naive UTC
+    start, end = utils.utc_naive(start), utils.utc_naive(end)
+    efforts = (_fastest(session, user_id, distance, start, end) for distance in distances)
+    return [_record(effort) for effort in efforts if effort is not None]
+
+
+def activity_efforts(session: Session, activity_id: str) -> list[dict]:
+    """Stored efforts of one activity, by distance."""
+    efforts = session.exec(select(model.ActivityDistanceEffort).where(
+        model.ActivityDistanceEffort.activity_id == activity_id).order_by(model.ActivityDistanceEffort.distance)).all()
+    return [_record(effort) for effort in efforts]
@@ -1,41 +1,178 @@
+import numpy as np
 import pandas as pd
 from app import model
 from app.services import utils
 
+def _previous_higher(altitude: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    For every sample i, returns the last index j < i such that
+    altitude[i] < altitude[j] - tolerance, or -1 if there is none.
+
+    Uses a sparse table of range maxima and extends every position to the
+    left by decreasing powers of two, all positions at once.
+    """
+    n = len(altitude)
+    # levels[k][j] = max(altitude[j:j + 2**k])
+    levels = [altitude]
+    while (1 << len(levels)) <= n:
+        half = 1 << (len(levels) - 1)
+        levels.append(np.maximum(levels[-1][:-half], levels[-1][half:]))
+
+    pos = np.arange(n)
+    for k in range(len(levels) - 1, -1, -1):
+        candidate = pos - (1 << k)
+        in_range = candidate >= 0
+        block_max = levels[k][np.where(in_range, candidate, 0)]
+        extend = in_range & ~(altitude < block_max - tolerance)
+        pos = np.where(extend, candidate, pos)
+    return pos - 1
+
+
+def detect_climbs(altitude: np.ndarray, tolerance=1.0, min_elev=1.0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Hysteresis climb detection over an altitude array without missing values.
+
+    A segment ends as soon as the altitude falls more than `tolerance` below
+    the highest point of the segment, and the next segment starts there.
+    Each finished segment yields a climb from its lowest to its highest
+    point if the low comes first and the gain exceeds `min_elev`.
+    `tolerance` is expected to be non-negative.
+
+    Returns (from_ix, to_ix, gains) as arrays of positional indices and
+    elevation gains.
+    """
+    altitude = np.asarray(altitude, dtype=float)
+    n = len(altitude)
+    no_climbs = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=float))
+    if n < 2:
+        return no_climbs
+
+    # A segment starting at s ends at the first i whose previous higher
+    # sample is at or after s, i.e. a suffix minimum over the first drop
+    # index of every previous higher sample.
+    prev_higher = _previous_higher(altitude, tolerance)
+    has_prev = np.flatnonzero(prev_higher >= 0)
+    first_drop = np.full(n, n)
+    np.minimum.at(first_drop, prev_higher[has_prev], has_prev)
+    segment_end = np.minimum.accumulate(first_drop[::-1])[::-1].tolist()
+
+    bounds = [0]
+    while segment_end[bounds[-1]] < n:
+        bounds.append(segment_end[bounds[-1]])
+    if len(bounds) < 2:
+        return no_climbs
+
+    starts = np.asarray(bounds[:-1])
+    ends = np.asarray(bounds[1:])
+    covered = altitude[:ends[-1]]
+    segment_id = np.repeat(np.arange(len(starts)), ends - starts)
+    index = np.arange(len(covered))
+
+    # First occurrence of the minimum and maximum of every segment. The end
+    # sample is shared with the next segment: it can never be the maximum,
+    # and if it is a new minimum the low comes after the high.
+    seg_min = np.minimum.reduceat(covered, starts)
+    seg_max = np.maximum.reduceat(covered, starts)
+    low = np.minimum.reduceat(np.where(covered == seg_min[segment_id], index, n), starts)
+    high = np.minimum.reduceat(np.where(covered == seg_max[segment_id], index, n), starts)
+
+    gains = altitude[high] - altitude[low]
+    keep = (altitude[ends] >= seg_min) & (low < high) & (gains > min_elev)
+    return low[keep].astype(np.int64), high[keep].astype(np.int64), gains[keep]
+
+
 def compute_elevation_gain_intervals(df: pd.DataFrame, tolerance=1.0, min_elev=1.0):
     altitude_series = df.altitude.dropna()
-    altitude = altitude_series.to_list()
+    from_ix, to_ix, gains = detect_climbs(altitude_series.to_numpy(dtype=float), tolerance, min_elev)
     original_ix = altitude_series.index
-    climbs = []
-    high_ix = low_ix = 0
-    for i, h in enumerate(altitude):
-        if h < altitude[low_ix]:
-            low_ix = i
-        if h > altitude[high_ix]:
-            high_ix = i
-        if h < (altitude[high_ix] - tolerance):
-            # It means we are going down again
-            climb = model.Climb(
-                from_ix=original_ix[low_ix],
-                to_ix=original_ix[high_ix],
-                elevation=altitude[high_ix] - altitude[low_ix]
-            )
-            if climb.from_ix < climb.to_ix and climb.elevation > min_elev:
-                climbs.append(climb)
-            low_ix = i
-            high_ix = i
-    return climbs
+    return [
+        model.Climb(from_ix=original_ix[f], to_ix=original_ix[t], elevation=g)
+        for f, t, g in zip(from_ix, to_ix, gains)
+    ]
 
 def compute_elevation_gain(df: pd.DataFrame, tolerance: float, min_elev: float):
-    segments = compute_elevation_gain_intervals(df, tolerance, min_elev)
-    return sum(map(lambda x: x.elevation, segments))
+    altitude = df.altitude.dropna().to_numpy(dtype=float)
+    _, _, gains = detect_climbs(altitude, tolerance, min_elev)
+    return sum(gains.tolist())
+
+# Distance (m) the altitude is averaged over for the profile gradients.
+PROFILE_GRADIENT_SMOOTHING = 100.0
+
+
+def _centered_mean(values: np.ndarray, half_width: int) -> np.ndarray:
+    """
+    Mean of values[i - h:i + h + 1] at every i, with h = half_width
+    narrowed near the ends so the window stays centred (and a linear
+    series is left unchanged).
+    """
+    n = len(values)
+    prefix = np.concatenate(([0.0], np.cumsum(values)))
+    index = np.arange(n)
+    half = np.minimum(half_width, np.minimum(index, n - 1 - index))
+    return (prefix[index + half + 1] - prefix[index - half]) / (2 * half + 1)
+
+
+def elevation_profile(ride_df: pd.DataFrame, num_points: int, smoothing: float = PROFILE_GRADIENT_SMOOTHING):
+    """
+    Altitude interpolated onto `num_points` distances evenly spaced over
+    the activity, so stops and speed changes do not distort the profile,
+    and the gradient (%) at each of them. The gradient is taken over the
+    altitude averaged across `smoothing` m (at least one grid step).
+
+    Returns (distance, altitude, gradient) arrays with distance in m, or
+    None without two samples that have both altitude and distance.
+    """
+    if num_points < 2 or 'altitude' not in ride_df.columns or 'distance' not in ride_df.columns:
+        return None
+    altitude = pd.to_numeric(ride_df['altitude'], errors='coerce').to_numpy(dtype=float)
+    distance = pd.to_numeric(ride_df['distance'], errors='coerce').to_numpy(dtype=float)
+    valid = ~np.isnan(altitude) & ~np.isnan(distance)
+    if np.count_nonzero(valid) < 2:
+        return None
+    altitude = altitude[valid]
+    # np.interp needs non-decreasing distances; GPS distance can step back slightly
+    distance = np.maximum.accumulate(distance[valid])
+    if distance[-1] <= distance[0]:
+        return None
+
+    grid = np.linspace(distance[0], distance[-1], num_points)
+    profile = np.interp(grid, distance, altitude)
+    step = grid[1] - grid[0]
+    smoothed = _centered_mean(profile, int(round(smoothing / step / 2)))
+    gradient = np.gradient(smoothed, step) * 100.0
+    return grid, profile, gradient
+
+
+def profile_summary(ride_df: pd.DataFrame, num_samples: int):
+    """
+    Lowest and highest altitude and the elevation profile on up to
+    `num_samples` evenly spaced distances (km), or None without usable
+    distances (see elevation_profile).
+    """
+    profile = elevation_profile(ride_df, min(len(ride_df), num_samples))
+    if profile is None:
+        return None
+    distance, elev_series, gradient = profile
+    altitude = ride_df.altitude.astype(float)
+    return model.ElevationSummary.model_construct(
+        lowest=float(altitude.min()),
+        highest=float(altitude.max()),
+        elev_series=elev_series.tolist(),
+        dist_series=(distance / 1000.0).tolist(),
+        gradient_series=gradient.tolist()
+    )
+
 
 def elev_summary(ride_df: pd.DataFrame, num_samples: int):
+    """profile_summary, or the series subsampled by row (without gradients) if there is no profile."""
+    summary = profile_summary(ride_df, num_samples)
+    if summary is not None:
+        return summary
     n = min(len(ride_df.altitude), num_samples)
-    summary = model.ElevationSummary(
-        lowest=ride_df.altitude.min(),
-        highest=ride_df.altitude.max(),
-        elev_series=utils.subsample_timeseries(ride_df.altitude, n),
-        dist_series=utils.subsample_timeseries(ride_df.distance / 1000.0, n)
+    altitude = ride_df.altitude.astype(float)
+    return model.ElevationSummary.model_construct(
+        lowest=float(altitude.min()),
+        highest=float(altitude.max()),
+        elev_series=utils.subsample_timeseries(altitude, n),
+        dist_series=utils.subsample_timeseries(ride_df.distance.astype(float) / 1000.0, n)
     )
-    return summary
@@ -0,0 +1,120 @@
+"""Distance-uniform elevation profiles, stored at ingest.
+
+elevation.elevation_profile interpolates the altitude onto evenly spaced
+distances with np.interp, so time spent stopped or climbing slowly does not
+stretch parts of the profile, and takes smoothed gradients on that grid.
+The profile of every activity and route is stored at each of
+ELEVATION_PROFILE_RESOLUTIONS (model.ActivityElevationProfile), so the
+elevation card reads three precomputed arrays instead of deserializing and
+resampling the activity data on every view.
+"""
+
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select, func
+
+from app import model
+from app.services import data_processing, elevation
+
+logger = logging.getLogger(__name__)
+
+# Grid sizes of the stored profiles.
+ELEVATION_PROFILE_RESOLUTIONS = tuple(
+    int(n) for n in os.getenv("ELEVATION_PROFILE_RESOLUTIONS", "200,1000").split(","))
+
+# Grid size of the activity summary profile (elev_summary).
+SUMMARY_PROFILE_POINTS = 200
+
+# Bump when the profile computation changes so stale rows are rebuilt.
+PROFILE_VERSION = 1
+
+# Data columns the profiles are computed from.
+PROFILE_COLUMNS = ('altitude', 'distance')
+
+
+def _profile_rows(activity_id: str, ride_df: Optional[pd.DataFrame]) -> list[model.ActivityElevationProfile]:
+    if ride_df is None or ride_df.empty or 'altitude' not in ride_df.columns:
+        return []
+    altitude = pd.to_numeric(ride_df['altitude'], errors='coerce')
+    rows = []
+    for points in ELEVATION_PROFILE_RESOLUTIONS:
+        # Same grid size as elevation.elev_summary
+        profile = elevation.elevation_profile(ride_df, min(len(ride_df), points))
+        if profile is None:
+            return []
+        distance, profile_altitude, gradient = profile
+        rows.append(model.ActivityElevationProfile(
+            activity_id=activity_id, points=points, version=PROFILE_VERSION,
+            lowest=float(altitude.min()), highest=float(altitude.max()),
+            distance=(distance / 1000.0).astype(np.float64).tobytes(),
+            altitude=profile_altitude.astype(np.float64).tobytes(),
+            gradient=gradient.astype(np.float64).tobytes()))
+    return rows
+
+
+def _delete_activity_profiles(session: Session, activity_id: str):
+    for row in session.exec(select(model.ActivityElevationProfile).where(
+            model.ActivityElevationProfile.activity_id == activity_id)):
+        session.delete(row)
+
+
+def store_activity_profiles(session: Session, activity: model.ActivityTable, ride_df: Optional[pd.DataFrame]):
+    """Computes and stores (or replaces) the elevation profiles of `activity`."""
+    _delete_activity_profiles(session, activity.activity_id)
+    # Flush the deletes first: the new rows reuse the (activity_id, points) keys
+    session.flush()
+    for row in _profile_rows(activity.activity_id, ride_df):
+        session.add(row)
+    session.flush()
+
+
+def remove_activity_profiles(session: Session, activity: model.ActivityTable):
+    """Deletes the stored elevation profiles of `activity`."""
+    _delete_activity_profiles(session, activity.activity_id)
+    session.flush()
+
+
+def backfill_user_profiles(session: Session, user_id: int):
+    """
+    Stores the profiles of the user's activities with altitude data that
+    are missing one of the configured resolutions or have a stale version.
+    """
+    current = select(model.ActivityElevationProfile.activity_id).where(
+        model.ActivityElevationProfile.version == PROFILE_VERSION,
+        model.ActivityElevationProfile.points.in_(ELEVATION_PROFILE_RESOLUTIONS),
+    ).group_by(model.ActivityElevationProfile.activity_id).having(
+        func.count(model.ActivityElevationProfile.id) == len(set(ELEVATION_PROFILE_RESOLUTIONS)))
+    activities = session.exec(select(model.ActivityTable).where(
+        model.ActivityTable.owner_id == user_id,
+        model.ActivityTable.activity_id.not_in(current))).all()
+    for activity in activities:
+        if not activity.data or 'altitude' not in data_processing.dataframe_columns(activity.data):
+            continue
+        try:
+            df = data_processing.deserialize_dataframe(activity.data, columns=PROFILE_COLUMNS)
+            store_activity_profiles(session, activity, df)
+        except Exception as e:
+            logger.warning(f"Failed to compute the elevation profile of activity {activity.activity_id}: {e}")
+    session.flush()
+
+
+def stored_summary(
+        session: Session,
+        activity_id: str,
+        points: int = SUMMARY_PROFILE_POINTS) -> Optional[model.ElevationSummary]:
+    """Stored profile of an activity at `points` as an ElevationSummary, None if not stored."""
+    row = session.exec(select(model.ActivityElevationProfile).where(
+        model.ActivityElevationProfile.activity_id == activity_id,
+        model.ActivityElevationProfile.points == points)).first()
+    if row is None or row.version != PROFILE_VERSION:
+        return None
+    return model.ElevationSummary.model_construct(
+        lowest=row.lowest,
+        highest=row.highest,
+        elev_series=np.frombuffer(row.altitude, dtype=np.float64).tolist(),
+        dist_series=np.frombuffer(row.distance, dtype=np.float64).tolist(),
+        gradient_series=np.frombuffer(row.gradient, dtype=np.float64).tolist())
@@ -0,0 +1,307 @@
+"""Personal heatmap: slippy-map tiles of how many activities passed each pixel.
+
+Tracks are projected to global web mercator pixels at each of
+HEATMAP_ZOOMS and densified so consecutive points are at most one pixel
+apart (one np.repeat over all segments). An activity counts once per
+pixel (np.unique of the pixel ids), so a count is the number of
+activities through that pixel. The pixels are grouped by tile.
+
+Each (user, zoom, tile) keeps a sparse count grid (model.UserHeatmapTile:
+uint16 pixel positions and uint32 counts). Uploads add the tiles of the
+new activity and deletes subtract them, merging with one np.unique and
+np.bincount per tile; only the touched tiles are read and written.
+model.HeatmapActivity records which activities are counted, so
+activities stored before the heatmap existed are only added by the
+backfill and never subtracted.
+
+PNG tiles are rendered with a log color scale. Zooms between the stored
+ones are derived from the next stored zoom above (max over up to 4x4
+tiles) or, beyond the deepest one, upscaled from the one below. PNGs are
+cached in a result_cache.DiskBackend keyed by the source tiles' last
+update, so a change only re-renders the tiles it touched.
+"""
+
+import io
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+from sqlalchemy import tuple_
+from sqlmodel import Session, select, func
+
+from app import model
+from app.services import data_processing, utils
+from app.services.result_cache import DiskBackend
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+
+# Zoom levels of the stored count grids.
+HEATMAP_ZOOMS = tuple(sorted(int(z) for z in os.getenv("HEATMAP_ZOOMS", "8,11,14").split(",")))
+
+# Count at which the color scale saturates.
+HEATMAP_SATURATION = int(os.getenv("HEATMAP_SATURATION", "20"))
+
+# Stored zooms deeper than the requested one are downsampled up to this many levels.
+MAX_DOWNSAMPLE_LEVELS = 2
+
+# Segments longer than this (px) are GPS jumps and are not drawn.
+MAX_SEGMENT_PIXELS = 256
+
+# Data columns the heatmap is computed from.
+HEATMAP_COLUMNS = ('position_lat', 'position_long')
+
+# Color scale: positions on the log scale and RGBA at each of them.
+_COLOR_STOPS = np.array([0.0, 0.5, 1.0])
+_COLORS = np.array([
+    [200, 30, 30, 150],
+    [255, 140, 0, 210],
+    [255, 255, 190, 255],
+], dtype=float)
+
+_MAX_LAT = 85.05112878
+
+
+def global_pixels(lat: np.ndarray, lon: np.ndarray, zoom: int) -> tuple[np.ndarray, np.ndarray]:
+    """Web mercator pixel coordinates (float) of the points at `zoom`."""
+    scale = TILE_SIZE * 2 ** zoom
+    sin_lat = np.sin(np.radians(np.clip(lat, -_MAX_LAT, _MAX_LAT)))
+    px = (np.asarray(lon) + 180.0) / 360.0 * scale
+    py = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return px, py
+
+
+def track_pixels(lat: np.ndarray, lon: np.ndarray, zoom: int) -> np.ndarray:
+    """Sorted unique global pixel ids (row * width + column) crossed by the track at `zoom`."""
+    scale = TILE_SIZE * 2 ** zoom
+    px, py = global_pixels(lat, lon, zoom)
+    if len(px) > 1:
+        dx, dy = np.diff(px), np.diff(py)
+        steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64)
+        steps = np.where((steps < 1) | (steps > MAX_SEGMENT_PIXELS), 1, steps)
+        segment = np.repeat(np.arange(len(dx)), steps)
+        offsets = np.cumsum(steps) - steps
+        fraction = (np.arange(steps.sum()) - offsets[segment]) / steps[segment]
+        # Long jumps keep fraction 0 only, i.e. just their start point
+        px = np.append(px[segment] + fraction * dx[segment], px[-1])
+        py = np.append(py[segment] + fraction * dy[segment], py[-1])
+    ix = np.clip(np.floor(px).astype(np.int64), 0, scale - 1)
+    iy = np.clip(np.floor(py).astype(np.int64), 0, scale - 1)
+    return np.unique(iy * scale + ix)
+
+
+def activity_tiles(ride_df: Optional[pd.DataFrame], zoom: int) -> dict[tuple[int, int], np.ndarray]:
+    """Pixels of the activity track at `zoom` by tile (x, y), as uint16 positions (row * 256 + column) in the tile."""
+    if ride_df is None or ride_df.empty or not set(HEATMAP_COLUMNS).issubset(ride_df.columns):
+        return {}
+    lat = pd.to_numeric(ride_df['position_lat'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(ride_df['position_long'], errors='coerce').to_numpy(dtype=float)
+    valid = ~np.isnan(lat) & ~np.isnan(lon)
+    if not valid.any():
+        return {}
+    scale = TILE_SIZE * 2 ** zoom
+    pixels = track_pixels(lat[valid], lon[valid], zoom)
+    iy, ix = pixels // scale, pixels % scale
+    tile = (iy // TILE_SIZE) * 2 ** zoom + ix // TILE_SIZE
+    local = ((iy % TILE_SIZE) * TILE_SIZE + ix % TILE_SIZE).astype(np.uint16)
+    order = np.argsort(tile, kind='stable')
+    tile, local = tile[order], local[order]
+    starts = np.flatnonzero(np.r_[True, tile[1:] != tile[:-1]])
+    ends = np.r_[starts[1:], len(tile)]
+    return {
+        (int(tile[s] % 2 ** zoom), int(tile[s] // 2 ** zoom)): local[s:e]
+        for s, e in zip(starts, ends)
+    }
+
+
+def _merge(row: Optional[model.UserHeatmapTile], pixels: np.ndarray, sign: int) -> tuple[np.ndarray, np.ndarray]:
+    """Pixel positions and counts of `row` with one count added to (or taken from) each of `pixels`."""
+    old_pixels = np.frombuffer(row.pixels, dtype=np.uint16) if row is not None else np.empty(0, dtype=np.uint16)
+    old_counts = np.frombuffer(row.counts, dtype=np.uint32) if row is not None else np.empty(0, dtype=np.uint32)
+    merged, inverse = np.unique(np.concatenate((old_pixels, pixels)), return_inverse=True)
+    weights = np.concatenate((old_counts.astype(np.int64), np.full(len(pixels), sign, dtype=np.int64)))
+    counts = np.bincount(inverse, weights=weights, minlength=len(merged)).astype(np.int64)
+    keep = counts > 0
+    return merged[keep], counts[keep].astype(np.uint32)
+
+
+def _apply_tiles(session: Session, user_id: int, zoom: int, tiles: dict[tuple[int, int], np.ndarray], sign: int):
+    if not tiles:
+        return
+    rows = session.exec(select(model.UserHeatmapTile).where(
+        model.UserHeatmapTile.user_id == user_id,
+        model.UserHeatmapTile.zoom == zoom,
+        tuple_(model.UserHeatmapTile.x, model.UserHeatmapTile.y).in_(list(tiles)))).all()
+    existing = {(row.x, row.y): row for row in rows}
+    now = datetime.now()
+    for (x, y), pixels in tiles.items():
+        row = existing.get((x, y))
+        if row is None and sign < 0:
+            continue
+        merged, counts = _merge(row, pixels, sign)
+        if len(merged) == 0:
+            if row is not None:
+                session.delete(row)
+            continue
+        if row is None:
+            row = model.UserHeatmapTile(user_id=user_id, zoom=zoom, x=x, y=y)
+        row.pixels = merged.tobytes()
+        row.counts = counts.tobytes()
+        row.updated_at = now
+        session.add(row)
+
+
+def _apply_activity(session: Session, user_id: int, ride_df: Optional[pd.DataFrame], sign: int):
+    for zoom in HEATMAP_ZOOMS:
+        _apply_tiles(session, user_id, zoom, activity_tiles(ride_df, zoom), sign)
+
+
+def add_activity_heat(session: Session, activity: model.ActivityTable, ride_df: Optional[pd.DataFrame]):
+    """Adds the track of `activity` to its owner's heatmap (routes are not ridden, and are skipped)."""
+    if activity.activity_type == "route" or session.get(model.HeatmapActivity, activity.activity_id) is not None:
+        return
+    if ride_df is None or not set(HEATMAP_COLUMNS).issubset(ride_df.columns):
+        return
+    _apply_activity(session, activity.owner_id, ride_df, 1)
+    session.add(model.HeatmapActivity(activity_id=activity.activity_id, owner_id=activity.owner_id))
+    session.flush()
+
+
+def remove_activity_heat(session: Session, activity: model.ActivityTable):
+    """Takes the track of `activity` out of its owner's heatmap, if it was counted."""
+    counted = session.get(model.HeatmapActivity, activity.activity_id)
+    if counted is None:
+        return
+    ride_df = data_processing.deserialize_dataframe(activity.data, columns=HEATMAP_COLUMNS) if activity.data else None
+    _apply_activity(session, activity.owner_id, ride_df, -1)
+    session.delete(counted)
+    session.flush()
+
+
+def backfill_user_heatmap(session: Session, user_id: int):
+    """Adds the user's activities with GPS data that are not in the heatmap yet."""
+    counted = select(model.HeatmapActivity.activity_id).where(model.HeatmapActivity.owner_id == user_id)
+    activities = session.exec(select(model.ActivityTable).where(
+        model.ActivityTable.owner_id == user_id,
+        model.ActivityTable.activity_type != "route",
+        model.ActivityTable.activity_id.not_in(counted))).all()
+    for activity in activities:
+        if not activity.data or not set(HEATMAP_COLUMNS).issubset(data_processing.dataframe_columns(activity.data)):
+            continue
+        try:
+            df = data_processing.deserialize_dataframe(activity.data, columns=HEATMAP_COLUMNS)
+            add_activity_heat(session, activity, df)
+        except Exception as e:
+            logger.warning(f"Failed to add activity {activity.activity_id} to the heatmap: {e}")
+    session.flush()
+
+
+def _source(zoom: int) -> Optional[int]:
+    """Stored zoom a tile at `zoom` is rendered from, None if there is none."""
+    deeper = [z for z in HEATMAP_ZOOMS if zoom <= z <= zoom + MAX_DOWNSAMPLE_LEVELS]
+    if deeper:
+        return deeper[0]
+    shallower = [z for z in HEATMAP_ZOOMS if z < zoom]
+    return shallower[-1] if shallower else None
+
+
+def _source_filter(user_id: int, zoom: int, x: int, y: int):
+    """Query conditions on the stored tiles covering tile (zoom, x, y), and their zoom."""
+    source = _source(zoom)
+    if source is None:
+        return None, None
+    if source >= zoom:
+        f = 2 ** (source - zoom)
+        x_range, y_range = (x * f, x * f + f - 1), (y * f, y * f + f - 1)
+    else:
+        f = 2 ** (zoom - source)
+        x_range, y_range = (x // f, x // f), (y // f, y // f)
+    return source, (
+        model.UserHeatmapTile.user_id == user_id,
+        model.UserHeatmapTile.zoom == source,
+        model.UserHeatmapTile.x.between(*x_range),
+        model.UserHeatmapTile.y.between(*y_range),
+    )
+
+
+def count_grid(session: Session, user_id: int, zoom: int, x: int, y: int) -> np.ndarray:
+    """(256, 256) counts of tile (zoom, x, y), derived from the stored zooms."""
+    grid = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.int64)
+    source, conditions = _source_filter(user_id, zoom, x, y)
+    if source is None:
+        return grid
+    for row in session.exec(select(model.UserHeatmapTile).where(*conditions)):
+        pixels = np.frombuffer(row.pixels, dtype=np.uint16).astype(np.int64)
+        counts = np.frombuffer(row.counts, dtype=np.uint32).astype(np.int64)
+        if source >= zoom:
+            # Each source pixel falls in one pixel of the requested tile
+            f = 2 ** (source - zoom)
+            gy = ((row.y - y * f) * TILE_SIZE + pixels // TILE_SIZE) // f
+            gx = ((row.x - x * f) * TILE_SIZE + pixels % TILE_SIZE) // f
+            np.maximum.at(grid, (gy, gx), counts)
+        else:
+            # The requested tile is a block of the source tile, scaled up
+            f = 2 ** (zoom - source)
+            size = TILE_SIZE // f
+            source_grid = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.int64)
+            source_grid.flat[pixels] = counts
+            block = source_grid[(y % f) * size:(y % f + 1) * size, (x % f) * size:(x % f + 1) * size]
+            grid = np.repeat(np.repeat(block, f, axis=0), f, axis=1)
+    return grid
+
+
+def render_png(grid: np.ndarray) -> bytes:
+    """RGBA PNG of a count grid, transparent where the count is 0."""
+    level = np.clip(np.log1p(grid) / np.log1p(HEATMAP_SATURATION), 0.0, 1.0)
+    rgba = np.stack([np.interp(level, _COLOR_STOPS, _COLORS[:, c]) for c in range(4)], axis=-1)
+    rgba[grid == 0] = 0
+    buffer = io.BytesIO()
+    Image.fromarray(rgba.astype(np.uint8), "RGBA").save(buffer, format="PNG", optimize=False)
+    return buffer.getvalue()
+
+
+# DiskBackend is not thread-safe; requests share the process-wide one
+_png_cache_lock = threading.Lock()
+
+
+@utils.process_wide
+def get_png_cache() -> Optional[DiskBackend]:
+    """Process-wide PNG tile cache configured from the environment, None if HEATMAP_CACHE_DIR is empty."""
+    directory = os.getenv("HEATMAP_CACHE_DIR", "heatmap_cache")
+    max_bytes = int(os.getenv("HEATMAP_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+    return DiskBackend(directory, max_bytes) if directory else None
+
+
+def set_png_cache(cache: Optional[DiskBackend]):
+    """Replaces the process-wide PNG tile cache (None rebuilds it from the environment)."""
+    if cache is None:
+        get_png_cache.override()
+    else:
+        get_png_cache.override(cache)
+
+
+def heatmap_tile(session: Session, user_id: int, zoom: int, x: int, y: int) -> bytes:
+    """PNG heatmap tile (zoom, x, y) of the user, from the PNG cache when its source tiles are unchanged."""
+    source, conditions = _source_filter(user_id, zoom, x, y)
+    cache = get_png_cache()
+    if source is None or cache is None:
+        return render_png(count_grid(session, user_id, zoom, x, y))
+    # Source tiles are never touched without a new updated_at; deleted ones change the count
+    updated_at, tiles = session.exec(select(
+        func.max(model.UserHeatmapTile.updated_at), func.count(model.UserHeatmapTile.id)).where(*conditions)).one()
+    key = f"{zoom}/{x}/{y}|{updated_at.isoformat() if updated_at else ''}|{tiles}"
+    namespace = f"user-{user_id}"
+    with _png_cache_lock:
+        entry = cache.get(key, namespace)
+    if entry is not None:
+        return entry[1]
+    png = render_png(count_grid(session, user_id, zoom, x, y))
+    with _png_cache_lock:
+        cache.set(key, namespace, 0.0, png)
+    return png
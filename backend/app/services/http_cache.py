@@ -0,0 +1,75 @@
+"""HTTP validators and cache headers for activity read endpoints.
+
+Everything served for an activity is derived from its stored row, so a
+strong validator can be built from the activity id, `last_modified`,
+`val_hash` and the analysis version, plus whatever request parameters
+change the representation. The validator can be checked before the data
+blob is loaded, so a matching `If-None-Match` never pays for
+deserialization.
+"""
+
+import os
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Response
+
+# Bump when the derived outputs change for the same stored data, so that
+# clients holding old validators get fresh representations.
+ANALYSIS_VERSION = os.getenv("ANALYSIS_VERSION", "1")
+
+# Derived JSON/GPX/raw payloads: may be stored, but must be revalidated.
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def activity_map_cache_control() -> str:
+    """Rendered maps never change for a stored activity; allow reuse."""
+    max_age = int(os.getenv("ACTIVITY_MAP_MAX_AGE", "86400"))
+    return f"public, max-age={max_age}"
+
+
+def activity_etag(
+        activity_id: str,
+        last_modified: Optional[datetime],
+        val_hash: Optional[str],
+        *variant) -> str:
+    """
+    Strong ETag for a representation of an activity. `variant` holds any
+    request parameters or settings that change the representation.
+    """
+    parts = [
+        ANALYSIS_VERSION,
+        activity_id,
+        last_modified.isoformat() if last_modified else "",
+        val_hash or "",
+        *(str(v) for v in variant),
+    ]
+    digest = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag` (RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: Optional[str], cache_control: str = REVALIDATE_CACHE_CONTROL) -> dict[str, str]:
+    """Validator and Cache-Control headers; empty if there is no validator."""
+    if etag is None:
+        return {}
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
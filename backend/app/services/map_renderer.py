@@ -0,0 +1,176 @@
+"""Background rendering of the static activity maps.
+
+Rendering a map fetches its tiles and draws the track, which takes seconds
+on a cold tile cache. Uploads queue the render of the new activity instead
+of leaving it to the first view, and the map endpoint queues it (answering
+202 with a placeholder) if it is still missing. Jobs run on a bounded
+thread pool (MAP_RENDER_WORKERS) with their own DB sessions, and an
+activity is queued at most once at a time, so a list view asking for many
+maps at once renders each of them once. A failed render is not queued
+again for MAP_RENDER_RETRY_SECONDS.
+
+`backfill_static_maps` queues every activity without a map; it is
+available as the `static_maps` startup batch job of main.py.
+"""
+
+import os
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app import model
+from app.database import engine as app_engine
+from app.services import data_processing, maps, utils
+
+logger = logging.getLogger(__name__)
+
+# Data columns the maps are drawn from.
+MAP_COLUMNS = ('position_lat', 'position_long')
+
+# Seconds before a failed render can be queued again.
+MAP_RENDER_RETRY_SECONDS = float(os.getenv("MAP_RENDER_RETRY_SECONDS", "600"))
+
+
+def _track(activity: model.ActivityTable):
+    """Position columns of the activity data, None if it has no position at all."""
+    if not activity.data or not set(MAP_COLUMNS).issubset(data_processing.dataframe_columns(activity.data)):
+        return None
+    ride_df = data_processing.deserialize_dataframe(activity.data, columns=MAP_COLUMNS)
+    return ride_df if maps.has_gps_data(ride_df) else None
+
+
+def has_gps_track(activity: model.ActivityTable) -> bool:
+    """Whether a map can be drawn for the activity (indoor rides store all-NaN position columns)."""
+    return _track(activity) is not None
+
+
+def render_activity_map(session: Session, activity_id: str) -> bool:
+    """Renders and stores the static map of an activity that has none. Returns whether one was stored."""
+    activity = session.get(model.ActivityTable, activity_id)
+    if activity is None or activity.static_map:
+        return False
+    ride_df = _track(activity)
+    if ride_df is None:
+        return False
+    static_map = maps.get_activity_map(ride_df=ride_df, num_samples=200)
+    if not static_map:
+        return False
+    activity.static_map = static_map
+    session.add(activity)
+    session.commit()
+    return True
+
+
+class MapRenderer:
+    """
+    Renders static maps on `workers` threads with sessions of `engine`.
+    With no workers the jobs are only queued, until run_pending() renders
+    them in the calling thread (tests and scripts). Activities whose render
+    raised are not queued again for `retry_seconds`.
+    """
+
+    def __init__(self, engine: Engine, workers: int = 2, retry_seconds: float = MAP_RENDER_RETRY_SECONDS):
+        self.engine = engine
+        self.retry_seconds = retry_seconds
+        self.rendered = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="map-render") if workers > 0 else None
+        # Queued or running activity ids, with their job (None until run_pending)
+        self._pending: dict[str, Optional[Future]] = {}
+        # Monotonic time of the last failed render of each activity
+        self._failed_at: dict[str, float] = {}
+
+    def submit(self, activity_id: str) -> bool:
+        """Queues the render of an activity. Returns False if it is already queued or recently failed."""
+        with self._lock:
+            if activity_id in self._pending or self._retry_after(activity_id) > 0:
+                return False
+            self._pending[activity_id] = self._pool.submit(self._run, activity_id) if self._pool else None
+        return True
+
+    def is_pending(self, activity_id: str) -> bool:
+        with self._lock:
+            return activity_id in self._pending
+
+    def _retry_after(self, activity_id: str) -> float:
+        failed_at = self._failed_at.get(activity_id)
+        if failed_at is None:
+            return 0.0
+        remaining = failed_at + self.retry_seconds - time.monotonic()
+        if remaining <= 0:
+            del self._failed_at[activity_id]
+            return 0.0
+        return remaining
+
+    def retry_after(self, activity_id: str) -> float:
+        """Seconds until a failed render of the activity can be queued again, 0 if it can be now."""
+        with self._lock:
+            return self._retry_after(activity_id)
+
+    def _run(self, activity_id: str):
+        try:
+            with Session(self.engine) as session:
+                if render_activity_map(session, activity_id):
+                    with self._lock:
+                        self.rendered += 1
+        except Exception as e:
+            logger.warning(f"Failed to render the map of activity {activity_id}: {e}")
+            with self._lock:
+                self.failed += 1
+                self._failed_at[activity_id] = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending.pop(activity_id, None)
+
+    def run_pending(self):
+        """Renders the jobs queued without a worker in the calling thread."""
+        with self._lock:
+            queued = [activity_id for activity_id, job in self._pending.items() if job is None]
+        for activity_id in queued:
+            self._run(activity_id)
+
+    def wait(self):
+        """Blocks until every queued job is done."""
+        self.run_pending()
+        with self._lock:
+            jobs = [job for job in self._pending.values() if job is not None]
+        for job in jobs:
+            job.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "rendered": self.rendered, "failed": self.failed}
+
+
+@utils.process_wide
+def get_map_renderer() -> MapRenderer:
+    """Process-wide renderer on the application database, configured from the environment."""
+    return MapRenderer(app_engine, int(os.getenv("MAP_RENDER_WORKERS", "2")))
+
+
+def set_map_renderer(renderer: Optional[MapRenderer]):
+    """Replaces the process-wide renderer (None rebuilds it from the environment)."""
+    if renderer is None:
+        get_map_renderer.override()
+    else:
+        get_map_renderer.override(renderer)
+
+
+def backfill_static_maps(renderer: Optional[MapRenderer] = None) -> int:
+    """Renders the maps of all activities that have data but no map. Returns how many were queued."""
+    renderer = renderer or get_map_renderer()
+    with Session(renderer.engine) as session:
+        activity_ids = session.exec(select(model.ActivityTable.activity_id).where(
+            model.ActivityTable.static_map == None,
+            model.ActivityTable.data != None)).all()
+    logger.info(f"Rendering static maps of {len(activity_ids)} activities.")
+    queued = sum(renderer.submit(activity_id) for activity_id in activity_ids)
+    renderer.wait()
+    logger.info(f"Finished rendering static maps: {renderer.stats()}")
+    return queued
@@ -1,14 +1,17 @@
 import os
 import io
+import functools
 import numpy as np
 import pandas as pd
 import gpxpy
 import gpxpy.gpx
-from staticmap import StaticMap, Line
+from PIL import Image
+from staticmap import Line
 from fastapi import HTTPException
 
 
 from app.services import utils
+from app.services.tile_cache import CachedStaticMap
 
 def get_activity_map(ride_df: pd.DataFrame, num_samples: int):
     """ Creates a static map of an activity.
@@ -20,7 +23,7 @@ def get_activity_map(ride_df: pd.DataFrame, num_samples: int):
         return None
     w = int(os.getenv("STATIC_MAP_W", "400"))
     h = int(os.getenv("STATIC_MAP_H", "300"))
-    m = StaticMap(w, h, 10)
+    m = CachedStaticMap(w, h, 10)
     lat = utils.subsample_timeseries(df.position_lat, num_samples=num_samples)
     long = utils.subsample_timeseries(df.position_long, num_samples=num_samples)
     line = list(zip(long, lat))
@@ -30,9 +33,20 @@ def get_activity_map(ride_df: pd.DataFrame, num_samples: int):
     image.save(img_byte_arr, format='PNG')
     return img_byte_arr.getvalue()
 
+@functools.lru_cache(maxsize=1)
+def placeholder_map() -> bytes:
+    """Blank PNG of the static map size, served while a map is being rendered."""
+    w = int(os.getenv("STATIC_MAP_W", "400"))
+    h = int(os.getenv("STATIC_MAP_H", "300"))
+    img_byte_arr = io.BytesIO()
+    Image.new("RGB", (w, h), "#e5e3df").save(img_byte_arr, format='PNG')
+    return img_byte_arr.getvalue()
+
 def has_gps_data(activity_df):
-    return 'position_lat' in activity_df.columns and \
-        'position_long' in activity_df.columns
+    """Whether the activity has at least one position (indoor rides have all-NaN position columns)."""
+    if 'position_lat' not in activity_df.columns or 'position_long' not in activity_df.columns:
+        return False
+    return bool((activity_df['position_lat'].notna() & activity_df['position_long'].notna()).any())
 
 def get_activity_gpx(ride_df: pd.DataFrame):
     """
@@ -44,7 +58,7 @@ def get_activity_gpx(ride_df: pd.DataFrame):
     Returns:
         GPX file content as a string.
     """
-    if not has_gps_data(ride_df):
+    if 'position_lat' not in ride_df.columns or 'position_long' not in ride_df.columns:
         raise HTTPException(status_code=404, detail="GPS data not available")
 
     # Filter out rows with missing lat/long
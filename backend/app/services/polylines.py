@@ -0,0 +1,210 @@
+"""Encoded polylines of activity tracks, simplified with Ramer-Douglas-Peucker.
+
+The track is projected onto a local plane (equirectangular around its mean
+latitude, in m) and simplified with Ramer-Douglas-Peucker. Instead of
+recursing into one segment at a time, every round handles all the open
+segments at once: the distances of all their interior points come from one
+vectorized expression, and the farthest point of each segment from one
+reduceat. Rounds are as many as the depth of the recursion.
+
+The kept points are written in Google's encoded polyline format (1e-5
+degrees), also vectorized: the zigzag-encoded deltas are split into 5-bit
+chunks in a (points, 7) array and the used chunks are read in row order.
+
+Polylines are stored at ingest for each of POLYLINE_TOLERANCES
+(model.ActivityPolyline). The polyline endpoint picks the coarsest one
+that stays within half a pixel at the requested zoom, and the activity
+list can embed the coarsest one for thumbnails.
+"""
+
+import logging
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select, func
+
+from app import model
+from app.services import data_processing
+
+logger = logging.getLogger(__name__)
+
+# Simplification tolerances (m) of the stored polylines.
+POLYLINE_TOLERANCES = tuple(
+    float(t) for t in os.getenv("POLYLINE_TOLERANCES", "50,10,2").split(","))
+
+# Data columns the polylines are computed from.
+POLYLINE_COLUMNS = ('position_lat', 'position_long')
+
+EARTH_RADIUS = 6371000.0
+# Metres per pixel of 256 px web mercator tiles at zoom 0 on the equator.
+_METERS_PER_PIXEL_Z0 = 2 * np.pi * 6378137.0 / 256
+
+
+def tolerance_for_zoom(zoom: float) -> float:
+    """Half a pixel (m) at `zoom` on the equator, the coarsest tolerance invisible on the map."""
+    return 0.5 * _METERS_PER_PIXEL_Z0 / 2.0 ** zoom
+
+
+def simplify(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Positions of the points of the (x, y) line kept by Ramer-Douglas-Peucker
+    with `tolerance` (same unit as x and y), always including both ends.
+    """
+    n = len(x)
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    tolerance2 = tolerance * tolerance
+    while len(starts):
+        counts = ends - starts - 1
+        open_segments = counts > 0
+        starts, ends, counts = starts[open_segments], ends[open_segments], counts[open_segments]
+        if not len(starts):
+            break
+        # Interior points of every segment, segment by segment
+        segment = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.cumsum(counts) - counts
+        index = np.arange(counts.sum()) - offsets[segment] + starts[segment] + 1
+
+        # Squared distance to the segment (not the infinite line, so closed
+        # loops whose ends coincide still split)
+        ax, ay = x[starts][segment], y[starts][segment]
+        dx, dy = x[ends][segment] - ax, y[ends][segment] - ay
+        length2 = dx * dx + dy * dy
+        px, py = x[index] - ax, y[index] - ay
+        t = np.clip(np.divide(px * dx + py * dy, length2, out=np.zeros_like(px), where=length2 > 0), 0.0, 1.0)
+        distance2 = (px - t * dx) ** 2 + (py - t * dy) ** 2
+
+        farthest = np.maximum.reduceat(distance2, offsets)
+        split_at = np.minimum.reduceat(np.where(distance2 == farthest[segment], index, n), offsets)
+        split = farthest > tolerance2
+        split_at = split_at[split]
+        keep[split_at] = True
+        starts, ends = np.concatenate((starts[split], split_at)), np.concatenate((split_at, ends[split]))
+    return np.flatnonzero(keep)
+
+
+def encode(lat: np.ndarray, lon: np.ndarray, precision: int = 5) -> str:
+    """Google encoded polyline of the points (degrees)."""
+    if len(lat) == 0:
+        return ""
+    scale = 10 ** precision
+    coords = np.column_stack((np.round(np.asarray(lat) * scale), np.round(np.asarray(lon) * scale))).astype(np.int64)
+    deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    # 5-bit chunks, least significant first; 7 chunks hold any 32 bit value
+    shifts = np.arange(7) * 5
+    rest = values[:, None] >> shifts
+    used = (rest > 0) | (shifts == 0)
+    chunks = (rest & 0x1f) | np.where(rest >> 5 > 0, 0x20, 0)
+    return (chunks[used] + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def _track(ride_df: Optional[pd.DataFrame]) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    if ride_df is None or ride_df.empty or not set(POLYLINE_COLUMNS).issubset(ride_df.columns):
+        return None
+    lat = pd.to_numeric(ride_df['position_lat'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(ride_df['position_long'], errors='coerce').to_numpy(dtype=float)
+    valid = ~np.isnan(lat) & ~np.isnan(lon)
+    if not valid.any():
+        return None
+    return lat[valid], lon[valid]
+
+
+def activity_polylines(ride_df: Optional[pd.DataFrame], tolerances: Sequence[float]) -> list[dict]:
+    """{tolerance, points, polyline} of the track simplified with each of `tolerances` (m), [] without GPS data."""
+    track = _track(ride_df)
+    if track is None:
+        return []
+    lat, lon = track
+    lat0 = np.radians(lat.mean())
+    x = EARTH_RADIUS * np.cos(lat0) * np.radians(lon - lon[0])
+    y = EARTH_RADIUS * np.radians(lat - lat[0])
+    polylines = []
+    for tolerance in tolerances:
+        kept = simplify(x, y, tolerance)
+        polylines.append({"tolerance": tolerance, "points": len(kept), "polyline": encode(lat[kept], lon[kept])})
+    return polylines
+
+
+def _delete_activity_polylines(session: Session, activity_id: str):
+    for row in session.exec(select(model.ActivityPolyline).where(model.ActivityPolyline.activity_id == activity_id)):
+        session.delete(row)
+
+
+def store_activity_polylines(session: Session, activity: model.ActivityTable, ride_df: Optional[pd.DataFrame]):
+    """Computes and stores (or replaces) the polylines of `activity`."""
+    _delete_activity_polylines(session, activity.activity_id)
+    # Flush the deletes first: the new rows reuse the (activity_id, tolerance) keys
+    session.flush()
+    for polyline in activity_polylines(ride_df, POLYLINE_TOLERANCES):
+        session.add(model.ActivityPolyline(activity_id=activity.activity_id, **polyline))
+    session.flush()
+
+
+def remove_activity_polylines(session: Session, activity: model.ActivityTable):
+    """Deletes the stored polylines of `activity`."""
+    _delete_activity_polylines(session, activity.activity_id)
+    session.flush()
+
+
+def backfill_user_polylines(session: Session, user_id: int):
+    """Stores the polylines of the user's activities with GPS data that miss one of the configured tolerances."""
+    complete = select(model.ActivityPolyline.activity_id).where(
+        model.ActivityPolyline.tolerance.in_(POLYLINE_TOLERANCES),
+    ).group_by(model.ActivityPolyline.activity_id).having(
+        func.count(model.ActivityPolyline.id) == len(set(POLYLINE_TOLERANCES)))
+    activities = session.exec(select(model.ActivityTable).where(
+        model.ActivityTable.owner_id == user_id,
+        model.ActivityTable.activity_id.not_in(complete))).all()
+    for activity in activities:
+        if not activity.data or not set(POLYLINE_COLUMNS).issubset(data_processing.dataframe_columns(activity.data)):
+            continue
+        try:
+            df = data_processing.deserialize_dataframe(activity.data, columns=POLYLINE_COLUMNS)
+            store_activity_polylines(session, activity, df)
+        except Exception as e:
+            logger.warning(f"Failed to compute the polylines of activity {activity.activity_id}: {e}")
+    session.flush()
+
+
+def pick_polyline(candidates: Sequence[dict], zoom: Optional[float] = None) -> Optional[dict]:
+    """
+    The polyline for `zoom` among {tolerance, points, polyline} records:
+    the coarsest within tolerance_for_zoom, else the finest one. Without a
+    zoom, the finest one. None if there are no candidates.
+    """
+    candidates = sorted(candidates, key=lambda c: c["tolerance"])
+    if not candidates:
+        return None
+    if zoom is not None:
+        fitting = [c for c in candidates if c["tolerance"] <= tolerance_for_zoom(zoom)]
+        if fitting:
+            return fitting[-1]
+    return candidates[0]
+
+
+def stored_polyline(session: Session, activity_id: str, zoom: Optional[float] = None) -> Optional[dict]:
+    """Stored polyline of an activity for `zoom` (see pick_polyline), None if nothing is stored."""
+    rows = session.exec(select(model.ActivityPolyline).where(model.ActivityPolyline.activity_id == activity_id)).all()
+    return pick_polyline([{"tolerance": r.tolerance, "points": r.points, "polyline": r.polyline} for r in rows], zoom)
+
+
+def thumbnail_polylines(session: Session, activity_ids: Sequence[str]) -> dict[str, str]:
+    """Coarsest stored polyline of each of the activities that have one, by activity id."""
+    if not activity_ids:
+        return {}
+    coarsest = select(
+        model.ActivityPolyline.activity_id, func.max(model.ActivityPolyline.tolerance).label("tolerance"),
+    ).where(model.ActivityPolyline.activity_id.in_(activity_ids)).group_by(
+        model.ActivityPolyline.activity_id).subquery()
+    rows = session.exec(select(model.ActivityPolyline.activity_id, model.ActivityPolyline.polyline).join(
+        coarsest,
+        (model.ActivityPolyline.activity_id == coarsest.c.activity_id) &
+        (model.ActivityPolyline.tolerance == coarsest.c.tolerance))).all()
+    return dict(rows)
@@ -1,5 +1,6 @@
 import os
 import pandas as pd
+from functools import cached_property
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Sequence, Optional
@@ -9,48 +10,286 @@ from app.services import utils
 # Configuration
 POWER_CURVE_PERIODS = [int(p) for p in os.getenv("POWER_CURVE_PERIODS", "3,6,12").split(",")]
 
-def calculate_power_curve(ride_df: pd.DataFrame) -> list[dict[str, int | float]]:
-    if ride_df is None or ride_df.empty or 'power' not in ride_df.columns:
-        return []
+# Quantile levels stored in PowerSummary.quantiles (0%, 1%, ..., 100%).
+QUANTILE_LEVELS = np.linspace(0.0, 1.0, 101)
 
-    # Ensure timestamp is datetime and sort
-    df = ride_df.copy()
-    if 'timestamp' not in df.columns:
-        return []
-    
-    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
-        if pd.api.types.is_numeric_dtype(df['timestamp']):
-             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-        else:
-             df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    df = df.sort_values('timestamp')
-    df = df.set_index('timestamp')
-    
-    # Resample to 1s. Fill missing power with 0.
-    df_resampled = df[['power']].resample('1s').mean().fillna(0)
-    
-    power_series = df_resampled['power']
-    total_duration = len(power_series)
-    
-    durations = [1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 10800, 14400, 18000]
-    
-    curve = []
-    
-    for duration in durations:
-        if duration > total_duration:
-            break
-            
-        max_power = power_series.rolling(window=duration).mean().max()
-        
-        if pd.notna(max_power):
-            curve.append({
-                "duration": duration,
-                "max_watts": float(max_power)
-            })
-            
+# Durations (s) of the standard power curve.
+POWER_CURVE_DURATIONS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 10800, 14400, 18000)
+
+# Duration grids accepted by calculate_power_curve_arrays.
+POWER_CURVE_GRIDS = ("standard", "log", "full")
+
+# Longest duration (s) the 'full' grid has every second of; longer ones
+# follow the 'log' grid. Each duration is a pass over the data, so every
+# second of a long ride would be O(D^2).
+FULL_GRID_MAX_SECONDS = 3600
+
+# Longest time (s) a single sample counts for in time-in-zones; longer
+# gaps between samples are pauses.
+MAX_SAMPLE_SECONDS = 10.0
+
+# Top bin of the stored histograms: higher values (sensor glitches, e.g.
+# 65535 W) are counted in it, so they cannot blow up the histogram length.
+HISTOGRAM_MAX_VALUE = 3000
+
+# Seconds the 1 s resampling of a curve metric holds a sample over the
+# empty bins after it: heart rate carries on between sparse samples while
+# power is 0 W as soon as there is no sample.
+CURVE_HOLD_SECONDS = {'power': 0, 'heart_rate': int(MAX_SAMPLE_SECONDS)}
+
+def resample_power_1hz(ride_df: pd.DataFrame) -> np.ndarray:
+    """
+    Power resampled to 1 s bins aligned on whole seconds, from the first to
+    the last sample. Each bin holds the mean of its samples; bins without
+    samples are 0. Equivalent to `resample('1s').mean().fillna(0)`.
+    """
+    return resample_1hz(ride_df, 'power')
+
+def resample_1hz(ride_df: pd.DataFrame, column: str) -> np.ndarray:
+    """`column` resampled to 1 s bins, as resample_power_1hz."""
+    return _resample_1hz(ride_df, column)[0]
+
+def _resample_1hz(ride_df: pd.DataFrame, column: str, hold_seconds: int = 0) -> tuple[np.ndarray, int]:
+    """
+    1 s bins of `column` and the epoch second of the first bin (0 if there
+    is none). Empty bins up to `hold_seconds` after a sample keep its value.
+    """
+    if ride_df is None or ride_df.empty or column not in ride_df.columns or 'timestamp' not in ride_df.columns:
+        return np.zeros(0), 0
+    timestamps = ride_df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps) and pd.api.types.is_numeric_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, unit='s')
+    timestamps_ns = utils.to_epoch_ns(timestamps)
+    values = pd.to_numeric(ride_df[column], errors='coerce').to_numpy(dtype=float)
+
+    known = timestamps_ns != utils.NAT_NS
+    if not known.any():
+        return np.zeros(0), 0
+    seconds = timestamps_ns[known] // 1_000_000_000
+    values = values[known]
+    start_second = int(seconds.min())
+    bins = seconds - start_second
+    valid = ~np.isnan(values)
+    num_bins = int(bins.max()) + 1
+    sums = np.bincount(bins[valid], weights=values[valid], minlength=num_bins)
+    counts = np.bincount(bins[valid], minlength=num_bins)
+    resampled = np.divide(sums, counts, out=np.zeros(num_bins), where=counts > 0)
+    if hold_seconds > 0:
+        positions = np.arange(num_bins)
+        last = np.maximum.accumulate(np.where(counts > 0, positions, -1))
+        held = (counts == 0) & (last >= 0) & (positions - last <= hold_seconds)
+        resampled[held] = resampled[last[held]]
+    return resampled, start_second
+
+def _curve_1hz(ride_df: pd.DataFrame, column: str) -> tuple[np.ndarray, int]:
+    """_resample_1hz of a curve metric, with its CURVE_HOLD_SECONDS."""
+    return _resample_1hz(ride_df, column, CURVE_HOLD_SECONDS.get(column, 0))
+
+def power_curve_grid(length: int, grid: str = "standard", points_per_decade: int = 24) -> np.ndarray:
+    """
+    Durations (s) of a power curve over `length` seconds of data:
+    'standard' are the POWER_CURVE_DURATIONS, 'log' is a log-spaced grid
+    with `points_per_decade` durations per factor of 10 (plus the standard
+    ones) and 'full' is every duration from 1 s to `length`, up to
+    FULL_GRID_MAX_SECONDS and the 'log' grid above.
+    """
+    if grid not in POWER_CURVE_GRIDS:
+        raise ValueError(f"Unknown power curve grid: {grid}")
+    if length <= 0:
+        return np.zeros(0, dtype=np.int64)
+    every_second = np.arange(1, min(length, FULL_GRID_MAX_SECONDS) + 1, dtype=np.int64)
+    if grid == "full" and length <= FULL_GRID_MAX_SECONDS:
+        return every_second
+    standard = np.array(POWER_CURVE_DURATIONS, dtype=np.int64)
+    standard = standard[standard <= length]
+    if grid == "standard":
+        return standard
+    num = int(np.ceil(np.log10(length) * points_per_decade)) + 1
+    log_grid = np.union1d(np.rint(np.geomspace(1, length, num)).astype(np.int64), standard)
+    if grid == "full":
+        return np.union1d(every_second, log_grid)
+    return log_grid
+
+def mean_max_power(power_1hz: np.ndarray, durations: np.ndarray) -> np.ndarray:
+    """
+    Best average power over every window of each duration (in samples),
+    from one cumulative sum: the window sums of a duration are a single
+    strided difference of the prefix sums, so each duration costs O(N).
+    """
+    return mean_max_efforts(power_1hz, durations)[0]
+
+def mean_max_efforts(power_1hz: np.ndarray, durations: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    mean_max_power and the start offset (in samples) of the best window of
+    each duration, taken with argmax in the same pass. Offsets of durations
+    longer than the data are -1.
+    """
+    power_1hz = np.asarray(power_1hz, dtype=float)
+    durations = np.asarray(durations, dtype=np.int64)
+    prefix = np.concatenate(([0.0], np.cumsum(power_1hz)))
+    best = np.full(len(durations), np.nan)
+    offsets = np.full(len(durations), -1, dtype=np.int64)
+    n = len(power_1hz)
+    for i, d in enumerate(durations):
+        if 0 < d <= n:
+            sums = prefix[d:] - prefix[:-d]
+            offsets[i] = np.argmax(sums)
+            best[i] = sums[offsets[i]] / d
+    return best, offsets
+
+def effort_start_times(start_second: int, offsets: np.ndarray) -> list[Optional[str]]:
+    """UTC ISO timestamps of the efforts starting `offsets` seconds after `start_second`."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    times = np.datetime_as_string(
+        np.datetime64(start_second, 's') + offsets, unit='s', timezone='UTC')
+    return [t if o >= 0 else None for t, o in zip(times.tolist(), offsets.tolist())]
+
+def calculate_power_curve_efforts(
+        ride_df: pd.DataFrame,
+        grid: str = "standard") -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
+    """
+    calculate_power_curve_arrays plus where each best window starts: its
+    offset (s) from the first sample and its UTC timestamp.
+    """
+    return calculate_curve_efforts(ride_df, grid, 'power')
+
+def calculate_curve_efforts(
+        ride_df: pd.DataFrame,
+        grid: str = "standard",
+        column: str = 'power') -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
+    """calculate_power_curve_efforts of any curve metric (e.g. 'heart_rate')."""
+    values_1hz, start_second = _curve_1hz(ride_df, column)
+    durations = power_curve_grid(len(values_1hz), grid)
+    best, offsets = mean_max_efforts(values_1hz, durations)
+    defined = ~np.isnan(best)
+    offsets = offsets[defined]
+    return durations[defined], best[defined], offsets, effort_start_times(start_second, offsets)
+
+def calculate_power_curve_arrays(ride_df: pd.DataFrame, grid: str = "standard") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Mean-maximal power curve as (durations, max_watts) arrays, on the
+    durations of `grid` (see power_curve_grid).
+    """
+    return calculate_power_curve_efforts(ride_df, grid)[:2]
+
+def compact_power_curve(
+        durations: np.ndarray,
+        max_watts: np.ndarray,
+        start_offsets: Optional[np.ndarray] = None,
+        start_times: Optional[Sequence[Optional[str]]] = None,
+        value_key: str = "max_watts") -> dict[str, list]:
+    """Column-oriented power curve: {"duration": [...], "max_watts": [...], ...}."""
+    curve = {"duration": np.asarray(durations).tolist(), value_key: np.asarray(max_watts, dtype=float).tolist()}
+    if start_offsets is not None:
+        curve["start_offset"] = np.asarray(start_offsets).tolist()
+    if start_times is not None:
+        curve["start_time"] = list(start_times)
     return curve
 
+def calculate_power_curve(ride_df: pd.DataFrame, grid: str = "standard") -> list[dict[str, int | float | str]]:
+    """
+    Mean-maximal power curve as {duration, max_watts, start_offset,
+    start_time} records, the last two locating the best window.
+    """
+    durations, max_watts, offsets, start_times = calculate_power_curve_efforts(ride_df, grid)
+    return [
+        {"duration": d, "max_watts": w, "start_offset": o, "start_time": t}
+        for d, w, o, t in zip(durations.tolist(), max_watts.tolist(), offsets.tolist(), start_times)
+    ]
+
+def calculate_hr_curve(ride_df: pd.DataFrame, grid: str = "standard") -> list[dict[str, int | float | str]]:
+    """
+    Best sustained heart rate as {duration, max_bpm, start_offset,
+    start_time} records, computed like calculate_power_curve.
+    """
+    durations, max_bpm, offsets, start_times = calculate_curve_efforts(ride_df, grid, 'heart_rate')
+    return [
+        {"duration": d, "max_bpm": b, "start_offset": o, "start_time": t}
+        for d, b, o, t in zip(durations.tolist(), max_bpm.tolist(), offsets.tolist(), start_times)
+    ]
+
+# Grid of the curves stored per activity (model.ActivityPowerCurve): a
+# log-spaced grid up to 24 h that contains the standard durations. A stored
+# curve holds the values of the first durations that fit in the activity.
+# Bump STORED_CURVE_VERSION whenever the grid, the curve computation or the
+# other stored aggregates (offsets, histograms, heart rate curve, best
+# efforts) change.
+STORED_CURVE_DURATIONS = power_curve_grid(86400, "log")
+STORED_CURVE_VERSION = 6
+
+def stored_power_curve(ride_df: pd.DataFrame) -> np.ndarray:
+    """Max watts of `ride_df` on the leading STORED_CURVE_DURATIONS that fit in it."""
+    return stored_power_efforts(ride_df)[0]
+
+def stored_power_efforts(ride_df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    stored_power_curve, the start offsets (s) of its best windows and the
+    epoch second of the first sample they are relative to.
+    """
+    return stored_curve_efforts(ride_df, 'power')
+
+def stored_curve_efforts(ride_df: pd.DataFrame, column: str) -> tuple[np.ndarray, np.ndarray, int]:
+    """stored_power_efforts of any curve metric (e.g. 'heart_rate')."""
+    values_1hz, start_second = _curve_1hz(ride_df, column)
+    durations = STORED_CURVE_DURATIONS[STORED_CURVE_DURATIONS <= len(values_1hz)]
+    best, offsets = mean_max_efforts(values_1hz, durations)
+    return best, offsets, start_second
+
+def _stack_curves(curves: Sequence[np.ndarray]) -> np.ndarray:
+    matrix = np.full((len(curves), len(STORED_CURVE_DURATIONS)), np.nan)
+    for i, curve in enumerate(curves):
+        matrix[i, :len(curve)] = curve
+    return matrix
+
+def merge_stored_curves(curves: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Best max watts per STORED_CURVE_DURATIONS over several stored curves:
+    the curves are stacked in a NaN padded matrix and reduced with one
+    NaN-ignoring max. Durations no curve reaches are NaN.
+    """
+    if len(curves) == 0:
+        return np.full(len(STORED_CURVE_DURATIONS), np.nan)
+    return np.fmax.reduce(_stack_curves(curves), axis=0)
+
+def stored_curve_sources(curves: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Index in `curves` of the curve holding the merged max of each of the
+    STORED_CURVE_DURATIONS (the first one on ties), -1 if none reaches it.
+    """
+    if len(curves) == 0:
+        return np.full(len(STORED_CURVE_DURATIONS), -1, dtype=np.int64)
+    matrix = _stack_curves(curves)
+    missing = np.isnan(matrix)
+    sources = np.argmax(np.where(missing, -np.inf, matrix), axis=0)
+    return np.where(missing.all(axis=0), -1, sources)
+
+def stored_curve_records(
+        max_watts: np.ndarray,
+        durations: Sequence[int] = POWER_CURVE_DURATIONS,
+        value_key: str = "max_watts") -> list[dict[str, int | float]]:
+    """Stored (or merged) curve values at `durations`, as {duration, max_watts} records."""
+    durations = np.asarray(durations, dtype=np.int64)
+    ix = np.searchsorted(STORED_CURVE_DURATIONS, durations)
+    known = ix < len(max_watts)
+    durations, values = durations[known], np.asarray(max_watts)[ix[known]]
+    defined = ~np.isnan(values)
+    return [
+        {"duration": d, value_key: w}
+        for d, w in zip(durations[defined].tolist(), values[defined].tolist())
+    ]
+
+def _in_period(activity_date: datetime, period_months: int) -> bool:
+    """True if `activity_date` falls in the last `period_months` (30 day months)."""
+    now = datetime.now(activity_date.tzinfo)
+
+    if activity_date.tzinfo is None and now.tzinfo is not None:
+        activity_date = activity_date.replace(tzinfo=now.tzinfo)
+    elif activity_date.tzinfo is not None and now.tzinfo is None:
+        now = now.replace(tzinfo=activity_date.tzinfo)
+
+    cutoff = now - timedelta(days=period_months * 30)
+    return activity_date >= cutoff
+
 def merge_power_curves(curve1: list[dict[str, int | float]] | None, curve2: list[dict[str, int | float]] | None) -> list[dict[str, int | float]]:
     if not curve1:
         return curve2 or []
@@ -87,69 +326,272 @@ def update_user_curves_incremental(
             
     ensure_curve('all')
     user_curves['all'] = merge_power_curves(user_curves['all'], new_curve)
-    
-    now = datetime.now(activity_date.tzinfo) 
-    
-    if activity_date.tzinfo is None and now.tzinfo is not None:
-        activity_date = activity_date.replace(tzinfo=now.tzinfo)
-    elif activity_date.tzinfo is not None and now.tzinfo is None:
-        now = now.replace(tzinfo=activity_date.tzinfo)
 
     for period_months in POWER_CURVE_PERIODS:
         key = f"{period_months}m"
         ensure_curve(key)
-        
-        cutoff = now - timedelta(days=period_months * 30)
-        
-        if activity_date >= cutoff:
+
+        if _in_period(activity_date, period_months):
             user_curves[key] = merge_power_curves(user_curves[key], new_curve)
             
     return user_curves
 
-def calculate_time_in_zones(ride_df: pd.DataFrame, zones: Sequence[int]) -> list[float]:
-    if ride_df is None or ride_df.empty or 'power' not in ride_df.columns or not zones:
+def sample_seconds(ride_df: pd.DataFrame) -> np.ndarray:
+    """
+    Time (s) each sample stands for: the interval to the next sample,
+    capped at MAX_SAMPLE_SECONDS. The last sample gets the median interval
+    and samples without timestamp get 0. Without a timestamp column every
+    sample is 1 s.
+    """
+    n = len(ride_df)
+    if 'timestamp' not in ride_df.columns:
+        return np.ones(n)
+    timestamps_ns = utils.to_epoch_ns(ride_df['timestamp'])
+    known = np.flatnonzero(timestamps_ns != utils.NAT_NS)
+    seconds = np.zeros(n)
+    if len(known) == 0:
+        return seconds
+    order = known[np.argsort(timestamps_ns[known], kind='stable')]
+    dt = np.minimum(np.diff(timestamps_ns[order]) / 1e9, MAX_SAMPLE_SECONDS)
+    seconds[order[:-1]] = dt
+    seconds[order[-1]] = np.median(dt) if len(dt) else 1.0
+    return seconds
+
+def _zone_samples(ride_df: pd.DataFrame, column: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Values of `column` and the seconds each one counts for. Missing power
+    counts as 0 W; other missing values (e.g. no HR strap) count for 0 s.
+    """
+    values = pd.to_numeric(ride_df[column], errors='coerce').to_numpy(dtype=float)
+    seconds = sample_seconds(ride_df)
+    if column != 'power':
+        seconds[np.isnan(values)] = 0.0
+    return np.nan_to_num(values), seconds
+
+def calculate_time_in_zones(ride_df: pd.DataFrame, zones: Sequence[int], column: str = 'power') -> list[float]:
+    """
+    Seconds spent in each power (or `column`) zone: [0, zones[0]],
+    (zones[0], zones[1]], ..., (zones[-1], inf). Each sample counts for
+    its sample_seconds, see _zone_samples for missing values.
+    """
+    if ride_df is None or ride_df.empty or column not in ride_df.columns or not zones:
         return []
+    values, seconds = _zone_samples(ride_df, column)
+    zone_ix = np.searchsorted(np.sort(np.asarray(zones, dtype=float)), values, side='left')
+    return np.bincount(zone_ix, weights=seconds, minlength=len(zones) + 1).tolist()
 
-    power_series = pd.to_numeric(ride_df['power'], errors='coerce').fillna(0)
-    durations = np.ones(len(power_series))
+def power_histogram(ride_df: pd.DataFrame, column: str = 'power') -> np.ndarray:
+    """
+    Seconds spent at each power (or `column` value), in unit bins: bin w
+    holds the samples in (w - 1, w] (bin 0 those <= 0 W, the last bin
+    those above HISTOGRAM_MAX_VALUE - 1). Time in any integer zones up to
+    HISTOGRAM_MAX_VALUE is a sum of whole bins, see histogram_time_in_zones.
+    """
+    if ride_df is None or ride_df.empty or column not in ride_df.columns:
+        return np.zeros(0)
+    values, seconds = _zone_samples(ride_df, column)
+    bins = np.clip(np.ceil(values), 0, HISTOGRAM_MAX_VALUE).astype(np.int64)
+    return np.bincount(bins, weights=seconds)
 
-    bins = [0] + sorted(list(zones)) + [float('inf')]
+def merge_histograms(histograms: Sequence[np.ndarray]) -> np.ndarray:
+    """Sum of power histograms of different lengths."""
+    total = np.zeros(max((len(h) for h in histograms), default=0))
+    for histogram in histograms:
+        total[:len(histogram)] += histogram
+    return total
 
-    cuts = pd.cut(power_series, bins=bins, include_lowest=True, right=True)
+def histogram_time_in_zones(histogram: np.ndarray, zones: Sequence[int]) -> list[float]:
+    """calculate_time_in_zones from a power_histogram, by re-bucketing its bins."""
+    if not zones:
+        return []
+    zone_ix = np.searchsorted(np.sort(np.asarray(zones, dtype=float)), np.arange(len(histogram)), side='left')
+    return np.bincount(zone_ix, weights=histogram, minlength=len(zones) + 1).tolist()
 
-    zone_sums = pd.Series(durations).groupby(cuts.values, observed=False).sum()
+def _sorted_quantiles(sorted_values: np.ndarray, offsets: np.ndarray, counts: np.ndarray, levels: np.ndarray) -> np.ndarray:
+    """
+    Linear-interpolation quantiles (same as np.quantile) for several sorted
+    segments stored back to back in `sorted_values`. Returns an array of
+    shape (len(counts), len(levels)); segments must not be empty.
+    """
+    last = (counts - 1)[:, None]
+    virtual = last * levels[None, :]
+    below = np.floor(virtual)
+    gamma = virtual - below
+    below = below.astype(np.int64)
+    above = np.minimum(below + 1, last)
+    a = sorted_values[offsets[:, None] + below]
+    b = sorted_values[offsets[:, None] + above]
+    diff = b - a
+    return np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
 
-    return zone_sums.tolist()
 
-def compute_power_summary(df: pd.DataFrame) -> model.PowerSummary | None:
-    if df is None or df.empty or 'power' not in df.columns:
-        return None
+def _sorted_medians(sorted_values: np.ndarray, offsets: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Medians (same as np.median) for sorted segments stored back to back."""
+    upper = sorted_values[offsets + counts // 2]
+    lower = sorted_values[offsets + (counts - 1) // 2]
+    return np.where(counts % 2 == 1, upper, (lower + upper) / 2)
 
-    df_power = df['power'].dropna()
-    if df_power.empty:
-        return None
 
-    average_power = df_power.mean()
-    median_power = df_power.median()
+class PowerDistribution:
+    """
+    Power samples of an activity in time order together with their sorted
+    values. It is built once per activity, and the activity summary and
+    every lap summary are read from it without sorting again: a lap only
+    needs the global ranks of its samples to recover its own order.
+    """
+
+    def __init__(self, power_values: np.ndarray, timestamps_ns: Optional[np.ndarray] = None):
+        power_values = np.asarray(power_values, dtype=float)
+        self.timestamps_ns = None
+        if timestamps_ns is not None:
+            if len(timestamps_ns) > 1 and np.any(timestamps_ns[1:] < timestamps_ns[:-1]):
+                order = np.argsort(timestamps_ns, kind='stable')
+                timestamps_ns = timestamps_ns[order]
+                power_values = power_values[order]
+            self.timestamps_ns = timestamps_ns
+        self.power = power_values
+
+        valid = ~np.isnan(power_values)
+        # Positions (in time order) of the samples with power.
+        self.valid_ix = np.flatnonzero(valid)
+        self.valid_power = power_values[valid]
+
+        # Work of every sample over the time since the previous one. Samples
+        # without a timestamp sort first and never contribute.
+        self.sample_work = np.zeros(len(power_values))
+        if self.timestamps_ns is not None and len(power_values) > 1:
+            ts = self.timestamps_ns
+            dt = np.where(ts[:-1] != utils.NAT_NS, np.diff(ts) / 1e9, 0.0)
+            self.sample_work[1:] = np.where(valid[1:], power_values[1:], 0.0) * dt
+
+    @cached_property
+    def _sort_order(self) -> np.ndarray:
+        return np.argsort(self.valid_power, kind='stable')
+
+    @cached_property
+    def sorted_power(self) -> np.ndarray:
+        """Valid power samples in ascending order. Sorted on first use."""
+        return self.valid_power[self._sort_order]
+
+    @cached_property
+    def rank(self) -> np.ndarray:
+        """Position of every valid sample in `sorted_power`."""
+        rank = np.empty(len(self._sort_order), dtype=np.int64)
+        rank[self._sort_order] = np.arange(len(self._sort_order))
+        return rank
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'PowerDistribution | None':
+        if df is None or df.empty or 'power' not in df.columns:
+            return None
+        power_values = pd.to_numeric(df['power'], errors='coerce').to_numpy(dtype=float)
+        timestamps_ns = utils.to_epoch_ns(df['timestamp']) if 'timestamp' in df.columns else None
+        return cls(power_values, timestamps_ns)
+
+    def summary(self, include_quantiles: bool = True) -> model.PowerSummary | None:
+        """
+        Power summary of the whole activity. Without quantiles the median
+        comes from a partition and the samples are never sorted.
+        """
+        n = len(self.valid_power)
+        if n == 0:
+            return None
+        quantiles = None
+        if include_quantiles:
+            offsets = np.zeros(1, dtype=np.int64)
+            counts = np.array([n])
+            median = _sorted_medians(self.sorted_power, offsets, counts)[0]
+            quantiles = _sorted_quantiles(self.sorted_power, offsets, counts, QUANTILE_LEVELS)[0].tolist()
+        else:
+            median = np.median(self.valid_power)
+        return model.PowerSummary.model_construct(
+            average_power=float(np.mean(self.valid_power)),
+            median_power=float(median),
+            total_work=float(np.sum(self.sample_work) / 1000.0),
+            quantiles=quantiles
+        )
+
+    def segment_stats(self, start_ns: np.ndarray, end_ns: np.ndarray, include_quantiles: bool = True) -> dict[str, np.ndarray]:
+        """
+        Power statistics of the time segments [start_ns[i], end_ns[i]], both
+        ends inclusive. Returns arrays indexed by segment: 'count', 'average',
+        'median', 'max', 'work' (kJ) and 'quantiles' of shape
+        (segments, 101), left NaN without `include_quantiles`. Statistics of
+        segments without power are NaN.
+        """
+        num = len(start_ns)
+        stats = {
+            'count': np.zeros(num, dtype=np.int64),
+            'average': np.full(num, np.nan),
+            'median': np.full(num, np.nan),
+            'max': np.full(num, np.nan),
+            'work': np.zeros(num),
+            'quantiles': np.full((num, len(QUANTILE_LEVELS)), np.nan),
+        }
+        if self.timestamps_ns is None or num == 0:
+            return stats
+
+        starts = np.searchsorted(self.timestamps_ns, start_ns, side='left')
+        ends = np.searchsorted(self.timestamps_ns, end_ns, side='right')
+        # The first sample of a segment has no previous sample inside it.
+        stats['work'] = utils.segment_reduce(np.add, self.sample_work, np.minimum(starts + 1, ends), ends, empty=0.0) / 1000.0
+
+        valid_starts = np.searchsorted(self.valid_ix, starts)
+        valid_ends = np.maximum(np.searchsorted(self.valid_ix, ends), valid_starts)
+        counts = valid_ends - valid_starts
+        stats['count'] = counts
+        has_power = counts > 0
+        if not np.any(has_power):
+            return stats
+
+        sums = utils.segment_reduce(np.add, self.valid_power, valid_starts, valid_ends, empty=0.0)
+        stats['average'][has_power] = sums[has_power] / counts[has_power]
+        stats['max'] = utils.segment_reduce(np.fmax, self.valid_power, valid_starts, valid_ends)
+
+        # Gather the samples of all segments back to back and order them by
+        # (segment, global rank), which only sorts integer keys.
+        counts = counts[has_power]
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        segment_id = np.repeat(np.arange(len(counts)), counts)
+        members = np.repeat(valid_starts[has_power] - offsets, counts) + np.arange(counts.sum())
+        num_valid = len(self.valid_power)
+        keys = segment_id * num_valid + self.rank[members]
+        keys.sort()
+        segment_sorted = self.sorted_power[keys % num_valid]
 
-    total_work_joules = 0.0
-    if 'timestamp' in df.columns and not df_power.empty:
-        df_sorted = df.sort_values(by='timestamp').copy()
-        if not pd.api.types.is_datetime64_any_dtype(df_sorted['timestamp']):
-             df_sorted['timestamp'] = pd.to_datetime(df_sorted['timestamp'])
+        stats['median'][has_power] = _sorted_medians(segment_sorted, offsets, counts)
+        if include_quantiles:
+            stats['quantiles'][has_power] = _sorted_quantiles(segment_sorted, offsets, counts, QUANTILE_LEVELS)
+        return stats
 
-        df_sorted['time_diff'] = df_sorted['timestamp'].diff().dt.total_seconds()
 
-        valid_work_calc = df_sorted.dropna(subset=['power', 'time_diff'])
-        if not valid_work_calc.empty:
-            numeric_power = pd.to_numeric(valid_work_calc['power'], errors='coerce').fillna(0)
-            total_work_joules = (numeric_power * valid_work_calc['time_diff']).sum()
+def segment_power_summaries(stats: dict[str, np.ndarray]) -> list[model.PowerSummary | None]:
+    """Converts `PowerDistribution.segment_stats` output to PowerSummary models."""
+    summaries = []
+    for i, count in enumerate(stats['count']):
+        if count == 0:
+            summaries.append(None)
+            continue
+        summaries.append(model.PowerSummary.model_construct(
+            average_power=float(stats['average'][i]),
+            median_power=float(stats['median'][i]),
+            total_work=float(stats['work'][i]),
+            quantiles=stats['quantiles'][i].tolist()
+        ))
+    return summaries
 
-    power_quantiles = list(df_power.quantile([i/100.0 for i in range(101)]))
 
-    return model.PowerSummary(
-        average_power=float(average_power) if pd.notna(average_power) else 0.0,
-        median_power=float(median_power) if pd.notna(median_power) else 0.0,
-        total_work=float(total_work_joules / 1000.0),
-        quantiles=power_quantiles
-    )
+def compute_power_summary_arrays(power_values: np.ndarray, timestamps_ns: Optional[np.ndarray] = None) -> model.PowerSummary | None:
+    """
+    Power summary from a float power array (NaN for missing samples) and the
+    matching int64 nanosecond timestamps, if any. Work integrates power over
+    the time since the previous sample in timestamp order; samples without
+    a timestamp are ignored for work.
+    """
+    return PowerDistribution(power_values, timestamps_ns).summary()
+
+def compute_power_summary(df: pd.DataFrame) -> model.PowerSummary | None:
+    if df is None or df.empty or 'power' not in df.columns:
+        return None
+
+    return PowerDistribution.from_frame(df).summary()
@@ -0,0 +1,532 @@
+"""Per-activity power curves and the user curves merged from them.
+
+Each activity's curve is computed once at ingest and stored as a compact
+float64 array (model.ActivityPowerCurve). The curves of each calendar month
+are merged into a monthly bucket (model.UserMonthlyPowerCurve), so the best
+curve of any date range is a max over the buckets of the months it covers,
+plus the activity curves of the partial months at its ends. Adding,
+deleting or re-dating an activity only rebuilds the buckets of its months,
+and no query deserializes activity data. The buckets also sum the
+activities' 1 W power histograms, so time in zones over any range and
+zone configuration is a re-bucketing of the same rows. Heart rate gets
+the same curve, bucket and histogram treatment alongside power (see
+METRIC_COLUMNS), so riders without a power meter get the same analytics.
+
+The values of each activity curve at the standard durations are also kept
+as indexed rows (model.PowerBestEffort), so the top K efforts of a
+duration over any date range are an index scan.
+
+Critical Power fits of the envelopes (model.PowerProfileFit) are stored per
+period together with the envelope they were fitted on: a read refits only
+if the envelope changed, and ingest refits only the periods whose envelope
+the new activity raises.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select, func
+
+from app import model
+from app.services import critical_power, data_processing, power, utils
+
+logger = logging.getLogger(__name__)
+
+# Stored columns of each curve metric: (curve, start offsets, histogram).
+# The curve column is also the value key of its records.
+METRIC_COLUMNS = {
+    'power': ('max_watts', 'offsets', 'histogram'),
+    'heart_rate': ('max_bpm', 'hr_offsets', 'hr_histogram'),
+}
+
+
+def month_key(date: datetime) -> str:
+    return f"{date.year:04d}-{date.month:02d}"
+
+
+def _month_start(date: datetime) -> datetime:
+    return datetime(date.year, date.month, 1)
+
+
+def _next_month(date: datetime) -> datetime:
+    if date.month == 12:
+        return datetime(date.year + 1, 1, 1)
+    return datetime(date.year, date.month + 1, 1)
+
+
+def _shift_months(date: datetime, months: int) -> datetime:
+    """First day of the month `months` after the month of `date`."""
+    index = date.year * 12 + date.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def load_curve(row, metric: str = 'power') -> np.ndarray:
+    data = getattr(row, METRIC_COLUMNS[metric][0])
+    if data is None:
+        return np.zeros(0)
+    return np.frombuffer(data, dtype=np.float64)
+
+
+def load_histogram(row, metric: str = 'power') -> np.ndarray:
+    data = getattr(row, METRIC_COLUMNS[metric][2])
+    if data is None:
+        return np.zeros(0)
+    return np.frombuffer(data, dtype=np.float64)
+
+
+def _trim(curve: np.ndarray) -> np.ndarray:
+    """Drops the trailing durations no activity reached."""
+    defined = np.flatnonzero(~np.isnan(curve))
+    return curve[:defined[-1] + 1] if len(defined) else curve[:0]
+
+
+def store_activity_curve(
+        session: Session,
+        activity: model.ActivityTable,
+        ride_df: Optional[pd.DataFrame],
+        update_bucket: bool = True) -> np.ndarray:
+    """
+    Computes the stored power and heart rate curves of `activity` from
+    `ride_df` and adds (or replaces) its ActivityPowerCurve row and, with
+    `update_bucket`, the monthly bucket of its date. Returns the power curve.
+    """
+    row = session.get(model.ActivityPowerCurve, activity.activity_id)
+    if row is None:
+        row = model.ActivityPowerCurve(activity_id=activity.activity_id)
+    row.owner_id = activity.owner_id
+    row.date = activity.date
+    row.version = power.STORED_CURVE_VERSION
+    # The metrics with data are all resampled from the first sample of the activity
+    start_seconds = []
+    for metric, (curve_column, offsets_column, histogram_column) in METRIC_COLUMNS.items():
+        curve, offsets, start_second = power.stored_curve_efforts(ride_df, metric)
+        if len(curve):
+            start_seconds.append(start_second)
+        setattr(row, curve_column, curve.astype(np.float64).tobytes())
+        setattr(row, offsets_column, offsets.astype(np.int64).tobytes())
+        setattr(row, histogram_column, power.power_histogram(ride_df, metric).tobytes())
+    start_second = start_seconds[0] if start_seconds else 0
+    row.start_time = datetime.fromtimestamp(start_second, timezone.utc).replace(tzinfo=None)
+    session.add(row)
+    max_watts = load_curve(row)
+    _store_best_efforts(session, row)
+    if update_bucket:
+        session.flush()
+        rebuild_month_bucket(session, activity.owner_id, month_key(activity.date))
+        _raise_profile_fits(session, activity.owner_id, activity.date, max_watts)
+    return max_watts
+
+
+def _store_best_efforts(session: Session, row: model.ActivityPowerCurve):
+    """Replaces the PowerBestEffort rows of an activity with the values of its stored curve."""
+    for effort in session.exec(select(model.PowerBestEffort).where(
+            model.PowerBestEffort.activity_id == row.activity_id)):
+        session.delete(effort)
+    durations = np.asarray(power.POWER_CURVE_DURATIONS, dtype=np.int64)
+    ix = np.searchsorted(power.STORED_CURVE_DURATIONS, durations)
+    max_watts = load_curve(row)
+    offsets = np.frombuffer(row.offsets, dtype=np.int64)
+    known = ix < len(max_watts)
+    for duration, i in zip(durations[known].tolist(), ix[known].tolist()):
+        if max_watts[i] > 0:
+            session.add(model.PowerBestEffort(
+                owner_id=row.owner_id, activity_id=row.activity_id, duration=duration,
+                watts=float(max_watts[i]), start_offset=int(offsets[i]), date=row.date))
+
+
+def _activity_curves(session: Session, user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    q = select(model.ActivityPowerCurve).where(
+        model.ActivityPowerCurve.owner_id == user_id,
+        model.ActivityPowerCurve.version == power.STORED_CURVE_VERSION)
+    if start is not None:
+        q = q.where(model.ActivityPowerCurve.date >= start)
+    if end is not None:
+        q = q.where(model.ActivityPowerCurve.date < end)
+    return session.exec(q).all()
+
+
+def _write_bucket(session: Session, user_id: int, month: str, rows: list[model.ActivityPowerCurve]):
+    bucket = session.exec(select(model.UserMonthlyPowerCurve).where(
+        model.UserMonthlyPowerCurve.user_id == user_id,
+        model.UserMonthlyPowerCurve.month == month)).first()
+    if not rows:
+        if bucket is not None:
+            session.delete(bucket)
+        return
+    if bucket is None:
+        bucket = model.UserMonthlyPowerCurve(user_id=user_id, month=month)
+    bucket.version = power.STORED_CURVE_VERSION
+    for metric, (curve_column, _, histogram_column) in METRIC_COLUMNS.items():
+        curve = _trim(power.merge_stored_curves([load_curve(row, metric) for row in rows]))
+        histogram = power.merge_histograms([load_histogram(row, metric) for row in rows])
+        setattr(bucket, curve_column, curve.tobytes())
+        setattr(bucket, histogram_column, histogram.tobytes())
+    session.add(bucket)
+
+
+def rebuild_month_bucket(session: Session, user_id: int, month: str):
+    """Rebuilds one monthly bucket from the activity curves of that month."""
+    start = datetime.strptime(month, "%Y-%m")
+    rows = _activity_curves(session, user_id, start, _next_month(start))
+    _write_bucket(session, user_id, month, rows)
+    session.flush()
+
+
+def rebuild_month_buckets(session: Session, user_id: int):
+    """Rebuilds all the monthly buckets of a user from their activity curves."""
+    by_month = defaultdict(list)
+    for row in _activity_curves(session, user_id):
+        by_month[month_key(row.date)].append(row)
+    existing = session.exec(select(model.UserMonthlyPowerCurve).where(
+        model.UserMonthlyPowerCurve.user_id == user_id)).all()
+    for bucket in existing:
+        if bucket.month not in by_month:
+            session.delete(bucket)
+    for month, rows in by_month.items():
+        _write_bucket(session, user_id, month, rows)
+    session.flush()
+
+
+def _curve_rows(session: Session, user_id: int, start: Optional[datetime], end: Optional[datetime]) -> list:
+    """Monthly buckets of the whole months in [start, end) plus the activity curves of its partial months."""
+    start, end = utils.utc_naive(start), utils.utc_naive(end)
+    full_start = None
+    if start is not None:
+        full_start = start if start == _month_start(start) else _next_month(start)
+    full_end = _month_start(end) if end is not None else None
+
+    if full_start is not None and full_end is not None and full_start >= full_end:
+        # No whole month in the range
+        return list(_activity_curves(session, user_id, start, end))
+
+    q = select(model.UserMonthlyPowerCurve).where(
+        model.UserMonthlyPowerCurve.user_id == user_id,
+        model.UserMonthlyPowerCurve.version == power.STORED_CURVE_VERSION)
+    if full_start is not None:
+        q = q.where(model.UserMonthlyPowerCurve.month >= month_key(full_start))
+    if full_end is not None:
+        q = q.where(model.UserMonthlyPowerCurve.month < month_key(full_end))
+    rows = list(session.exec(q).all())
+    if start is not None and start < full_start:
+        rows.extend(_activity_curves(session, user_id, start, full_start))
+    if end is not None and full_end < end:
+        rows.extend(_activity_curves(session, user_id, full_end, end))
+    return rows
+
+
+def curve_between(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        metric: str = 'power') -> np.ndarray:
+    """
+    Best max watts (or bpm) on STORED_CURVE_DURATIONS over the user's
+    activities dated in [start, end) (unbounded if None). Whole months come
+    from the monthly buckets, the partial months at the ends from activity
+    curves.
+    """
+    rows = _curve_rows(session, user_id, start, end)
+    return power.merge_stored_curves([load_curve(row, metric) for row in rows])
+
+
+def time_in_zones_between(
+        session: Session,
+        user_id: int,
+        zones: Sequence[int],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        metric: str = 'power') -> list[float]:
+    """
+    Seconds in each power (or heart rate) zone over the user's activities
+    dated in [start, end), re-bucketed from the stored histograms of the
+    same monthly buckets and edge activities as curve_between.
+    """
+    rows = _curve_rows(session, user_id, start, end)
+    histograms = [load_histogram(row, metric) for row in rows]
+    return power.histogram_time_in_zones(power.merge_histograms(histograms), zones)
+
+
+def best_efforts_between(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        durations: Sequence[int] = power.POWER_CURVE_DURATIONS,
+        metric: str = 'power') -> list[dict]:
+    """
+    curve_between at `durations` as {duration, max_watts (or max_bpm),
+    activity_id, start_offset, start_time} records locating each best
+    effort. Only the activity curves of the months that hold a best are read.
+    """
+    curve_column, offsets_column, _ = METRIC_COLUMNS[metric]
+    rows = _curve_rows(session, user_id, start, end)
+    curves = [load_curve(row, metric) for row in rows]
+    best_values = power.merge_stored_curves(curves)
+    sources = power.stored_curve_sources(curves)
+    month_curves = {}
+    efforts = []
+    for duration in durations:
+        ix = int(np.searchsorted(power.STORED_CURVE_DURATIONS, duration))
+        if ix >= len(sources) or sources[ix] < 0:
+            continue
+        row = rows[sources[ix]]
+        if isinstance(row, model.UserMonthlyPowerCurve):
+            if row.month not in month_curves:
+                month = datetime.strptime(row.month, "%Y-%m")
+                month_curves[row.month] = _activity_curves(session, user_id, month, _next_month(month))
+            candidates = month_curves[row.month]
+            best = power.stored_curve_sources([load_curve(candidate, metric) for candidate in candidates])[ix]
+            row = candidates[best]
+        effort = {"duration": duration, curve_column: float(best_values[ix]), "activity_id": row.activity_id,
+                  "start_offset": None, "start_time": None}
+        offsets = getattr(row, offsets_column)
+        if offsets is not None and row.start_time is not None:
+            offset = int(np.frombuffer(offsets, dtype=np.int64)[ix])
+            effort["start_offset"] = offset
+            effort["start_time"] = (row.start_time + timedelta(seconds=offset)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        efforts.append(effort)
+    return efforts
+
+
+def top_efforts(
+        session: Session,
+        user_id: int,
+        duration: int,
+        limit: int = 10,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None) -> list[dict]:
+    """
+    The user's `limit` best efforts at `duration` (one of the
+    POWER_CURVE_DURATIONS) dated in [start, end), one per activity, as
+    {duration, max_watts, activity_id, start_offset, date} records from
+    highest to lowest.
+    """
+    q = select(model.PowerBestEffort).where(
+        model.PowerBestEffort.owner_id == user_id,
+        model.PowerBestEffort.duration == duration)
+    start, end = utils.utc_naive(start), utils.utc_naive(end)
+    if start is not None:
+        q = q.where(model.PowerBestEffort.date >= start)
+    if end is not None:
+        q = q.where(model.PowerBestEffort.date < end)
+    q = q.order_by(model.PowerBestEffort.watts.desc(), model.PowerBestEffort.date).limit(limit)
+    return [
+        {"duration": effort.duration, "max_watts": effort.watts, "activity_id": effort.activity_id,
+         "start_offset": effort.start_offset, "date": effort.date}
+        for effort in session.exec(q)
+    ]
+
+
+def user_curves(session: Session, user_id: int) -> dict:
+    """User power curves: 'all' and one per POWER_CURVE_PERIODS (30 day months up to now)."""
+    curves = {'all': power.stored_curve_records(curve_between(session, user_id))}
+    for period_months in power.POWER_CURVE_PERIODS:
+        cutoff = datetime.now() - timedelta(days=period_months * 30)
+        curves[f"{period_months}m"] = power.stored_curve_records(curve_between(session, user_id, cutoff))
+    return curves
+
+
+def _has_missing_curves(session: Session, user_id: int) -> bool:
+    num_activities = session.exec(
+        select(func.count(model.ActivityTable.activity_id)).where(model.ActivityTable.owner_id == user_id)
+    ).one()
+    num_curves = session.exec(
+        select(func.count(model.ActivityPowerCurve.activity_id)).where(
+            model.ActivityPowerCurve.owner_id == user_id,
+            model.ActivityPowerCurve.version == power.STORED_CURVE_VERSION)
+    ).one()
+    return num_curves < num_activities
+
+
+def _backfill_curves(session: Session, user_id: int):
+    """Stores the curves of the user's activities that have none or a stale one."""
+    current = {row.activity_id for row in _activity_curves(session, user_id)}
+    activity_ids = session.exec(
+        select(model.ActivityTable.activity_id).where(model.ActivityTable.owner_id == user_id)
+    ).all()
+    for activity_id in activity_ids:
+        if activity_id in current:
+            continue
+        activity = session.get(model.ActivityTable, activity_id)
+        try:
+            df = None
+            if activity.data:
+                df = data_processing.deserialize_dataframe(activity.data, columns=['timestamp', *METRIC_COLUMNS])
+            store_activity_curve(session, activity, df, update_bucket=False)
+        except Exception as e:
+            logger.warning(f"Failed to process activity {activity_id} for power curve: {e}")
+    session.flush()
+
+
+def rebuild_user_curves(session: Session, user: model.User, rebuild_buckets: bool = False):
+    """
+    Refreshes `user.power_curve` from the monthly buckets. Activities
+    without an up-to-date stored curve (e.g. ingested before curves were
+    stored) are processed first, and then all buckets are rebuilt, as they
+    are with `rebuild_buckets`.
+    """
+    if _has_missing_curves(session, user.id):
+        _backfill_curves(session, user.id)
+        rebuild_buckets = True
+    if rebuild_buckets:
+        rebuild_month_buckets(session, user.id)
+    user.power_curve = user_curves(session, user.id)
+    session.add(user)
+
+
+def remove_activity_curve(session: Session, activity: model.ActivityTable):
+    """
+    Deletes the stored curve of `activity` and rebuilds its monthly bucket.
+    Call before deleting the activity, then rebuild_user_curves once it is
+    gone.
+    """
+    row = session.get(model.ActivityPowerCurve, activity.activity_id)
+    if row is None:
+        return
+    month = month_key(row.date)
+    for effort in session.exec(select(model.PowerBestEffort).where(
+            model.PowerBestEffort.activity_id == activity.activity_id)):
+        session.delete(effort)
+    session.delete(row)
+    session.flush()
+    rebuild_month_bucket(session, activity.owner_id, month)
+
+
+def update_activity_date(session: Session, activity: model.ActivityTable):
+    """Moves the stored curve of `activity` to its new date and re-merges its owner's curves."""
+    row = session.get(model.ActivityPowerCurve, activity.activity_id)
+    if row is not None:
+        old_month = month_key(row.date)
+        row.date = activity.date
+        session.add(row)
+        for effort in session.exec(select(model.PowerBestEffort).where(
+                model.PowerBestEffort.activity_id == activity.activity_id)):
+            effort.date = activity.date
+            session.add(effort)
+        session.flush()
+        rebuild_month_bucket(session, activity.owner_id, old_month)
+        rebuild_month_bucket(session, activity.owner_id, month_key(activity.date))
+    user = session.get(model.User, activity.owner_id)
+    if user is not None:
+        rebuild_user_curves(session, user)
+
+
+def profile_periods() -> list[str]:
+    """Named periods of the stored power profiles, as the user power curves."""
+    return ['all'] + [f"{period_months}m" for period_months in power.POWER_CURVE_PERIODS]
+
+
+def _profile_bounds(period: str) -> tuple[Optional[datetime], Optional[datetime]]:
+    """Date window [start, end) of a stored power profile period."""
+    if period == 'all':
+        return None, None
+    if period in profile_periods():
+        return datetime.now() - timedelta(days=int(period[:-1]) * 30), None
+    end = _next_month(datetime.strptime(period, "%Y-%m"))
+    return _shift_months(end, -critical_power.PROFILE_HISTORY_MONTHS), end
+
+
+# Fields of model.PowerProfile, stored in model.PowerProfileFit.
+PROFILE_FIELDS = ('cp', 'w_prime', 'cp_3p', 'w_prime_3p', 'pmax', 'ftp')
+
+
+def _as_profile(fit: model.PowerProfileFit) -> model.PowerProfile:
+    return model.PowerProfile.model_construct(**{name: getattr(fit, name) for name in PROFILE_FIELDS})
+
+
+def _fit_envelope(
+        session: Session,
+        user_id: int,
+        period: str,
+        envelope: np.ndarray,
+        fit: Optional[model.PowerProfileFit] = None) -> model.PowerProfileFit:
+    """Stored fit of `period`, refitted only if `envelope` differs from the one it was made on."""
+    envelope = _trim(envelope)
+    if fit is None:
+        fit = session.exec(select(model.PowerProfileFit).where(
+            model.PowerProfileFit.user_id == user_id,
+            model.PowerProfileFit.period == period)).first()
+    if fit is not None and fit.version == critical_power.MODEL_VERSION and fit.max_watts == envelope.tobytes():
+        return fit
+    if fit is None:
+        fit = model.PowerProfileFit(user_id=user_id, period=period)
+    profile = critical_power.fit_power_profile(power.STORED_CURVE_DURATIONS, envelope)
+    for name, value in profile.model_dump().items():
+        setattr(fit, name, value)
+    fit.version = critical_power.MODEL_VERSION
+    fit.max_watts = envelope.tobytes()
+    fit.computed_at = datetime.utcnow()
+    session.add(fit)
+    return fit
+
+
+def power_profile(session: Session, user_id: int, period: str = 'all') -> model.PowerProfile:
+    """Critical Power fit and FTP estimate of a profile_periods() period."""
+    start, end = _profile_bounds(period)
+    return _as_profile(_fit_envelope(session, user_id, period, curve_between(session, user_id, start, end)))
+
+
+def power_profile_between(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None) -> model.PowerProfile:
+    """Critical Power fit and FTP estimate over [start, end), not stored."""
+    return critical_power.fit_power_profile(
+        power.STORED_CURVE_DURATIONS, curve_between(session, user_id, start, end))
+
+
+def power_profile_history(session: Session, user_id: int) -> list[model.PowerProfileEntry]:
+    """
+    One profile per month from the user's first to last active month,
+    fitted over the PROFILE_HISTORY_MONTHS ending with it. Months whose
+    window has no activity are skipped.
+    """
+    buckets = {
+        row.month: load_curve(row)
+        for row in session.exec(select(model.UserMonthlyPowerCurve).where(
+            model.UserMonthlyPowerCurve.user_id == user_id,
+            model.UserMonthlyPowerCurve.version == power.STORED_CURVE_VERSION))
+    }
+    fits = {
+        fit.period: fit
+        for fit in session.exec(select(model.PowerProfileFit).where(model.PowerProfileFit.user_id == user_id))
+        if fit.period not in profile_periods()
+    }
+    entries = []
+    if buckets:
+        month = datetime.strptime(min(buckets), "%Y-%m")
+        last = datetime.strptime(max(buckets), "%Y-%m")
+        while month <= last:
+            window = [month_key(_shift_months(month, -i)) for i in range(critical_power.PROFILE_HISTORY_MONTHS)]
+            curves = [buckets[key] for key in window if key in buckets]
+            if curves:
+                key = month_key(month)
+                fit = _fit_envelope(session, user_id, key, power.merge_stored_curves(curves), fits.pop(key, None))
+                entries.append(model.PowerProfileEntry.model_construct(month=key, **_as_profile(fit).model_dump()))
+            month = _next_month(month)
+    for stale in fits.values():
+        session.delete(stale)
+    return entries
+
+
+def _raise_profile_fits(session: Session, user_id: int, date: datetime, curve: np.ndarray):
+    """Refits the stored profiles whose window contains `date` and whose envelope `curve` raises."""
+    date = utils.utc_naive(date)
+    for fit in session.exec(select(model.PowerProfileFit).where(model.PowerProfileFit.user_id == user_id)).all():
+        try:
+            start, end = _profile_bounds(fit.period)
+        except ValueError:
+            # Period no longer configured
+            continue
+        if (start is not None and date < start) or (end is not None and date >= end):
+            continue
+        envelope = power.merge_stored_curves([load_curve(fit), curve])
+        if np.array_equal(_trim(envelope), load_curve(fit), equal_nan=True):
+            continue
+        _fit_envelope(session, user_id, fit.period, envelope, fit)
@@ -0,0 +1,105 @@
+"""Power quantile vectors of activities and laps, stored at ingest.
+
+The 101 power quantiles (power.QUANTILE_LEVELS) of an activity and the
+(laps x 101) matrix of its laps are computed once from a
+power.PowerDistribution and stored as float64 bytes
+(model.ActivityPowerQuantiles). A view reads them instead of sorting the
+power samples again: without laps the activity samples are never sorted,
+and the lap summaries only need the sort for their medians.
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+
+from app import model
+from app.services import analysis, data_processing, power
+
+logger = logging.getLogger(__name__)
+
+# Bump when the quantile computation changes so stale rows are rebuilt.
+QUANTILES_VERSION = 1
+
+# Data columns the quantiles are computed from.
+QUANTILE_COLUMNS = ('timestamp', 'power')
+
+
+def compute_quantiles(
+        ride_df: Optional[pd.DataFrame],
+        laps_df: Optional[pd.DataFrame] = None) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """
+    Quantiles of the activity and (laps x 101) quantiles of the laps
+    returned by analysis.compute_laps_metrics, NaN for laps without power.
+    None if the activity has no power.
+    """
+    distribution = power.PowerDistribution.from_frame(ride_df)
+    power_summary = distribution.summary() if distribution is not None else None
+    if power_summary is None:
+        return None
+    laps = analysis.compute_laps_metrics(laps_df, ride_df, distribution)
+    lap_quantiles = np.full((len(laps), len(power.QUANTILE_LEVELS)), np.nan)
+    for i, lap in enumerate(laps):
+        if lap.power_summary is not None:
+            lap_quantiles[i] = lap.power_summary.quantiles
+    return np.asarray(power_summary.quantiles, dtype=np.float64), lap_quantiles
+
+
+def _laps_df(activity: model.ActivityTable) -> Optional[pd.DataFrame]:
+    return data_processing.deserialize_dataframe(activity.laps_data) if activity.laps_data else None
+
+
+def store_activity_quantiles(session: Session, activity: model.ActivityTable, ride_df: Optional[pd.DataFrame]):
+    """Computes and stores (or replaces) the quantiles of `activity` and of its stored laps."""
+    row = session.get(model.ActivityPowerQuantiles, activity.activity_id)
+    quantiles = compute_quantiles(ride_df, _laps_df(activity))
+    if quantiles is None:
+        if row is not None:
+            session.delete(row)
+        return
+    if row is None:
+        row = model.ActivityPowerQuantiles(activity_id=activity.activity_id, version=QUANTILES_VERSION,
+                                           quantiles=b"", lap_quantiles=b"")
+    activity_quantiles, lap_quantiles = quantiles
+    row.version = QUANTILES_VERSION
+    row.laps = len(lap_quantiles)
+    row.quantiles = activity_quantiles.tobytes()
+    row.lap_quantiles = lap_quantiles.tobytes()
+    session.add(row)
+
+
+def remove_activity_quantiles(session: Session, activity: model.ActivityTable):
+    """Deletes the stored quantiles of `activity`."""
+    row = session.get(model.ActivityPowerQuantiles, activity.activity_id)
+    if row is not None:
+        session.delete(row)
+        session.flush()
+
+
+def backfill_user_quantiles(session: Session, user_id: int):
+    """Stores the quantiles of the user's activities with power data that have none or a stale version."""
+    current = select(model.ActivityPowerQuantiles.activity_id).where(
+        model.ActivityPowerQuantiles.version == QUANTILES_VERSION)
+    activities = session.exec(select(model.ActivityTable).where(
+        model.ActivityTable.owner_id == user_id,
+        model.ActivityTable.activity_id.not_in(current))).all()
+    for activity in activities:
+        if not activity.data or 'power' not in data_processing.dataframe_columns(activity.data):
+            continue
+        try:
+            df = data_processing.deserialize_dataframe(activity.data, columns=QUANTILE_COLUMNS)
+            store_activity_quantiles(session, activity, df)
+        except Exception as e:
+            logger.warning(f"Failed to compute the power quantiles of activity {activity.activity_id}: {e}")
+    session.flush()
+
+
+def stored_quantiles(session: Session, activity_id: str) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """Stored (activity quantiles, lap quantiles) of an activity, None if not stored."""
+    row = session.get(model.ActivityPowerQuantiles, activity_id)
+    if row is None or row.version != QUANTILES_VERSION:
+        return None
+    lap_quantiles = np.frombuffer(row.lap_quantiles, dtype=np.float64).reshape(row.laps, len(power.QUANTILE_LEVELS))
+    return np.frombuffer(row.quantiles, dtype=np.float64), lap_quantiles
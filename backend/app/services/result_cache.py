@@ -0,0 +1,320 @@
+"""Cache for results derived from a stored activity.
+
+Results such as the power curve, the processed series or the GPX export
+only change when the activity changes, so they are cached under keys that
+include the activity id and its `last_modified`. Stale entries are never
+served after an update (the key changes), and PATCH/DELETE also invalidate
+the activity explicitly so that the memory is released right away.
+
+Two backends are available: an in-process LRU (`memory`) and a local
+directory (`disk`). Both keep the total size of the pickled results under
+a byte budget, evicting the least recently used entries, and drop entries
+older than the TTL. The backend is chosen with RESULT_CACHE_BACKEND
+(memory, disk or off).
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from app.services import http_cache, utils
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """In-process LRU of pickled results under a byte budget."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[str, float, bytes]] = OrderedDict()
+        self._by_activity: dict[str, set[str]] = {}
+
+    def get(self, key: str, activity_id: str) -> Optional[tuple[float, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        _, expires_at, data = entry
+        return expires_at, data
+
+    def set(self, key: str, activity_id: str, expires_at: float, data: bytes):
+        self.delete(key, activity_id)
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = (activity_id, expires_at, data)
+        self._by_activity.setdefault(activity_id, set()).add(key)
+        self.total_bytes += len(data)
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self.delete(oldest, self._entries[oldest][0])
+            self.evictions += 1
+
+    def delete(self, key: str, activity_id: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, _, data = entry
+        self.total_bytes -= len(data)
+        keys = self._by_activity.get(activity_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_activity[activity_id]
+
+    def invalidate(self, activity_id: str) -> int:
+        keys = list(self._by_activity.get(activity_id, ()))
+        for key in keys:
+            self.delete(key, activity_id)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_activity.clear()
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBackend:
+    """
+    Pickled results stored as files under `directory`, one subdirectory per
+    activity. Recency is tracked with the file modification times, so the
+    LRU order survives restarts. The byte budget is enforced per process.
+    """
+
+    _SUFFIX = ".pkl"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(self._SUFFIX):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    files.append((st.st_mtime, path, st.st_size))
+        for _, path, size in sorted(files):
+            self._sizes[path] = size
+            self.total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def _digest(value: str) -> str:
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+    def _activity_dir(self, activity_id: str) -> str:
+        return os.path.join(self.directory, self._digest(activity_id)[:32])
+
+    def _path(self, key: str, activity_id: str) -> str:
+        return os.path.join(self._activity_dir(activity_id), self._digest(key) + self._SUFFIX)
+
+    def get(self, key: str, activity_id: str) -> Optional[tuple[float, bytes]]:
+        path = self._path(key, activity_id)
+        try:
+            with open(path, "rb") as f:
+                expires_at, data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+            logging.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        os.utime(path)
+        if path in self._sizes:
+            self._sizes.move_to_end(path)
+        return expires_at, data
+
+    def set(self, key: str, activity_id: str, expires_at: float, data: bytes):
+        path = self._path(key, activity_id)
+        self._remove(path)
+        payload = pickle.dumps((expires_at, data), protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._sizes[path] = len(payload)
+        self.total_bytes += len(payload)
+        self._evict()
+
+    def _remove(self, path: str):
+        size = self._sizes.pop(path, None)
+        if size is not None:
+            self.total_bytes -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._sizes:
+            oldest = next(iter(self._sizes))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: str, activity_id: str):
+        self._remove(self._path(key, activity_id))
+
+    def invalidate(self, activity_id: str) -> int:
+        activity_dir = self._activity_dir(activity_id)
+        if not os.path.isdir(activity_dir):
+            return 0
+        names = os.listdir(activity_dir)
+        for name in names:
+            self._remove(os.path.join(activity_dir, name))
+        try:
+            os.rmdir(activity_dir)
+        except OSError:
+            pass
+        return len(names)
+
+    def clear(self):
+        for path in list(self._sizes):
+            self._remove(path)
+
+    def __len__(self):
+        return len(self._sizes)
+
+
+class ResultCache:
+    """
+    Caches activity-derived results in `backend` for `ttl` seconds (no
+    expiry if `ttl` is 0) and counts hits, misses, evictions, expirations
+    and invalidations.
+    """
+
+    def __init__(self, backend, ttl: float = 0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(namespace: str, activity_id: str, last_modified: Optional[datetime], *args) -> str:
+        parts = [
+            namespace,
+            http_cache.ANALYSIS_VERSION,
+            activity_id,
+            last_modified.isoformat() if last_modified else "",
+            *(repr(a) for a in args),
+        ]
+        return "|".join(parts)
+
+    def get(self, namespace: str, activity_id: str, last_modified: Optional[datetime], *args) -> Any:
+        """Returns the cached result or `_MISSING`."""
+        key = self.make_key(namespace, activity_id, last_modified, *args)
+        with self._lock:
+            entry = self.backend.get(key, activity_id)
+            if entry is not None and entry[0] and entry[0] < time.time():
+                self.backend.delete(key, activity_id)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            self.hits += 1
+        return pickle.loads(entry[1])
+
+    def set(self, value: Any, namespace: str, activity_id: str, last_modified: Optional[datetime], *args):
+        key = self.make_key(namespace, activity_id, last_modified, *args)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires_at = time.time() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self.backend.set(key, activity_id, expires_at, data)
+
+    def invalidate(self, activity_id: str):
+        """Drops every cached result of an activity."""
+        with self._lock:
+            self.invalidations += self.backend.invalidate(activity_id)
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": len(self.backend),
+                "bytes": self.backend.total_bytes,
+                "max_bytes": self.backend.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.backend.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+@utils.process_wide
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide cache configured from the environment, or None if disabled."""
+    backend_name = os.getenv("RESULT_CACHE_BACKEND", "memory").lower()
+    max_bytes = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    ttl = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+    if backend_name == "memory":
+        return ResultCache(MemoryBackend(max_bytes), ttl)
+    if backend_name == "disk":
+        directory = os.getenv("RESULT_CACHE_DIR", "result_cache")
+        return ResultCache(DiskBackend(directory, max_bytes), ttl)
+    if backend_name in ("off", "none", ""):
+        return None
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {backend_name}")
+
+
+def set_result_cache(cache: Optional[ResultCache]):
+    """Replaces the process-wide cache (None disables caching)."""
+    get_result_cache.override(cache)
+
+
+def invalidate_activity(activity_id: str):
+    cache = get_result_cache()
+    if cache is not None:
+        cache.invalidate(activity_id)
+
+
+def cached_result(namespace: str) -> Callable:
+    """
+    Decorator for functions computing a result of an activity, called as
+    `fn(activity_id, last_modified, *args, **kwargs)`. The positional
+    arguments form the cache key; keyword arguments (e.g. the DB session)
+    do not, so they must not change the result. A None `last_modified`
+    (unknown version) bypasses the cache.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(activity_id: str, last_modified: Optional[datetime], *args, **kwargs):
+            cache = get_result_cache()
+            if cache is None or last_modified is None:
+                return fn(activity_id, last_modified, *args, **kwargs)
+            value = cache.get(namespace, activity_id, last_modified, *args)
+            if value is _MISSING:
+                value = fn(activity_id, last_modified, *args, **kwargs)
+                cache.set(value, namespace, activity_id, last_modified, *args)
+            return value
+        return wrapper
+    return decorator
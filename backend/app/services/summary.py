@@ -0,0 +1,110 @@
+"""Array-based activity summary kernel.
+
+The activity frame is converted once into contiguous NumPy arrays and every
+statistic of the summary is computed from those arrays, sharing the NaN
+masks and the timestamp ordering between them. The input frame is never
+modified.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+from app.services import utils, power, elevation
+
+# Numeric columns used by the summary.
+SUMMARY_COLUMNS = ('distance', 'speed', 'altitude', 'heart_rate', 'temperature', 'power')
+
+
+def activity_arrays(ride_df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Extracts the summary columns present in `ride_df` as contiguous float64
+    arrays (NaN for missing values) and the timestamps as int64 nanoseconds
+    under the 'timestamp' key.
+    """
+    arrays = {}
+    for col in SUMMARY_COLUMNS:
+        if col in ride_df.columns:
+            values = pd.to_numeric(ride_df[col], errors='coerce').to_numpy(dtype=float)
+            arrays[col] = np.ascontiguousarray(values)
+    if 'timestamp' in ride_df.columns:
+        arrays['timestamp'] = utils.to_epoch_ns(ride_df['timestamp'])
+    return arrays
+
+
+def _valid(values: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if values is None:
+        return None
+    valid = values[~np.isnan(values)]
+    return valid if len(valid) > 0 else None
+
+
+def summarize_arrays(
+        arrays: dict[str, np.ndarray],
+        num_rows: int,
+        power_distribution: Optional[power.PowerDistribution] = None,
+        include_power_quantiles: bool = True) -> dict:
+    """
+    Computes the activity statistics from the arrays returned by
+    `activity_arrays`. A prebuilt `power_distribution` of the same activity
+    can be passed so that it is shared with the lap summaries. Without
+    power quantiles the power samples are never sorted.
+
+    Returns a dict with distance (km), total_elapsed_time and active_time
+    (s), elevation_gain (m), average_speed (km/h), average_heartrate,
+    max_heartrate, average_temperature, max_power and power_summary.
+    """
+    stats = {
+        'distance': 0.0,
+        'total_elapsed_time': 0.0,
+        'active_time': float(num_rows),
+        'elevation_gain': 0.0,
+        'average_speed': 0.0,
+        'average_heartrate': None,
+        'max_heartrate': None,
+        'average_temperature': None,
+        'max_power': None,
+        'power_summary': None,
+    }
+
+    distance = arrays.get('distance')
+    if distance is not None and len(distance) > 0:
+        stats['distance'] = float(distance[-1] / 1000.0)
+
+    speed = _valid(arrays.get('speed'))
+    if speed is not None:
+        stats['average_speed'] = float(np.mean(speed) * 3.6)
+
+    altitude = _valid(arrays.get('altitude'))
+    if altitude is not None:
+        _, _, gains = elevation.detect_climbs(altitude, tolerance=2, min_elev=4.0)
+        stats['elevation_gain'] = sum(gains.tolist())
+
+    timestamps = arrays.get('timestamp')
+    if timestamps is not None:
+        known = timestamps[timestamps != utils.NAT_NS]
+        if len(known) > 0:
+            stats['total_elapsed_time'] = float(known.max() - known.min()) / 1e9
+
+    heart_rate = _valid(arrays.get('heart_rate'))
+    if heart_rate is not None:
+        stats['average_heartrate'] = int(np.mean(heart_rate))
+        stats['max_heartrate'] = int(np.max(heart_rate))
+
+    temperature = _valid(arrays.get('temperature'))
+    if temperature is not None:
+        stats['average_temperature'] = float(np.mean(temperature))
+
+    power_values = arrays.get('power')
+    if power_values is not None:
+        if power_distribution is None:
+            power_distribution = power.PowerDistribution(power_values, timestamps)
+        stats['power_summary'] = power_distribution.summary(include_quantiles=include_power_quantiles)
+        if stats['power_summary'] is not None:
+            stats['max_power'] = float(np.max(power_distribution.valid_power))
+
+    return stats
+
+
+def summarize_activity(ride_df: pd.DataFrame) -> dict:
+    """Shortcut for `summarize_arrays(activity_arrays(ride_df), len(ride_df))`."""
+    return summarize_arrays(activity_arrays(ride_df), len(ride_df))
@@ -0,0 +1,218 @@
+"""Map tiles for the static activity maps, cached on disk.
+
+staticmap downloads every tile of a map over HTTP on each render. Here the
+tiles come from a TileCache instead: tiles already on disk are read from a
+result_cache.DiskBackend (directory plus in-memory index, byte budget, LRU
+eviction, TTL), and the missing tiles of a map are fetched concurrently
+from the tile source with a thread pool. A tile that is already being
+fetched by another render is waited for rather than downloaded twice, so
+batch uploads do not hammer the tile server.
+
+The source is MAP_TILE_SOURCE: a URL template with {z}, {x} and {y}
+(default OpenStreetMap), or a local path template such as
+/srv/tiles/{z}/{x}/{y}.png for offline use and tests.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from math import ceil, floor
+from typing import Optional
+
+import requests
+from staticmap import StaticMap
+
+from app.services import utils
+from app.services.result_cache import DiskBackend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TILE_SOURCE = "https://a.tile.openstreetmap.org/{z}/{x}/{y}.png"
+
+Tile = tuple[int, int, int] # (z, x, y)
+
+
+class HttpTileSource:
+    """Tiles downloaded from a URL template with {z}, {x} and {y}."""
+
+    def __init__(self, url_template: str, timeout: float = 10.0, headers: Optional[dict] = None):
+        self.name = url_template
+        self.url_template = url_template
+        self.timeout = timeout
+        self.headers = headers or {"User-Agent": "StaticMap"}
+
+    def fetch(self, z: int, x: int, y: int) -> Optional[bytes]:
+        url = self.url_template.format(z=z, x=x, y=y)
+        response = requests.get(url, timeout=self.timeout, headers=self.headers)
+        if response.status_code != 200:
+            logger.warning(f"Tile request failed [{response.status_code}]: {url}")
+            return None
+        return response.content
+
+
+class LocalTileSource:
+    """Tiles read from a directory, located with a path template with {z}, {x} and {y}."""
+
+    def __init__(self, path_template: str):
+        self.name = path_template
+        self.path_template = path_template
+
+    def fetch(self, z: int, x: int, y: int) -> Optional[bytes]:
+        try:
+            with open(self.path_template.format(z=z, x=x, y=y), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+def tile_source(template: str):
+    """HttpTileSource for http(s) URL templates, LocalTileSource for anything else."""
+    if template.startswith(("http://", "https://")):
+        return HttpTileSource(template)
+    return LocalTileSource(template)
+
+
+class TileCache:
+    """
+    Tiles of `source`, kept in `backend` for `ttl` seconds (no expiry if
+    `ttl` is 0; no caching if `backend` is None). Missing tiles are fetched
+    with up to `workers` concurrent requests.
+    """
+
+    def __init__(self, source, backend: Optional[DiskBackend], ttl: float = 0, workers: int = 8):
+        self.source = source
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="tile-fetch")
+        self._inflight: dict[Tile, Future] = {}
+
+    @staticmethod
+    def _key(tile: Tile) -> str:
+        return "{}/{}/{}".format(*tile)
+
+    def _cached(self, tile: Tile) -> Optional[bytes]:
+        if self.backend is None:
+            return None
+        key = self._key(tile)
+        with self._lock:
+            entry = self.backend.get(key, self.source.name)
+            if entry is not None and entry[0] and entry[0] < time.time():
+                self.backend.delete(key, self.source.name)
+                entry = None
+        return entry[1] if entry is not None else None
+
+    def _fetch(self, tile: Tile) -> Optional[bytes]:
+        try:
+            data = self.source.fetch(*tile)
+            if data and self.backend is not None:
+                expires_at = time.time() + self.ttl if self.ttl else 0.0
+                with self._lock:
+                    self.backend.set(self._key(tile), self.source.name, expires_at, data)
+            return data
+        finally:
+            with self._lock:
+                self._inflight.pop(tile, None)
+
+    def get_many(self, tiles: list[Tile]) -> dict[Tile, Optional[bytes]]:
+        """Image bytes of each tile (None if the source does not have it)."""
+        result = {}
+        pending = {}
+        for tile in dict.fromkeys(tiles):
+            data = self._cached(tile)
+            with self._lock:
+                if data is not None:
+                    self.hits += 1
+                    result[tile] = data
+                    continue
+                future = self._inflight.get(tile)
+                if future is None:
+                    self.misses += 1
+                    future = self._pool.submit(self._fetch, tile)
+                    self._inflight[tile] = future
+            pending[tile] = future
+        for tile, future in pending.items():
+            try:
+                result[tile] = future.result()
+            except Exception as e:
+                logger.warning(f"Failed to fetch tile {self._key(tile)}: {e}")
+                result[tile] = None
+            if result[tile] is None:
+                with self._lock:
+                    self.failures += 1
+        return result
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        return self.get_many([(z, x, y)])[(z, x, y)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "source": self.source.name,
+                "entries": len(self.backend) if self.backend is not None else 0,
+                "bytes": self.backend.total_bytes if self.backend is not None else 0,
+                "max_bytes": self.backend.max_bytes if self.backend is not None else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "evictions": self.backend.evictions if self.backend is not None else 0,
+            }
+
+
+@utils.process_wide
+def get_tile_cache() -> TileCache:
+    """Process-wide tile cache configured from the environment."""
+    source = tile_source(os.getenv("MAP_TILE_SOURCE", DEFAULT_TILE_SOURCE))
+    directory = os.getenv("MAP_TILE_CACHE_DIR", "tile_cache")
+    max_bytes = int(os.getenv("MAP_TILE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    ttl = float(os.getenv("MAP_TILE_CACHE_TTL", "604800"))
+    workers = int(os.getenv("MAP_TILE_FETCH_WORKERS", "8"))
+    backend = DiskBackend(directory, max_bytes) if directory else None
+    return TileCache(source, backend, ttl, workers)
+
+
+def set_tile_cache(cache: Optional[TileCache]):
+    """Replaces the process-wide tile cache (None rebuilds it from the environment)."""
+    if cache is None:
+        get_tile_cache.override()
+    else:
+        get_tile_cache.override(cache)
+
+
+class CachedStaticMap(StaticMap):
+    """StaticMap that takes its tiles from a TileCache (default get_tile_cache())."""
+
+    def __init__(self, width: int, height: int, padding_x: int = 0, padding_y: int = 0,
+                 tile_cache: Optional[TileCache] = None):
+        # The template only builds the tile keys passed to get()
+        super().__init__(width, height, padding_x, padding_y, url_template="{z}/{x}/{y}")
+        self.tile_cache = tile_cache
+        self._tiles: dict[Tile, Optional[bytes]] = {}
+
+    def _view_tiles(self) -> list[Tile]:
+        # Same tiles as StaticMap._draw_base_layer
+        x_min = int(floor(self.x_center - (0.5 * self.width / self.tile_size)))
+        y_min = int(floor(self.y_center - (0.5 * self.height / self.tile_size)))
+        x_max = int(ceil(self.x_center + (0.5 * self.width / self.tile_size)))
+        y_max = int(ceil(self.y_center + (0.5 * self.height / self.tile_size)))
+        max_tile = 2 ** self.zoom
+        return [(self.zoom, (x + max_tile) % max_tile, (y + max_tile) % max_tile)
+                for x in range(x_min, x_max) for y in range(y_min, y_max)]
+
+    def _draw_base_layer(self, image):
+        if self.tile_cache is None:
+            self.tile_cache = get_tile_cache()
+        # Fetch all the tiles of the view at once, so misses are downloaded
+        # concurrently; staticmap then reads them through get()
+        self._tiles = self.tile_cache.get_many(self._view_tiles())
+        super()._draw_base_layer(image)
+
+    def get(self, url, **kwargs):
+        z, x, y = (int(v) for v in url.split("/"))
+        data = self._tiles.get((z, x, y)) or self.tile_cache.get(z, x, y)
+        return (200, data) if data else (404, None)
@@ -0,0 +1,228 @@
+"""Training load: NP, IF and TSS per activity and the daily CTL/ATL/TSB series.
+
+CTL (fitness) and ATL (fatigue) are exponentially weighted averages of the
+daily TSS with time constants CTL_DAYS and ATL_DAYS:
+    load[d] = load[d - 1] + (tss[d] - load[d - 1]) / days
+The filter is linear, so adding (removing) `tss` on day d0 adds (subtracts)
+    tss / days * (1 - 1 / days) ** (d - d0)
+to every day d >= d0. Each user's series is stored as float64 arrays
+(model.TrainingLoadSeries) and updated in place this way on add and
+delete, without refolding the history. TSB (form) on day d is
+CTL - ATL of day d - 1.
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+
+from app import model
+from app.services import data_processing, power, result_cache, serialization
+
+logger = logging.getLogger(__name__)
+
+CTL_DAYS = 42
+ATL_DAYS = 7
+
+# Rolling window (s) of Normalized Power.
+NP_WINDOW = 30
+
+# Data columns the training load is computed from.
+LOAD_COLUMNS = ('timestamp', 'power', 'heart_rate')
+
+
+def normalized_power(power_1hz: np.ndarray) -> Optional[float]:
+    """Fourth-power mean of the NP_WINDOW rolling average of 1 Hz power, None if shorter."""
+    if len(power_1hz) < NP_WINDOW or not power_1hz.any():
+        return None
+    cumsum = np.concatenate(([0.0], np.cumsum(power_1hz)))
+    rolling = (cumsum[NP_WINDOW:] - cumsum[:-NP_WINDOW]) / NP_WINDOW
+    return float(np.mean(rolling ** 4) ** 0.25)
+
+
+def compute_activity_load(
+        ride_df: pd.DataFrame,
+        ftp: Optional[float],
+        threshold_heartrate: Optional[float] = None) -> tuple[Optional[float], Optional[float], Optional[float]]:
+    """
+    (normalized_power, intensity_factor, tss) of an activity. TSS is power
+    based when there is power data and an FTP; otherwise it falls back to
+    heart rate, summing (hr / threshold_heartrate) ** 2 over the seconds of
+    the activity (100 per hour at threshold). Missing values are None.
+    """
+    power_1hz = power.resample_power_1hz(ride_df)
+    np_watts = normalized_power(power_1hz)
+    if np_watts is not None and ftp:
+        intensity = np_watts / ftp
+        tss = len(power_1hz) * np_watts * intensity / (ftp * 3600.0) * 100.0
+        return np_watts, float(intensity), float(tss)
+    if threshold_heartrate:
+        hr_1hz = power.resample_1hz(ride_df, 'heart_rate')
+        if hr_1hz.any():
+            tss = np.sum((hr_1hz / threshold_heartrate) ** 2) / 3600.0 * 100.0
+            return np_watts, None, float(tss)
+    return np_watts, None, None
+
+
+def _thresholds(user: Optional[model.User]) -> tuple[Optional[float], Optional[float]]:
+    return (user.ftp, user.threshold_heartrate) if user else (None, None)
+
+
+def apply_activity_load(activity: model.ActivityTable, ride_df: pd.DataFrame, user: Optional[model.User]):
+    """Sets the NP, IF and TSS columns of `activity` with the thresholds of `user`, and records them."""
+    ftp, threshold_heartrate = _thresholds(user)
+    activity.normalized_power, activity.intensity_factor, activity.tss = compute_activity_load(
+        ride_df, ftp, threshold_heartrate)
+    activity.tss_ftp, activity.tss_threshold_heartrate = ftp, threshold_heartrate
+
+
+def _day(activity_date: datetime) -> date:
+    return activity_date.date()
+
+
+def _decay(length: int, days: int) -> np.ndarray:
+    """Response of the load filter to a TSS of 1 on day 0, over `length` days."""
+    return (1.0 / days) * (1.0 - 1.0 / days) ** np.arange(length)
+
+
+def _arrays(series: model.TrainingLoadSeries) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (np.frombuffer(series.daily_tss, dtype=np.float64).copy(),
+            np.frombuffer(series.ctl, dtype=np.float64).copy(),
+            np.frombuffer(series.atl, dtype=np.float64).copy())
+
+
+def _store(session: Session, series: model.TrainingLoadSeries, daily_tss: np.ndarray, ctl: np.ndarray, atl: np.ndarray):
+    series.daily_tss = daily_tss.tobytes()
+    series.ctl = ctl.tobytes()
+    series.atl = atl.tobytes()
+    session.add(series)
+
+
+def _add_load(session: Session, user_id: int, day: date, tss: float):
+    """Adds `tss` (negative to remove) on `day` to the stored series of the user."""
+    series = session.get(model.TrainingLoadSeries, user_id)
+    if series is None:
+        if tss <= 0:
+            return
+        series = model.TrainingLoadSeries(user_id=user_id, start_day=day)
+        daily_tss, ctl, atl = np.zeros(1), np.zeros(1), np.zeros(1)
+    else:
+        daily_tss, ctl, atl = _arrays(series)
+
+    if day < series.start_day:
+        # The load before the first stored day is 0
+        pad = np.zeros((series.start_day - day).days)
+        daily_tss, ctl, atl = (np.concatenate((pad, a)) for a in (daily_tss, ctl, atl))
+        series.start_day = day
+    offset = (day - series.start_day).days
+    if offset >= len(daily_tss):
+        # Days after the last stored one only decay
+        steps = np.arange(1, offset - len(daily_tss) + 2)
+        ctl = np.concatenate((ctl, ctl[-1] * (1.0 - 1.0 / CTL_DAYS) ** steps))
+        atl = np.concatenate((atl, atl[-1] * (1.0 - 1.0 / ATL_DAYS) ** steps))
+        daily_tss = np.concatenate((daily_tss, np.zeros(len(steps))))
+
+    daily_tss[offset] += tss
+    ctl[offset:] += tss * _decay(len(ctl) - offset, CTL_DAYS)
+    atl[offset:] += tss * _decay(len(atl) - offset, ATL_DAYS)
+    # Removing a load can leave rounding residues below 0
+    for values in (daily_tss, ctl, atl):
+        np.maximum(values, 0.0, out=values)
+    _store(session, series, daily_tss, ctl, atl)
+
+
+def add_activity_load(session: Session, activity: model.ActivityTable):
+    """Adds the TSS of `activity` to its owner's CTL/ATL series."""
+    if activity.tss and activity.activity_type != "route":
+        _add_load(session, activity.owner_id, _day(activity.date), activity.tss)
+
+
+def remove_activity_load(session: Session, activity: model.ActivityTable, activity_date: Optional[datetime] = None):
+    """Removes the TSS of `activity` (dated `activity_date`, by default its date) from the series."""
+    if activity.tss and activity.activity_type != "route":
+        _add_load(session, activity.owner_id, _day(activity_date or activity.date), -activity.tss)
+
+
+def _backfill_activity_load(session: Session, activity: model.ActivityTable, user: model.User):
+    current = (activity.tss_ftp, activity.tss_threshold_heartrate) == _thresholds(user)
+    if (activity.tss is not None and current) or not activity.data:
+        return
+    try:
+        df = data_processing.deserialize_dataframe(activity.data, columns=LOAD_COLUMNS)
+        previous = (activity.normalized_power, activity.intensity_factor, activity.tss)
+        apply_activity_load(activity, df, user)
+        if (activity.normalized_power, activity.intensity_factor, activity.tss) != previous:
+            # The ETag and the cached responses are keyed on last_modified
+            activity.last_modified = datetime.now(datetime.now().astimezone().tzinfo)
+            result_cache.invalidate_activity(activity.activity_id)
+        session.add(activity)
+    except Exception as e:
+        logger.warning(f"Failed to compute training load of activity {activity.activity_id}: {e}")
+
+
+def rebuild_user_load(session: Session, user: model.User):
+    """
+    Computes the missing activity TSS (e.g. activities ingested before an
+    FTP was set) and the TSS computed with other thresholds than the
+    user's current FTP and threshold heart rate, and refolds the user's
+    whole series.
+    """
+    activities = session.exec(select(model.ActivityTable).where(
+        model.ActivityTable.owner_id == user.id,
+        model.ActivityTable.activity_type != "route")).all()
+    days, loads = [], []
+    for activity in activities:
+        _backfill_activity_load(session, activity, user)
+        if activity.tss:
+            days.append(_day(activity.date))
+            loads.append(activity.tss)
+
+    series = session.get(model.TrainingLoadSeries, user.id)
+    if not days:
+        if series is not None:
+            session.delete(series)
+        return
+    start_day = min(days)
+    offsets = np.array([(day - start_day).days for day in days])
+    daily_tss = np.bincount(offsets, weights=loads)
+    ctl = np.convolve(daily_tss, _decay(len(daily_tss), CTL_DAYS))[:len(daily_tss)]
+    atl = np.convolve(daily_tss, _decay(len(daily_tss), ATL_DAYS))[:len(daily_tss)]
+    if series is None:
+        series = model.TrainingLoadSeries(user_id=user.id, start_day=start_day)
+    series.start_day = start_day
+    _store(session, series, daily_tss, ctl, atl)
+
+
+def load_between(session: Session, user_id: int, start: date, end: date) -> list[dict]:
+    """
+    Daily {date, tss, ctl, atl, tsb} records from `start` to `end`
+    (inclusive), read from the stored series. Days before it are 0 and
+    days after it decay from its last day.
+    """
+    # One leading day for the TSB of `start`
+    days = np.arange(np.datetime64(start) - 1, np.datetime64(end) + 1)
+    daily_tss = np.zeros(len(days))
+    ctl = np.zeros(len(days))
+    atl = np.zeros(len(days))
+    series = session.get(model.TrainingLoadSeries, user_id)
+    if series is not None:
+        stored_tss, stored_ctl, stored_atl = _arrays(series)
+        ix = (days - np.datetime64(series.start_day)).astype(np.int64)
+        inside = (ix >= 0) & (ix < len(stored_tss))
+        daily_tss[inside] = stored_tss[ix[inside]]
+        ctl[inside] = stored_ctl[ix[inside]]
+        atl[inside] = stored_atl[ix[inside]]
+        after = ix >= len(stored_tss)
+        steps = ix[after] - (len(stored_tss) - 1)
+        ctl[after] = stored_ctl[-1] * (1.0 - 1.0 / CTL_DAYS) ** steps
+        atl[after] = stored_atl[-1] * (1.0 - 1.0 / ATL_DAYS) ** steps
+    return serialization.records({
+        'date': days[1:].astype(str),
+        'tss': daily_tss[1:],
+        'ctl': ctl[1:],
+        'atl': atl[1:],
+        'tsb': ctl[:-1] - atl[:-1],
+    })
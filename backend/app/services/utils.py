@@ -1,3 +1,8 @@
+import functools
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
 import numpy as np
 import pandas as pd
 
@@ -7,6 +12,54 @@ def subsample_timeseries(time_series: pd.Series, num_samples: int):
     indices = np.linspace(0, len(time_series) - 1, num_samples, dtype=int)
     return time_series.to_numpy()[indices].tolist()
 
+# Value of NaT in int64 nanosecond timestamps.
+NAT_NS = np.iinfo(np.int64).min
+
+def to_epoch_ns(values) -> np.ndarray:
+    """
+    Converts timestamps to int64 nanoseconds since epoch, whatever the unit
+    of the input (the Go FIT parser produces datetime64[s] columns).
+    Timezone-aware values are converted to UTC, naive values are assumed to
+    be UTC. NaT is mapped to the minimum int64 value so it sorts before any
+    real time.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values)
+    index = pd.DatetimeIndex(values)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.as_unit('ns').asi8
+
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Naive UTC datetime, as activity dates are stored. Aware values are
+    converted to UTC first; naive values are assumed to be UTC already.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def segment_reduce(ufunc: np.ufunc, values: np.ndarray, starts: np.ndarray, ends: np.ndarray, empty: float = np.nan) -> np.ndarray:
+    """
+    Applies `ufunc.reduceat` over the half-open segments [starts[i], ends[i])
+    of `values` in a single call. Empty segments are set to `empty`.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    out = np.full(len(starts), empty, dtype=float)
+    if len(starts) == 0 or len(values) == 0:
+        return out
+    # Interleave starts and ends so every even position reduces one segment.
+    # A sentinel is appended so that an end equal to len(values) is valid.
+    padded = np.append(np.asarray(values, dtype=float), 0.0)
+    indices = np.empty(2 * len(starts), dtype=np.int64)
+    indices[0::2] = starts
+    indices[1::2] = ends
+    reduced = ufunc.reduceat(padded, indices)[0::2]
+    non_empty = ends > starts
+    out[non_empty] = reduced[non_empty]
+    return out
+
 def sanitize_nan(data):
     """
     Recursively replaces NaN and Inf float values in a dictionary or list
@@ -22,3 +75,34 @@ def sanitize_nan(data):
         return data
     else:
         return data
+
+_NOT_SET = object()
+
+def process_wide(build):
+    """
+    Decorator turning a builder into the getter of a process-wide instance:
+    `build()` runs once, on first use, and its result is kept by
+    `functools.lru_cache`. `getter.override(value)` replaces the instance
+    (None included); `getter.override()` drops it so the next call builds
+    it again.
+    """
+    built = functools.lru_cache(maxsize=1)(build)
+    lock = threading.Lock()
+    overridden = []
+
+    @functools.wraps(build)
+    def get():
+        if overridden:
+            return overridden[0]
+        with lock:
+            return built()
+
+    def override(value=_NOT_SET):
+        with lock:
+            overridden.clear()
+            built.cache_clear()
+            if value is not _NOT_SET:
+                overridden.append(value)
+
+    get.override = override
+    return get
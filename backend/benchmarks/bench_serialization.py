@@ -0,0 +1,66 @@
+"""Share of JSON serialization in the latency of GET /activity/{id}.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --fit_file=../examples/ride.fit
+"""
+
+import sys
+import json
+import time
+import glob
+from datetime import datetime
+
+from absl import flags
+
+from app import fit_parsing, model
+from app.services import analysis, data_processing, utils, serialization
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string("fit_file", None, "FIT file to benchmark. Defaults to the first file in ../examples.")
+flags.DEFINE_integer("repeats", 20, "Number of timed repetitions per phase.")
+
+
+def _timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats * 1000.0, result
+
+
+def main():
+    fit_file = FLAGS.fit_file or sorted(glob.glob("../examples/*.fit"))[0]
+    with open(fit_file, "rb") as f:
+        ride_df = fit_parsing.extract_data_to_dataframe(f.read())
+    activity = model.ActivityTable(
+        activity_id="benchmark", name="Benchmark", owner_id=1, activity_type="recorded",
+        distance=0.0, active_time=0.0, elevation_gain=0.0,
+        date=datetime.now(), last_modified=datetime.now(),
+        data=data_processing.serialize_dataframe(ride_df), static_map=None, tags=None)
+
+    repeats = FLAGS.repeats
+    compute_ms, activity_response = _timed(lambda: analysis.get_activity_response(activity), repeats)
+    dump_ms, _ = _timed(activity_response.model_dump, repeats)
+
+    def legacy_serialize():
+        # model_dump + sanitize_nan + response_model validation + json
+        sanitized = utils.sanitize_nan(activity_response.model_dump())
+        validated = model.ActivityResponse.model_validate(sanitized)
+        return json.dumps(validated.model_dump(mode="json")).encode("utf-8")
+
+    legacy_ms, legacy_body = _timed(legacy_serialize, repeats)
+    fast_ms, fast_body = _timed(lambda: serialization.dumps(activity_response.model_dump()), repeats)
+    assert json.loads(legacy_body) == json.loads(fast_body)
+
+    print(f"{fit_file}: {len(ride_df)} samples, {len(fast_body) / 1024:.0f} KiB of JSON")
+    print(f"{'phase':<32}{'ms':>10}{'share':>10}")
+    for name, serialize_ms in (("legacy (sanitize_nan + json)", legacy_ms), ("FastJSONResponse (orjson)", fast_ms)):
+        total = compute_ms + serialize_ms
+        print(f"{'compute':<32}{compute_ms:>10.2f}{compute_ms / total:>10.0%}")
+        print(f"{name:<32}{serialize_ms:>10.2f}{serialize_ms / total:>10.0%}")
+    print(f"{'of which model_dump':<32}{dump_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    FLAGS(sys.argv)
+    main()
@@ -4,7 +4,7 @@ from absl import flags
 import os
 import uvicorn
 from dotenv import load_dotenv
-from app.services import cron_jobs
+from app.services import cron_jobs, map_renderer
 
 FLAGS = flags.FLAGS
 
@@ -18,12 +18,13 @@ flags.DEFINE_enum(
 flags.DEFINE_list(
     "run_batch_startup",
     [],
-    "List of batch jobs to run on startup. Available: 'power_curves', 'historical_stats'.",
+    "List of batch jobs to run on startup. Available: 'power_curves', 'historical_stats', 'static_maps'.",
 )
 
 batch_jobs = {
     "power_curves": cron_jobs.recompute_all_users_curves,
     "historical_stats": cron_jobs.recompute_all_users_stats,
+    "static_maps": map_renderer.backfill_static_maps,
 }
 
 if __name__ == "__main__":
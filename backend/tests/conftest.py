@@ -11,6 +11,7 @@ from app.model import User
 from app.auth.auth_handler import create_access_token
 from app.database import get_db_session
 from app.auth import crypto
+from app.services import result_cache, map_renderer, heatmaps
 
 # Setup for an in-memory SQLite database for testing
 DATABASE_URL = "sqlite:///:memory:"
@@ -35,6 +36,29 @@ def setup_database(engine_fixture):
     yield
     SQLModel.metadata.drop_all(engine_fixture)
 
+@pytest.fixture(scope="function", autouse=True)
+def fresh_result_cache():
+    """Each test gets an empty in-memory result cache."""
+    result_cache.set_result_cache(result_cache.ResultCache(result_cache.MemoryBackend(16 * 1024 * 1024)))
+    yield
+    result_cache.set_result_cache(None)
+
+@pytest.fixture(scope="function", autouse=True)
+def queued_map_renderer(engine_fixture):
+    """Static maps are only queued; tests render them with run_pending()."""
+    renderer = map_renderer.MapRenderer(engine_fixture, workers=0)
+    map_renderer.set_map_renderer(renderer)
+    yield renderer
+    map_renderer.set_map_renderer(None)
+
+@pytest.fixture(scope="function", autouse=True)
+def heatmap_png_cache(tmp_path):
+    """Each test gets an empty heatmap tile cache in its temporary directory."""
+    cache = result_cache.DiskBackend(str(tmp_path / "heatmap_cache"), 1 << 22)
+    heatmaps.set_png_cache(cache)
+    yield cache
+    heatmaps.set_png_cache(None)
+
 @pytest.fixture(scope="function")
 def dbsession(engine_fixture):
     # Override dependency for this session
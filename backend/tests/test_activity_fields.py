@@ -0,0 +1,148 @@
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from sqlmodel import Session
+from app.model import ActivityTable, ActivityResponse
+from app.services import analysis, data_processing
+
+
+def create_rich_activity_in_db(dbsession: Session, user_id: int):
+    n = 120
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2025-01-01 10:00:00', periods=n, freq='1s'),
+        'power': np.linspace(100, 300, n),
+        'heart_rate': np.linspace(120, 170, n),
+        'altitude': np.linspace(10, 40, n),
+        'distance': np.linspace(0, 1000, n),
+        'speed': np.full(n, 8.0),
+        'position_lat': np.linspace(47.0, 47.01, n),
+        'position_long': np.linspace(8.0, 8.01, n),
+    })
+    laps_df = pd.DataFrame({
+        'start_time': pd.to_datetime(['2025-01-01 10:00:00']),
+        'timestamp': pd.to_datetime(['2025-01-01 10:01:00']),
+    })
+    activity = ActivityTable(
+        activity_id="fields_activity",
+        name="Fields Activity",
+        owner_id=user_id,
+        activity_type="recorded",
+        distance=1.0,
+        active_time=120.0,
+        elevation_gain=30.0,
+        date=datetime(2025, 1, 1, 10),
+        last_modified=datetime(2025, 1, 1, 10),
+        data=data_processing.serialize_dataframe(df),
+        laps_data=data_processing.serialize_dataframe(laps_df),
+        tags=None,
+        static_map=None
+    )
+    dbsession.add(activity)
+    dbsession.commit()
+    dbsession.refresh(activity)
+    return activity
+
+
+def test_resolve_activity_fields_defaults_to_all():
+    assert analysis.resolve_activity_fields() == set(analysis.ACTIVITY_FIELDS)
+
+
+def test_resolve_activity_fields_adds_parents():
+    assert analysis.resolve_activity_fields("quantiles") == {"quantiles", "power_summary", "activity_analysis"}
+
+
+def test_resolve_activity_fields_exclude_drops_children():
+    selected = analysis.resolve_activity_fields(exclude="activity_analysis")
+    assert selected == {"activity_base", "laps", "has_gps_data"}
+
+
+def test_resolve_activity_fields_unknown():
+    with pytest.raises(ValueError):
+        analysis.resolve_activity_fields("bogus")
+
+
+def test_get_activity_full(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    data = client.get(f"/activity/{activity.activity_id}").json()
+    assert data["has_gps_data"] is True
+    assert len(data["laps"]) == 1
+    assert len(data["activity_analysis"]["power_summary"]["quantiles"]) == 101
+    assert data["activity_analysis"]["elev_summary"] is not None
+
+
+def test_get_activity_summary_only(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    response = client.get(f"/activity/{activity.activity_id}", params={"fields": "summary-only"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["activity_base"]["name"] == "Fields Activity"
+    assert data["has_gps_data"] is True
+    assert data["laps"] is None
+    analysis_data = data["activity_analysis"]
+    assert analysis_data["elev_summary"] is None
+    assert analysis_data["power_summary"]["quantiles"] is None
+    assert analysis_data["power_summary"]["average_power"] == pytest.approx(200.0)
+    assert analysis_data["distance"] == pytest.approx(1.0)
+
+
+def test_indoor_ride_has_no_gps_data(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    df = data_processing.deserialize_dataframe(activity.data)
+    df['position_lat'] = np.nan
+    df['position_long'] = np.nan
+    activity.data = data_processing.serialize_dataframe(df)
+    dbsession.add(activity)
+    dbsession.commit()
+    for params in ({}, {"fields": "has_gps_data"}):
+        data = client.get(f"/activity/{activity.activity_id}", params=params).json()
+        assert data["has_gps_data"] is False
+
+
+def test_get_activity_exclude(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    response = client.get(f"/activity/{activity.activity_id}", params={"exclude": "laps,elev_summary"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["laps"] is None
+    assert data["activity_analysis"]["elev_summary"] is None
+    assert len(data["activity_analysis"]["power_summary"]["quantiles"]) == 101
+
+
+def test_get_activity_unknown_field(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    response = client.get(f"/activity/{activity.activity_id}", params={"fields": "bogus"})
+    assert response.status_code == 400
+
+
+def test_activity_response_trusted_construction_is_valid(test_user, dbsession):
+    # The response models are built with model_construct; their values must
+    # survive validation unchanged.
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    response = analysis.get_activity_response(activity, user_zones=[100, 200], user_hr_zones=[140, 170])
+    dumped = response.model_dump()
+    assert len(dumped["activity_analysis"]["time_in_hr_zones"]) == 3
+    assert ActivityResponse.model_validate(dumped).model_dump() == dumped
+    assert type(dumped["laps"][0]["power_summary"]["average_power"]) is float
+    assert type(dumped["activity_analysis"]["elev_summary"]["lowest"]) is float
+
+
+def test_get_activity_power_curve_compact(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    url = f"/activity/{activity.activity_id}/power-curve"
+    standard = client.get(url).json()
+    assert [p["duration"] for p in standard] == [1, 2, 5, 10, 20, 30, 60, 120]
+    compact = client.get(url, params={"grid": "log", "compact": True}).json()
+    assert compact["duration"][-1] == 120
+    assert len(compact["duration"]) == len(compact["max_watts"])
+    assert client.get(url, params={"grid": "bogus"}).status_code == 400
+
+
+def test_get_activity_hr_curve(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    url = f"/activity/{activity.activity_id}/hr-curve"
+    curve = client.get(url).json()
+    assert [p["duration"] for p in curve] == [1, 2, 5, 10, 20, 30, 60, 120]
+    assert all(p["max_bpm"] > 0 for p in curve)
+    compact = client.get(url, params={"compact": True}).json()
+    assert compact["max_bpm"] == [p["max_bpm"] for p in curve]
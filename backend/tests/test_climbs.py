@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.model import ActivityTable
+from app.auth import crypto
+from app.services import climbs, data_processing
+
+
+def hilly_ride(start='2025-05-01 08:00:00'):
+    """10 km at 5 m/s: 2 km flat, 3 km at 6 % (8 % over its middle 500 m), 5 km down to 100 m."""
+    distance = np.arange(0.0, 10000.0 + 1, 5.0)
+    grade = np.where((distance > 2000) & (distance <= 5000), 0.06, 0.0)
+    grade = np.where((distance > 3250) & (distance <= 3750), 0.08, grade)
+    grade = np.where(distance > 5000, -0.038, grade)
+    altitude = 100.0 + np.concatenate(([0.0], np.cumsum(grade[1:] * 5.0)))
+    return pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=len(distance), freq='1s'),
+        'distance': distance,
+        'altitude': altitude,
+    })
+
+
+def create_climb_activity(dbsession, user_id, date, df, activity_type="recorded"):
+    activity = ActivityTable(
+        activity_id=crypto.generate_random_base64_string(16),
+        name="Hilly", owner_id=user_id, activity_type=activity_type,
+        distance=10.0, active_time=float(len(df)), elevation_gain=190.0,
+        date=date, last_modified=date,
+        data=data_processing.serialize_dataframe(df),
+        tags=None, static_map=None)
+    dbsession.add(activity)
+    dbsession.commit()
+    return activity
+
+
+def test_activity_climbs_metrics():
+    df = hilly_ride()
+    [climb] = climbs.activity_climbs(df)
+    assert abs(climb["start_distance"] - 2000.0) <= 5.0
+    assert abs(climb["distance"] - 3000.0) <= 5.0
+    assert abs(climb["elevation_gain"] - 190.0) < 1e-6
+    assert abs(climb["avg_gradient"] - 190.0 / 30.0) < 0.02
+    assert abs(climb["max_gradient"] - 8.0) < 1e-6
+    # 3 km at 5 m/s is 600 s
+    assert abs(climb["duration"] - 600.0) <= 1.0
+    assert abs(climb["vam"] - 190.0 / 600.0 * 3600.0) < 2.0
+    # 3000 m x 6.3 % = 19000
+    assert climb["category"] == "3"
+    assert df['altitude'].iloc[climb["to_ix"]] == df['altitude'].max()
+
+    # Same climb with the datetime64[s] timestamps of the Go FIT parser
+    [seconds_climb] = climbs.activity_climbs(df.astype({'timestamp': 'datetime64[s]'}))
+    assert seconds_climb["duration"] == climb["duration"]
+    assert seconds_climb["vam"] == climb["vam"]
+
+    # Without timestamps there is no duration or VAM
+    [untimed] = climbs.activity_climbs(df.drop(columns=['timestamp']))
+    assert untimed["duration"] is None and untimed["vam"] is None
+    assert climbs.activity_climbs(df[['timestamp', 'distance']]) == []
+
+
+def test_climb_category():
+    assert climbs.climb_category(500.0, 4.0) is None
+    assert climbs.climb_category(2000.0, 5.0) == "4"
+    assert climbs.climb_category(10000.0, 7.0) == "1"
+    assert climbs.climb_category(15000.0, 8.0) == "HC"
+
+
+def test_climb_endpoints(auth_headers, test_user, dbsession, client):
+    df = hilly_ride()
+    ride = create_climb_activity(dbsession, test_user.id, datetime(2025, 5, 1, 8), df)
+    route = create_climb_activity(dbsession, test_user.id, datetime(2025, 5, 2, 8), df, activity_type="route")
+    climbs.store_activity_climbs(dbsession, ride, df)
+    dbsession.commit()
+    # Older activities are backfilled by the stats rebuild
+    assert client.post("/users/me/stats/recalculate", headers=auth_headers).status_code == 200
+
+    response = client.get(f"/activity/{route.activity_id}/climbs")
+    assert response.status_code == 200
+    assert [c["category"] for c in response.json()] == ["3"]
+    assert client.get("/activity/missing/climbs").status_code == 404
+
+    # Routes are not counted in the user stats
+    stats = client.get("/users/me/stats/climbs", headers=auth_headers).json()
+    assert stats["count"] == 1
+    assert abs(stats["elevation_gain"] - 190.0) < 1e-6
+    assert stats["by_category"]["3"]["count"] == 1
+    stats = client.get("/users/me/stats/climbs", headers=auth_headers, params={"start_date": "2025-06-01"}).json()
+    assert stats["count"] == 0 and stats["by_category"] == {}
+
+    climbs.remove_activity_climbs(dbsession, ride)
+    dbsession.commit()
+    assert client.get(f"/activity/{ride.activity_id}/climbs").json() == []
@@ -0,0 +1,36 @@
+import numpy as np
+
+from app.services import critical_power, power
+
+DURATIONS = power.STORED_CURVE_DURATIONS
+
+
+def test_fit_cp_2p_recovers_work_time_model():
+    max_watts = 250.0 + 20000.0 / DURATIONS
+    cp, w_prime = critical_power.fit_cp_2p(DURATIONS, max_watts)
+    assert abs(cp - 250.0) < 1e-6
+    assert abs(w_prime - 20000.0) < 1e-3
+
+
+def test_fit_cp_3p_recovers_parameters():
+    cp, w_prime, pmax = 280.0, 18000.0, 1100.0
+    max_watts = cp + w_prime / (DURATIONS + w_prime / (pmax - cp))
+    fitted = critical_power.fit_cp_3p(DURATIONS, max_watts)
+    np.testing.assert_allclose(fitted, (cp, w_prime, pmax), rtol=1e-3)
+
+
+def test_fits_need_enough_data():
+    # Envelope of a 60 s activity: nothing in the 2-parameter range
+    max_watts = np.full(np.searchsorted(DURATIONS, 60) + 1, 400.0)
+    assert critical_power.fit_cp_2p(DURATIONS, max_watts) is None
+    profile = critical_power.fit_power_profile(DURATIONS, np.full(len(DURATIONS), np.nan))
+    assert profile.cp is None and profile.cp_3p is None and profile.ftp is None
+
+
+def test_ftp_estimate():
+    max_watts = 250.0 + 20000.0 / DURATIONS
+    ftp = critical_power.estimate_ftp(DURATIONS, max_watts)
+    assert abs(ftp - 0.95 * (250.0 + 20000.0 / 1200)) < 1e-9
+    # Without a 20 min effort, fall back to CP
+    short = max_watts[:np.searchsorted(DURATIONS, 600) + 1]
+    assert critical_power.estimate_ftp(DURATIONS, short, cp=240.0) == 240.0
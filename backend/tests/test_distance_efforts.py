@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from sqlmodel import select
+
+from app.model import ActivityTable, ActivityDistanceEffort, UserDistanceBest
+from app.auth import crypto
+from app.services import data_processing, distance_efforts
+
+
+def reference_fastest(distance, seconds, target):
+    # Brute force over every (start, end) sample pair, without interpolation
+    best = np.inf
+    for j in range(len(distance)):
+        for i in range(j):
+            if distance[j] - distance[i] >= target:
+                best = min(best, seconds[j] - seconds[i])
+    return best
+
+
+def create_distance_activity(dbsession, user_id, date, speeds):
+    """Activity with 1 Hz samples at the given speeds (m/s)."""
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(date, periods=len(speeds), freq='1s'),
+        'distance': np.concatenate(([0.0], np.cumsum(speeds[1:]))),
+    })
+    activity = ActivityTable(
+        activity_id=crypto.generate_random_base64_string(16),
+        name="Distance Activity", owner_id=user_id, activity_type="recorded",
+        distance=float(df['distance'].iloc[-1]) / 1000.0, active_time=float(len(speeds)), elevation_gain=0.0,
+        date=date, last_modified=date,
+        data=data_processing.serialize_dataframe(df),
+        tags=None, static_map=None)
+    dbsession.add(activity)
+    dbsession.commit()
+    return activity, df
+
+
+def test_fastest_distances_matches_brute_force():
+    rng = np.random.default_rng(0)
+    seconds = np.cumsum(rng.choice([1.0, 1.0, 2.0, 5.0], size=400))
+    distance = np.cumsum(rng.uniform(0.0, 12.0, size=400))
+    targets = [100, 500, 1000]
+    best, starts = distance_efforts.fastest_distances(distance, seconds, targets + [1e6])
+    for k, target in enumerate(targets):
+        # Interpolating the start can only shorten the sample-aligned window
+        assert best[k] <= reference_fastest(distance, seconds, target) + 1e-9
+        assert best[k] > 0
+    assert np.isnan(best[3]) and np.isnan(starts[3])
+
+
+def test_fastest_distances_interpolates_start():
+    # 10 m/s for 100 s, then 20 m/s for 50 s
+    seconds = np.arange(151, dtype=float)
+    distance = np.concatenate((np.arange(101) * 10.0, 1000.0 + np.arange(1, 51) * 20.0))
+    best, starts = distance_efforts.fastest_distances(distance, seconds, [1000, 1500])
+    assert best[0] == 50.0
+    assert starts[0] == 100.0
+    assert best[1] == 100.0
+    assert starts[1] == 50.0
+
+
+def test_activity_distance_efforts_seconds_unit_timestamps():
+    # The Go FIT parser produces datetime64[s] timestamps; 10 m/s for 300 s
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2025-01-01', periods=301, freq='1s').astype('datetime64[s]'),
+        'distance': np.arange(301) * 10.0,
+    })
+    efforts = {distance: (seconds, start) for distance, seconds, start in distance_efforts.activity_distance_efforts(df)}
+    assert efforts[1000] == (100.0, 0.0)
+
+
+def test_user_bests_follow_add_delete_and_move(test_user, dbsession):
+    fast, _ = create_distance_activity(dbsession, test_user.id, datetime(2024, 6, 1, 8), np.full(700, 10.0))
+    slow, _ = create_distance_activity(dbsession, test_user.id, datetime(2025, 6, 1, 8), np.full(1200, 5.0))
+    for activity in (fast, slow):
+        df = data_processing.deserialize_dataframe(activity.data)
+        distance_efforts.store_activity_efforts(dbsession, activity, df)
+    dbsession.commit()
+
+    bests = {b['distance']: b for b in distance_efforts.user_bests(dbsession, test_user.id)}
+    assert bests[1000]['activity_id'] == fast.activity_id
+    assert bests[1000]['seconds'] == 100.0
+    assert bests[5000]['activity_id'] == fast.activity_id
+    assert [b['activity_id'] for b in distance_efforts.user_bests(dbsession, test_user.id, '2025')] == \
+        [slow.activity_id] * 2
+
+    # Ranges are answered from the activity efforts
+    efforts = distance_efforts.fastest_between(dbsession, test_user.id, datetime(2025, 1, 1))
+    assert [(e['distance'], e['seconds']) for e in efforts] == [(1000, 200.0), (5000, 1000.0)]
+    # 10:00+02:00 is the slow activity's 08:00 UTC start
+    efforts = distance_efforts.fastest_between(
+        dbsession, test_user.id, datetime(2025, 6, 1, 10, tzinfo=timezone(timedelta(hours=2))))
+    assert [e['activity_id'] for e in efforts] == [slow.activity_id] * 2
+
+    fast.date = datetime(2025, 2, 1, 8)
+    distance_efforts.update_activity_date(dbsession, fast, datetime(2024, 6, 1, 8))
+    assert distance_efforts.user_bests(dbsession, test_user.id, '2024') == []
+    assert distance_efforts.user_bests(dbsession, test_user.id, '2025')[0]['activity_id'] == fast.activity_id
+
+    distance_efforts.remove_activity_efforts(dbsession, fast)
+    bests = distance_efforts.user_bests(dbsession, test_user.id)
+    assert [b['activity_id'] for b in bests] == [slow.activity_id] * 2
+
+    # A rebuild from scratch gives the same bests
+    for best in dbsession.exec(select(UserDistanceBest)).all():
+        dbsession.delete(best)
+    for effort in dbsession.exec(select(ActivityDistanceEffort)).all():
+        dbsession.delete(effort)
+    dbsession.commit()
+    distance_efforts.rebuild_user_efforts(dbsession, test_user)
+    rebuilt = {b['distance']: b['activity_id'] for b in distance_efforts.user_bests(dbsession, test_user.id)}
+    assert rebuilt == {1000: fast.activity_id, 5000: fast.activity_id}
+
+
+def test_best_efforts_endpoints(auth_headers, test_user, dbsession, client):
+    activity, df = create_distance_activity(dbsession, test_user.id, datetime(2025, 3, 1, 8), np.full(300, 8.0))
+    distance_efforts.store_activity_efforts(dbsession, activity, df)
+    dbsession.commit()
+
+    response = client.get("/user/me/best-efforts", headers=auth_headers)
+    assert response.status_code == 200
+    assert [(e['distance'], e['seconds']) for e in response.json()] == [(1000, 125.0)]
+    response = client.get("/user/me/best-efforts", headers=auth_headers, params={"period": "2024"})
+    assert response.json() == []
+    response = client.get("/user/me/best-efforts", headers=auth_headers,
+                          params={"start": "2025-03-01T00:00:00", "end": "2025-04-01T00:00:00"})
+    assert response.json()[0]['activity_id'] == activity.activity_id
+    assert client.get("/user/me/best-efforts", headers=auth_headers, params={"period": "3m"}).status_code == 400
+
+    response = client.get(f"/activity/{activity.activity_id}/best-efforts")
+    assert response.status_code == 200
+    assert response.json()[0]['start_offset'] == 0.0
+    assert client.get("/activity/missing/best-efforts").status_code == 404
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlmodel import select
+
+from app.model import ActivityTable, ActivityElevationProfile
+from app.auth import crypto
+from app.services import data_processing, elevation, elevation_profiles
+
+
+def ride_with_stop():
+    """2 km at 5 % with a 10 minute stop at 500 m: 100 samples moving, 600 stopped, 300 moving."""
+    distance = np.concatenate((np.linspace(0.0, 500.0, 100), np.full(600, 500.0), np.linspace(500.0, 2000.0, 301)[1:]))
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2025-04-01 08:00:00', periods=len(distance), freq='1s'),
+        'distance': distance,
+        'altitude': 100.0 + distance * 0.05,
+    })
+
+
+def test_elevation_profile_is_uniform_in_distance():
+    df = ride_with_stop()
+    distance, altitude, gradient = elevation.elevation_profile(df, 41)
+    assert np.allclose(np.diff(distance), 50.0)
+    assert np.allclose(altitude, 100.0 + distance * 0.05)
+    assert np.allclose(gradient, 5.0)
+
+    # Row subsampling would spend most of the points on the stop
+    summary = elevation.elev_summary(df, 41)
+    assert np.allclose(np.diff(summary.dist_series), 0.05)
+    assert summary.lowest == 100.0 and summary.highest == 200.0
+
+    # Without distances the series are subsampled by row
+    assert elevation.elevation_profile(df.drop(columns=['distance']), 41) is None
+    assert elevation.profile_summary(df.assign(distance=0.0), 41) is None
+
+
+def test_elevation_profile_smooths_gradients():
+    distance = np.arange(0.0, 1001.0, 1.0)
+    # +-1 m noise every metre on a flat road
+    df = pd.DataFrame({'distance': distance, 'altitude': 50.0 + np.where(np.arange(len(distance)) % 2, 1.0, -1.0)})
+    _, _, raw = elevation.elevation_profile(df, len(distance), smoothing=0.0)
+    _, _, smoothed = elevation.elevation_profile(df, len(distance))
+    assert np.abs(raw).max() > 50.0
+    assert np.abs(smoothed[100:-100]).max() < 1.0
+
+
+def test_elevation_profile_endpoints(auth_headers, test_user, dbsession, client):
+    df = ride_with_stop()
+    activity = ActivityTable(
+        activity_id=crypto.generate_random_base64_string(16),
+        name="Stop", owner_id=test_user.id, activity_type="recorded",
+        distance=2.0, active_time=400.0, elevation_gain=100.0,
+        date=datetime(2025, 4, 1, 8), last_modified=datetime(2025, 4, 1, 8),
+        data=data_processing.serialize_dataframe(df),
+        tags=None, static_map=None)
+    dbsession.add(activity)
+    dbsession.commit()
+
+    # Not stored yet: computed from the activity data
+    response = client.get(f"/activity/{activity.activity_id}/elevation-profile")
+    assert response.status_code == 200
+    assert len(response.json()["dist_series"]) == 200
+    assert client.get(f"/activity/{activity.activity_id}/elevation-profile", params={"points": 7}).status_code == 400
+    assert client.get("/activity/missing/elevation-profile").status_code == 404
+
+    assert client.post("/users/me/stats/recalculate", headers=auth_headers).status_code == 200
+    rows = dbsession.exec(select(ActivityElevationProfile).where(
+        ActivityElevationProfile.activity_id == activity.activity_id)).all()
+    assert sorted(r.points for r in rows) == sorted(elevation_profiles.ELEVATION_PROFILE_RESOLUTIONS)
+
+    # The activity response reads the stored profile
+    stored = elevation_profiles.stored_summary(dbsession, activity.activity_id)
+    stored.gradient_series = [g + 1.0 for g in stored.gradient_series]
+    [row] = [r for r in rows if r.points == elevation_profiles.SUMMARY_PROFILE_POINTS]
+    row.gradient = np.asarray(stored.gradient_series).tobytes()
+    dbsession.add(row)
+    dbsession.commit()
+    summary = client.get(f"/activity/{activity.activity_id}").json()["activity_analysis"]["elev_summary"]
+    assert np.allclose(summary["gradient_series"], 6.0)
+
+    response = client.get(f"/activity/{activity.activity_id}/elevation-profile", params={"points": 1000})
+    assert len(response.json()["elev_series"]) == 1000
+
+    elevation_profiles.remove_activity_profiles(dbsession, activity)
+    dbsession.commit()
+    assert elevation_profiles.stored_summary(dbsession, activity.activity_id) is None
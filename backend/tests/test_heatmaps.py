@@ -0,0 +1,100 @@
+import io
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+from sqlmodel import select
+
+from app import model
+from app.services import data_processing, heatmaps
+from tests.test_activity_fields import create_rich_activity_in_db
+
+
+def tile_counts(dbsession, user_id, zoom):
+    rows = dbsession.exec(select(model.UserHeatmapTile).where(
+        model.UserHeatmapTile.user_id == user_id, model.UserHeatmapTile.zoom == zoom)).all()
+    return {(r.x, r.y): dict(zip(np.frombuffer(r.pixels, dtype=np.uint16).tolist(),
+                                 np.frombuffer(r.counts, dtype=np.uint32).tolist())) for r in rows}
+
+
+def test_track_pixels_are_connected():
+    # A diagonal across a tile border: every step moves to a neighbouring pixel
+    lat = np.array([47.0, 46.95])
+    lon = np.array([7.95, 8.02])
+    zoom = 12
+    pixels = heatmaps.track_pixels(lat, lon, zoom)
+    scale = heatmaps.TILE_SIZE * 2 ** zoom
+    px, py = heatmaps.global_pixels(lat, lon, zoom)
+    assert np.floor(px[0]) + np.floor(py[0]) * scale in pixels
+    assert np.floor(px[1]) + np.floor(py[1]) * scale in pixels
+    iy, ix = pixels // scale, pixels % scale
+    assert len(pixels) >= max(np.ptp(ix), np.ptp(iy))
+    # Each pixel once, however many points fall in it
+    tiles = heatmaps.activity_tiles(pd.DataFrame({'position_lat': np.repeat(lat, 5), 'position_long': np.repeat(lon, 5)}), zoom)
+    assert sum(len(p) for p in tiles.values()) == len(pixels)
+    assert len(tiles) > 1
+    # GPS jumps are not drawn
+    assert len(heatmaps.track_pixels(np.array([47.0, 46.0]), np.array([8.0, 9.5]), zoom)) == 2
+
+
+def test_incremental_updates(test_user, dbsession):
+    first = create_rich_activity_in_db(dbsession, test_user.id)
+    df = data_processing.deserialize_dataframe(first.data)
+    zoom = heatmaps.HEATMAP_ZOOMS[-1]
+
+    heatmaps.add_activity_heat(dbsession, first, df)
+    once = tile_counts(dbsession, test_user.id, zoom)
+    assert once and all(set(c.values()) == {1} for c in once.values())
+    # Counted activities are not added twice
+    heatmaps.add_activity_heat(dbsession, first, df)
+    assert tile_counts(dbsession, test_user.id, zoom) == once
+
+    second = model.ActivityTable.model_validate(first, update={"activity_id": "second_activity"})
+    dbsession.add(second)
+    heatmaps.backfill_user_heatmap(dbsession, test_user.id)
+    twice = tile_counts(dbsession, test_user.id, zoom)
+    assert twice == {t: {p: 2 for p in c} for t, c in once.items()}
+
+    heatmaps.remove_activity_heat(dbsession, second)
+    assert tile_counts(dbsession, test_user.id, zoom) == once
+    heatmaps.remove_activity_heat(dbsession, first)
+    assert tile_counts(dbsession, test_user.id, zoom) == {}
+    # Removing an activity that is not counted changes nothing
+    heatmaps.remove_activity_heat(dbsession, first)
+    assert tile_counts(dbsession, test_user.id, zoom) == {}
+    dbsession.commit()
+
+
+def test_heatmap_tile_endpoint(auth_headers, test_user, dbsession, client, heatmap_png_cache):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    heatmaps.add_activity_heat(dbsession, activity, data_processing.deserialize_dataframe(activity.data))
+    dbsession.commit()
+
+    zoom = heatmaps.HEATMAP_ZOOMS[-1]
+    px, py = heatmaps.global_pixels(np.array([47.005]), np.array([8.005]), zoom)
+    x, y = int(px[0] // 256), int(py[0] // 256)
+    for z, tx, ty in ((zoom, x, y), (zoom - 1, x // 2, y // 2), (zoom + 1, 2 * x, 2 * y)):
+        response = client.get(f"/user/me/heatmap/{z}/{tx}/{ty}.png", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        image = Image.open(io.BytesIO(response.content))
+        assert image.size == (256, 256)
+        assert image.mode == "RGBA"
+    assert len(heatmap_png_cache) == 3
+
+    # The tile drawn at the stored zoom has the track's pixels
+    response = client.get(f"/user/me/heatmap/{zoom}/{x}/{y}.png", headers=auth_headers)
+    alpha = np.asarray(Image.open(io.BytesIO(response.content)))[:, :, 3]
+    assert (alpha > 0).sum() == len(tile_counts(dbsession, test_user.id, zoom)[(x, y)])
+    assert len(heatmap_png_cache) == 3
+
+    # Empty tiles are transparent; a change re-renders the touched tile
+    empty = client.get(f"/user/me/heatmap/{zoom}/0/0.png", headers=auth_headers)
+    assert np.asarray(Image.open(io.BytesIO(empty.content)))[:, :, 3].max() == 0
+    heatmaps.remove_activity_heat(dbsession, activity)
+    dbsession.commit()
+    response = client.get(f"/user/me/heatmap/{zoom}/{x}/{y}.png", headers=auth_headers)
+    assert np.asarray(Image.open(io.BytesIO(response.content)))[:, :, 3].max() == 0
+
+    assert client.get("/user/me/heatmap/3/8/0.png", headers=auth_headers).status_code == 404
+    assert client.get("/user/me/heatmap/3/0/0.png").status_code in (401, 403)
@@ -0,0 +1,58 @@
+from app.services import http_cache
+from tests.test_activity_fields import create_rich_activity_in_db
+
+
+def test_etag_matches():
+    etag = http_cache.activity_etag("a", None, "hash")
+    assert http_cache.etag_matches(etag, etag)
+    assert http_cache.etag_matches(f'"other", W/{etag}', etag)
+    assert http_cache.etag_matches("*", etag)
+    assert not http_cache.etag_matches(None, etag)
+    assert not http_cache.etag_matches('"other"', etag)
+
+
+def test_activity_etag_depends_on_variant():
+    assert http_cache.activity_etag("a", None, "hash", "raw") != http_cache.activity_etag("a", None, "hash", "gpx")
+    assert http_cache.activity_etag("a", None, "hash") != http_cache.activity_etag("a", None, "other")
+
+
+def test_get_activity_not_modified(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    url = f"/activity/{activity.activity_id}"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == http_cache.REVALIDATE_CACHE_CONTROL
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    # A different field selection is a different representation
+    response = client.get(url, params={"fields": "summary-only"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_raw_and_power_curve_not_modified(test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    for path in ("power-curve", "raw"):
+        url = f"/activity/{activity.activity_id}/{path}"
+        etag = client.get(url).headers["etag"]
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+
+def test_update_invalidates_etag(auth_headers, test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    url = f"/activity/{activity.activity_id}"
+    etag = client.get(url).headers["etag"]
+
+    response = client.patch(url, headers=auth_headers, json={"name": "Renamed"})
+    assert response.status_code == 200
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["activity_base"]["name"] == "Renamed"
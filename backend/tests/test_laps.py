@@ -0,0 +1,104 @@
+import unittest
+import numpy as np
+import pandas as pd
+from app.services import analysis, power, utils
+
+class TestLapMetrics(unittest.TestCase):
+
+    def setUp(self):
+        # 10 samples at 1s, power 100 for the first 5s and 200 for the last 5s
+        self.activity_df = pd.DataFrame({
+            'timestamp': pd.date_range('2025-01-01 10:00:00', periods=10, freq='1s'),
+            'power': [100, 100, 100, 100, 100, 200, 200, 200, 200, np.nan]
+        })
+        self.laps_df = pd.DataFrame({
+            'start_time': pd.to_datetime(['2025-01-01 10:00:00', '2025-01-01 10:00:05']),
+            'timestamp': pd.to_datetime(['2025-01-01 10:00:04', '2025-01-01 10:00:09']),
+            'total_distance': [1000.0, 1200.0],
+            'max_power': [np.nan, 250.0]
+        })
+
+    def test_compute_laps_metrics(self):
+        laps = analysis.compute_laps_metrics(self.laps_df, self.activity_df)
+        self.assertEqual(len(laps), 2)
+
+        self.assertAlmostEqual(laps[0].power_summary.average_power, 100.0)
+        # Work excludes the first sample of the lap: 4 intervals of 1s at 100W
+        self.assertAlmostEqual(laps[0].power_summary.total_work, 0.4)
+        self.assertEqual(len(laps[0].power_summary.quantiles), 101)
+        # Missing lap max power is filled from the samples
+        self.assertAlmostEqual(laps[0].max_power, 100.0)
+
+        self.assertAlmostEqual(laps[1].power_summary.average_power, 200.0)
+        self.assertAlmostEqual(laps[1].power_summary.median_power, 200.0)
+        self.assertAlmostEqual(laps[1].power_summary.total_work, 0.6)
+        self.assertAlmostEqual(laps[1].max_power, 250.0)
+        self.assertEqual(laps[1].total_distance, 1200.0)
+
+    def test_compute_laps_metrics_unsorted_activity(self):
+        shuffled = self.activity_df.sample(frac=1.0, random_state=0)
+        laps = analysis.compute_laps_metrics(self.laps_df, shuffled)
+        self.assertAlmostEqual(laps[0].power_summary.total_work, 0.4)
+        self.assertAlmostEqual(laps[1].power_summary.total_work, 0.6)
+
+    def test_compute_laps_metrics_empty_lap(self):
+        laps_df = pd.DataFrame({
+            'start_time': pd.to_datetime(['2025-01-02 10:00:00']),
+            'timestamp': pd.to_datetime(['2025-01-02 10:05:00'])
+        })
+        laps = analysis.compute_laps_metrics(laps_df, self.activity_df)
+        self.assertEqual(len(laps), 1)
+        self.assertIsNone(laps[0].power_summary)
+
+    def test_compute_laps_metrics_skips_invalid_laps(self):
+        laps_df = self.laps_df.copy()
+        laps_df.loc[0, 'start_time'] = pd.NaT
+        laps = analysis.compute_laps_metrics(laps_df, self.activity_df)
+        self.assertEqual(len(laps), 1)
+        self.assertEqual(laps[0].total_distance, 1200.0)
+
+    def test_compute_laps_metrics_seconds_unit(self):
+        # The Go FIT parser produces datetime64[s] columns
+        activity_df = self.activity_df.astype({'timestamp': 'datetime64[s]'})
+        laps_df = self.laps_df.astype({'start_time': 'datetime64[s]', 'timestamp': 'datetime64[s]'})
+        laps = analysis.compute_laps_metrics(laps_df, activity_df)
+        self.assertAlmostEqual(laps[0].power_summary.total_work, 0.4)
+        self.assertAlmostEqual(laps[1].power_summary.average_power, 200.0)
+        self.assertAlmostEqual(laps[1].power_summary.total_work, 0.6)
+
+    def test_to_epoch_ns_any_unit(self):
+        timestamps = pd.Series(pd.to_datetime(['2025-01-01 10:00:00', None, '2025-01-01 10:00:05']))
+        expected = timestamps.astype('datetime64[ns]').to_numpy().astype(np.int64)
+        for unit in ('s', 'ms', 'us', 'ns'):
+            np.testing.assert_array_equal(utils.to_epoch_ns(timestamps.astype(f'datetime64[{unit}]')), expected)
+        self.assertEqual(utils.to_epoch_ns(timestamps)[1], utils.NAT_NS)
+        aware = timestamps.astype('datetime64[s]').dt.tz_localize('Europe/Zurich')
+        self.assertEqual(utils.to_epoch_ns(aware)[0], expected[0] - 3600 * 10**9)
+
+    def test_segment_stats_match_numpy(self):
+        rng = np.random.default_rng(0)
+        n = 500
+        timestamps = pd.date_range('2025-01-01 10:00:00', periods=n, freq='1s')
+        power_values = rng.normal(200, 50, n)
+        power_values[rng.random(n) < 0.1] = np.nan
+        distribution = power.PowerDistribution(power_values, timestamps.asi8)
+
+        bounds = np.sort(rng.choice(n, 12, replace=False))
+        starts, ends = bounds[:-1], bounds[1:]
+        stats = distribution.segment_stats(timestamps.asi8[starts], timestamps.asi8[ends])
+        for i, (s, e) in enumerate(zip(starts, ends)):
+            segment = power_values[s:e + 1]
+            segment = segment[~np.isnan(segment)]
+            self.assertEqual(stats['count'][i], len(segment))
+            self.assertAlmostEqual(stats['average'][i], np.mean(segment))
+            self.assertAlmostEqual(stats['median'][i], np.median(segment))
+            self.assertAlmostEqual(stats['max'][i], np.max(segment))
+            np.testing.assert_allclose(stats['quantiles'][i], np.quantile(segment, power.QUANTILE_LEVELS))
+
+        whole = distribution.summary()
+        valid = power_values[~np.isnan(power_values)]
+        self.assertAlmostEqual(whole.median_power, np.median(valid))
+        np.testing.assert_allclose(whole.quantiles, np.quantile(valid, power.QUANTILE_LEVELS))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.model import ActivityTable
+from app.services import data_processing, map_renderer, maps, result_cache, tile_cache
+from tests.test_activity_fields import create_rich_activity_in_db
+from tests.test_tile_cache import CountingSource
+
+
+@pytest.fixture
+def counting_tiles(tmp_path):
+    source = CountingSource()
+    tile_cache.set_tile_cache(tile_cache.TileCache(source, result_cache.DiskBackend(str(tmp_path), 1 << 22)))
+    yield source
+    tile_cache.set_tile_cache(None)
+
+
+def test_map_endpoint_queues_render(test_user, dbsession, client, queued_map_renderer, counting_tiles):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+
+    response = client.get(f"/activity_map/{activity.activity_id}")
+    assert response.status_code == 202
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+    # Repeated views while rendering queue one job
+    assert client.get(f"/activity_map/{activity.activity_id}").status_code == 202
+    assert queued_map_renderer.stats()["pending"] == 1
+    assert counting_tiles.requests == []
+
+    queued_map_renderer.run_pending()
+    assert not queued_map_renderer.is_pending(activity.activity_id)
+    response = client.get(f"/activity_map/{activity.activity_id}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert "etag" in response.headers
+    assert len(counting_tiles.requests) > 0
+
+
+def test_map_endpoint_without_gps(test_user, dbsession, client, queued_map_renderer):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    df = data_processing.deserialize_dataframe(activity.data).drop(columns=['position_lat', 'position_long'])
+    activity.data = data_processing.serialize_dataframe(df)
+    dbsession.add(activity)
+    dbsession.commit()
+    assert client.get(f"/activity_map/{activity.activity_id}").status_code == 404
+    assert queued_map_renderer.stats()["pending"] == 0
+
+
+def test_map_endpoint_indoor_ride(test_user, dbsession, client, queued_map_renderer):
+    # The FIT parser keeps the position columns of indoor rides, all NaN
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    df = data_processing.deserialize_dataframe(activity.data)
+    df[['position_lat', 'position_long']] = float('nan')
+    activity.data = data_processing.serialize_dataframe(df)
+    dbsession.add(activity)
+    dbsession.commit()
+    assert client.get(f"/activity_map/{activity.activity_id}").status_code == 404
+    assert queued_map_renderer.stats()["pending"] == 0
+
+
+def test_failed_render_is_not_requeued(test_user, dbsession, client, queued_map_renderer, monkeypatch):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+
+    def fail(ride_df, num_samples):
+        raise RuntimeError("tile server down")
+    monkeypatch.setattr(map_renderer.maps, "get_activity_map", fail)
+    assert client.get(f"/activity_map/{activity.activity_id}").status_code == 202
+    queued_map_renderer.run_pending()
+    assert queued_map_renderer.stats() == {"pending": 0, "rendered": 0, "failed": 1}
+
+    response = client.get(f"/activity_map/{activity.activity_id}")
+    assert response.status_code == 503
+    assert 0 < int(response.headers["retry-after"]) <= queued_map_renderer.retry_seconds
+    assert queued_map_renderer.stats()["pending"] == 0
+    assert not queued_map_renderer.submit(activity.activity_id)
+
+    # Queued again once the retry delay is over
+    queued_map_renderer.retry_seconds = 0
+    assert client.get(f"/activity_map/{activity.activity_id}").status_code == 202
+    assert queued_map_renderer.is_pending(activity.activity_id)
+
+
+def test_upload_queues_render(auth_headers, test_user, dbsession, client, queued_map_renderer):
+    gpx_content = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1" creator="test">
+  <trk><trkseg>
+    <trkpt lat="47.0" lon="8.0"><ele>400</ele></trkpt>
+    <trkpt lat="47.01" lon="8.01"><ele>410</ele></trkpt>
+  </trkseg></trk>
+</gpx>"""
+    response = client.post("/upload_activity", headers=auth_headers,
+                           files={"file": ("route.gpx", io.BytesIO(gpx_content.encode()), "application/gpx+xml")})
+    assert response.status_code == 200
+    assert queued_map_renderer.is_pending(response.json()["activity_id"])
+
+    # GPS data means at least one position, not just the columns
+    assert maps.has_gps_data(pd.DataFrame({'position_lat': [np.nan], 'position_long': [np.nan]})) is False
+    assert maps.has_gps_data(pd.DataFrame({'position_lat': [np.nan, 47.0], 'position_long': [np.nan, 8.0]})) is True
+
+
+def test_backfill_renders_missing_maps(test_user, dbsession, engine_fixture, counting_tiles):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    renderer = map_renderer.MapRenderer(engine_fixture, workers=1)
+    assert map_renderer.backfill_static_maps(renderer) == 1
+    assert renderer.stats() == {"pending": 0, "rendered": 1, "failed": 0}
+    dbsession.expire_all()
+    assert dbsession.get(ActivityTable, activity.activity_id).static_map
+    # Nothing left to render
+    assert map_renderer.backfill_static_maps(renderer) == 0
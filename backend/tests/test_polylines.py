@@ -0,0 +1,70 @@
+import numpy as np
+
+from app.services import data_processing, polylines
+from tests.test_activity_fields import create_rich_activity_in_db
+
+
+def reference_rdp(x, y, tolerance, start, end, kept):
+    # Textbook recursion, distances to the segment
+    kept.add(start)
+    kept.add(end)
+    best, best_i = -1.0, None
+    for i in range(start + 1, end):
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else min(1.0, max(0.0, ((x[i] - x[start]) * dx + (y[i] - y[start]) * dy) / length2))
+        d = np.hypot(x[i] - x[start] - t * dx, y[i] - y[start] - t * dy)
+        if d > best:
+            best, best_i = d, i
+    if best_i is not None and best > tolerance:
+        reference_rdp(x, y, tolerance, start, best_i, kept)
+        reference_rdp(x, y, tolerance, best_i, end, kept)
+    return kept
+
+
+def test_encode_matches_reference_example():
+    # Example of the encoded polyline format documentation
+    lat = np.array([38.5, 40.7, 43.252])
+    lon = np.array([-120.2, -120.95, -126.453])
+    assert polylines.encode(lat, lon) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert polylines.encode(np.array([]), np.array([])) == ""
+
+
+def test_simplify_matches_recursive_rdp():
+    rng = np.random.default_rng(1)
+    x = np.cumsum(rng.normal(size=500))
+    y = np.cumsum(rng.normal(size=500))
+    for tolerance in (0.5, 2.0, 10.0):
+        expected = sorted(reference_rdp(x, y, tolerance, 0, len(x) - 1, set()))
+        assert polylines.simplify(x, y, tolerance).tolist() == expected
+    # A closed loop still splits
+    angle = np.linspace(0, 2 * np.pi, 50)
+    assert len(polylines.simplify(np.cos(angle), np.sin(angle), 0.1)) > 4
+
+
+def test_polyline_endpoints(auth_headers, test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+
+    # Not stored yet: computed from the track. A straight line keeps its ends
+    response = client.get(f"/activity/{activity.activity_id}/polyline")
+    assert response.status_code == 200
+    assert response.json()["points"] == 2
+    assert response.json()["tolerance"] == min(polylines.POLYLINE_TOLERANCES)
+
+    df = data_processing.deserialize_dataframe(activity.data)
+    polylines.store_activity_polylines(dbsession, activity, df)
+    dbsession.commit()
+    # Zoom 11 is ~38 m per half pixel: the 10 m polyline
+    response = client.get(f"/activity/{activity.activity_id}/polyline", params={"zoom": 11})
+    assert response.json()["tolerance"] == 10.0
+    assert client.get(f"/activity/{activity.activity_id}/polyline", params={"zoom": 2}).json()["tolerance"] == 50.0
+    assert client.get(f"/activity/{activity.activity_id}/polyline", params={"zoom": 22}).json()["tolerance"] == 2.0
+    assert client.get("/activity/missing/polyline").status_code == 404
+
+    listed = client.get("/activities", headers=auth_headers, params={"polyline": True}).json()
+    assert listed[0]["polyline"] == polylines.encode(df['position_lat'].iloc[[0, -1]], df['position_long'].iloc[[0, -1]])
+    assert client.get("/activities", headers=auth_headers).json()[0]["polyline"] is None
+
+    polylines.remove_activity_polylines(dbsession, activity)
+    dbsession.commit()
+    assert polylines.stored_polyline(dbsession, activity.activity_id) is None
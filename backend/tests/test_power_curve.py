@@ -1,6 +1,7 @@
 import unittest
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timezone
 from app.services import power
 
 class TestPowerCurve(unittest.TestCase):
@@ -114,5 +115,89 @@ class TestPowerCurve(unittest.TestCase):
         m3_watts = {d['duration']: d['max_watts'] for d in updated['3m']}
         self.assertEqual(m3_watts[1], 200)
 
+    def test_resample_power_1hz_matches_pandas(self):
+        timestamps = pd.to_datetime(['2023-01-01 10:00:00.2', '2023-01-01 10:00:00.7',
+                                     '2023-01-01 10:00:03.1', '2023-01-01 10:00:01.5'])
+        df = pd.DataFrame({'timestamp': timestamps, 'power': [100, 200, 300, float('nan')]})
+        expected = df.set_index('timestamp').sort_index()['power'].resample('1s').mean().fillna(0)
+        np.testing.assert_allclose(power.resample_power_1hz(df), expected.to_numpy())
+
+    def test_mean_max_power_matches_rolling(self):
+        rng = np.random.default_rng(0)
+        power_1hz = rng.normal(200, 60, 600)
+        durations = power.power_curve_grid(len(power_1hz), "full")
+        best = power.mean_max_power(power_1hz, durations)
+        series = pd.Series(power_1hz)
+        for d in (1, 7, 60, 599, 600):
+            self.assertAlmostEqual(best[d - 1], series.rolling(d).mean().max())
+
+    def test_full_grid_is_capped(self):
+        cap = power.FULL_GRID_MAX_SECONDS
+        np.testing.assert_array_equal(power.power_curve_grid(cap, "full"), np.arange(1, cap + 1))
+        # A 6 h ride has every second up to the cap, then the log grid
+        durations = power.power_curve_grid(6 * 3600, "full")
+        log_grid = power.power_curve_grid(6 * 3600, "log")
+        np.testing.assert_array_equal(durations[:cap], np.arange(1, cap + 1))
+        np.testing.assert_array_equal(durations[cap:], log_grid[log_grid > cap])
+        self.assertEqual(durations[-1], 6 * 3600)
+
+    def test_best_effort_offsets(self):
+        rng = np.random.default_rng(1)
+        power_1hz = rng.normal(200, 60, 600)
+        durations = np.array([1, 7, 60, 600])
+        best, offsets = power.mean_max_efforts(power_1hz, durations)
+        series = pd.Series(power_1hz)
+        for d, b, o in zip(durations, best, offsets):
+            rolling = series.rolling(d).mean()
+            self.assertEqual(o, rolling.idxmax() - d + 1)
+            self.assertAlmostEqual(b, power_1hz[o:o + d].mean())
+        self.assertEqual(power.mean_max_efforts(power_1hz, [601])[1].tolist(), [-1])
+
+        # Best 2 s window of 100,100,100,200,200,200,100,... starts 3 s in,
+        # ties go to the earliest window
+        df = pd.DataFrame({
+            'timestamp': [datetime(2023, 1, 1, 10, 0, i) for i in range(10)],
+            'power': [100, 100, 100, 200, 200, 200, 100, 100, 100, 100],
+        })
+        # Same efforts with the datetime64[s] timestamps of the Go FIT parser
+        for unit in ('ns', 's'):
+            frame = df.astype({'timestamp': f'datetime64[{unit}]'})
+            curve = {item['duration']: item for item in power.calculate_power_curve(frame)}
+            self.assertEqual(curve[2]['start_offset'], 3)
+            self.assertEqual(curve[2]['start_time'], '2023-01-01T10:00:03Z')
+            self.assertEqual(curve[5]['start_offset'], 1)
+            self.assertEqual(curve[10]['start_offset'], 0)
+            _, _, start_second = power.stored_power_efforts(frame)
+            self.assertEqual(start_second, datetime(2023, 1, 1, 10).replace(tzinfo=timezone.utc).timestamp())
+
+    def test_hr_curve_holds_sparse_samples(self):
+        # HR every 5 s: the gaps hold the last reading instead of dropping to 0
+        df = pd.DataFrame({
+            'timestamp': [datetime(2023, 1, 1, 10, 0, 5 * i) for i in range(4)],
+            'heart_rate': [120, 150, 160, 130],
+        })
+        curve = {item['duration']: item for item in power.calculate_hr_curve(df)}
+        self.assertEqual(curve[1]['max_bpm'], 160)
+        self.assertEqual(curve[5]['max_bpm'], 160)
+        self.assertEqual(curve[5]['start_offset'], 10)
+        self.assertAlmostEqual(curve[10]['max_bpm'], 155)
+        # Gaps longer than MAX_SAMPLE_SECONDS are not held
+        self.assertEqual(power.CURVE_HOLD_SECONDS['heart_rate'], power.MAX_SAMPLE_SECONDS)
+        # 30 s gap: the first reading is held for 10 s (11 bins), then 0 until the next one
+        gapped = pd.DataFrame({'timestamp': [datetime(2023, 1, 1, 10, 0, 0), datetime(2023, 1, 1, 10, 0, 30)],
+                               'heart_rate': [140, 140]})
+        curve = {item['duration']: item['max_bpm'] for item in power.calculate_hr_curve(gapped)}
+        self.assertEqual(curve[10], 140)
+        self.assertAlmostEqual(curve[20], 140 * 11 / 20)
+
+    def test_power_curve_grids(self):
+        self.assertEqual(power.power_curve_grid(100).tolist(), [1, 2, 5, 10, 20, 30, 60])
+        log_grid = power.power_curve_grid(4000, "log")
+        self.assertTrue(set(power.POWER_CURVE_DURATIONS[:13]).issubset(log_grid.tolist()))
+        self.assertEqual(log_grid[-1], 4000)
+        self.assertTrue(np.all(np.diff(log_grid) > 0))
+        with self.assertRaises(ValueError):
+            power.power_curve_grid(10, "bogus")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,407 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from sqlmodel import Session, select
+from app.model import ActivityTable, ActivityPowerCurve, UserMonthlyPowerCurve, PowerProfileFit, User
+from app.auth import crypto
+from app.services import data_processing, power, power_curves
+
+
+def create_power_activity(dbsession: Session, user_id: int, watts: float, seconds: int, date: datetime):
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(date, periods=seconds, freq='1s'),
+        'power': np.full(seconds, watts),
+    })
+    activity = ActivityTable(
+        activity_id=crypto.generate_random_base64_string(16),
+        name="Power Activity",
+        owner_id=user_id,
+        activity_type="recorded",
+        distance=1.0,
+        active_time=float(seconds),
+        elevation_gain=0.0,
+        date=date,
+        last_modified=date,
+        data=data_processing.serialize_dataframe(df),
+        tags=None,
+        static_map=None
+    )
+    dbsession.add(activity)
+    dbsession.commit()
+    dbsession.refresh(activity)
+    return activity, df
+
+
+def curve_dict(curve):
+    return {item['duration']: item['max_watts'] for item in curve}
+
+
+def test_stored_curve_matches_calculate_power_curve():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2025-01-01', periods=700, freq='1s'),
+        'power': rng.normal(200, 50, 700),
+    })
+    stored, offsets, start_second = power.stored_power_efforts(df)
+    curve = power.calculate_power_curve(df)
+    assert power.stored_curve_records(stored) == [
+        {'duration': item['duration'], 'max_watts': item['max_watts']} for item in curve]
+    ix = np.searchsorted(power.STORED_CURVE_DURATIONS, [item['duration'] for item in curve])
+    assert offsets[ix].tolist() == [item['start_offset'] for item in curve]
+    assert start_second == pd.Timestamp('2025-01-01', tz='UTC').timestamp()
+
+
+def test_stored_curve_of_seconds_unit_timestamps(test_user, dbsession):
+    # The Go FIT parser produces datetime64[s] timestamps
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2025-01-01', periods=700, freq='1s'),
+        'power': rng.normal(200, 50, 700),
+    })
+    seconds_df = df.astype({'timestamp': 'datetime64[s]'})
+    expected = power.stored_power_efforts(df)
+    stored, offsets, start_second = power.stored_power_efforts(seconds_df)
+    np.testing.assert_array_equal(stored, expected[0])
+    np.testing.assert_array_equal(offsets, expected[1])
+    assert start_second == expected[2]
+
+    activity, _ = create_power_activity(dbsession, test_user.id, 0.0, 1, datetime(2025, 1, 1))
+    power_curves.store_activity_curve(dbsession, activity, seconds_df)
+    power_curves.rebuild_user_curves(dbsession, test_user)
+    dbsession.commit()
+    curve = curve_dict(test_user.power_curve['all'])
+    assert len(curve) > 1
+    assert curve == curve_dict(power.calculate_power_curve(df))
+
+
+def test_user_curves_match_incremental(test_user, dbsession):
+    rng = np.random.default_rng(1)
+    now = datetime.now()
+    incremental = {}
+    for _ in range(6):
+        seconds = int(rng.integers(5, 400))
+        date = now - timedelta(days=int(rng.integers(0, 400)))
+        df = pd.DataFrame({
+            'timestamp': pd.date_range(date, periods=seconds, freq='1s'),
+            'power': rng.normal(200, 50, seconds),
+        })
+        activity, _ = create_power_activity(dbsession, test_user.id, 0.0, 1, date)
+        power_curves.store_activity_curve(dbsession, activity, df)
+        incremental = power.update_user_curves_incremental(incremental, power.calculate_power_curve(df), date)
+
+    merged = power_curves.user_curves(dbsession, test_user.id)
+    assert merged.keys() == incremental.keys()
+    for key in merged:
+        assert curve_dict(merged[key]) == curve_dict(incremental[key])
+
+
+def test_curve_between_matches_brute_force(test_user, dbsession):
+    rng = np.random.default_rng(2)
+    entries = []
+    for _ in range(12):
+        seconds = int(rng.integers(5, 200))
+        date = datetime(2024, 1, 1) + timedelta(days=int(rng.integers(0, 200)), hours=int(rng.integers(0, 24)))
+        df = pd.DataFrame({
+            'timestamp': pd.date_range(date, periods=seconds, freq='1s'),
+            'power': rng.normal(200, 50, seconds),
+        })
+        activity, _ = create_power_activity(dbsession, test_user.id, 0.0, 1, date)
+        entries.append((date, power_curves.store_activity_curve(dbsession, activity, df)))
+    assert len(dbsession.exec(select(UserMonthlyPowerCurve)).all()) <= 7
+
+    ranges = [(None, None), (datetime(2024, 2, 1), datetime(2024, 5, 1)),
+              (datetime(2024, 1, 17, 5), datetime(2024, 4, 3)), (datetime(2024, 3, 3), datetime(2024, 3, 20)),
+              (datetime(2024, 5, 10), None), (None, datetime(2024, 2, 14))]
+    for start, end in ranges:
+        inside = [curve for date, curve in entries
+                  if (start is None or date >= start) and (end is None or date < end)]
+        expected = power.merge_stored_curves(inside)
+        np.testing.assert_array_equal(power_curves.curve_between(dbsession, test_user.id, start, end), expected)
+
+
+def test_changing_date_moves_curve_between_buckets(auth_headers, test_user, dbsession, client):
+    now = datetime.now()
+    strong, _ = create_power_activity(dbsession, test_user.id, 300.0, 30, now - timedelta(days=1))
+    create_power_activity(dbsession, test_user.id, 150.0, 60, now - timedelta(days=2))
+    power_curves.rebuild_user_curves(dbsession, test_user)
+    dbsession.commit()
+    assert curve_dict(test_user.power_curve['3m'])[20] == 300.0
+
+    # Moving the strong activity out of the trailing 3 months ages it out of '3m' only
+    old_date = (now - timedelta(days=200)).isoformat()
+    response = client.patch(f"/activity/{strong.activity_id}", headers=auth_headers, json={"date": old_date})
+    assert response.status_code == 200
+    dbsession.expire_all()
+    user = dbsession.get(User, test_user.id)
+    assert curve_dict(user.power_curve['3m'])[20] == 150.0
+    assert curve_dict(user.power_curve['12m'])[20] == 300.0
+    assert curve_dict(user.power_curve['all'])[20] == 300.0
+
+
+def test_user_power_curve_endpoint(auth_headers, test_user, dbsession, client):
+    create_power_activity(dbsession, test_user.id, 300.0, 30, datetime(2024, 3, 10))
+    create_power_activity(dbsession, test_user.id, 150.0, 60, datetime(2024, 5, 10))
+    power_curves.rebuild_user_curves(dbsession, test_user)
+    dbsession.commit()
+
+    response = client.get("/user/me/power-curve", headers=auth_headers,
+                          params={"start": "2024-04-01T00:00:00", "end": "2024-06-01T00:00:00"})
+    assert response.status_code == 200
+    assert curve_dict(response.json())[20] == 150.0
+    # Offsets are converted to UTC: 02:00+02:00 is the activity's 00:00 UTC start
+    response = client.get("/user/me/power-curve", headers=auth_headers,
+                          params={"start": "2024-05-10T02:00:00+02:00", "end": "2024-05-11T00:00:00Z"})
+    assert curve_dict(response.json())[20] == 150.0
+
+    response = client.get("/user/me/power-curve", headers=auth_headers, params={"compact": True})
+    compact = response.json()
+    assert dict(zip(compact['duration'], compact['max_watts']))[20] == 300.0
+
+    response = client.get("/user/me/power-curve", headers=auth_headers,
+                          params={"start": "2024-06-01T00:00:00", "end": "2024-04-01T00:00:00"})
+    assert response.status_code == 400
+    assert client.get("/user/me/power-curve").status_code == 401
+
+
+def test_rebuild_backfills_and_delete_retracts(auth_headers, test_user, dbsession, client):
+    now = datetime.now()
+    strong, _ = create_power_activity(dbsession, test_user.id, 300.0, 30, now - timedelta(days=1))
+    weak, _ = create_power_activity(dbsession, test_user.id, 150.0, 60, now - timedelta(days=2))
+
+    # Activities created without stored curves are backfilled
+    power_curves.rebuild_user_curves(dbsession, test_user)
+    dbsession.commit()
+    assert len(dbsession.exec(select(ActivityPowerCurve)).all()) == 2
+    assert curve_dict(test_user.power_curve['all'])[20] == 300.0
+    assert curve_dict(test_user.power_curve['all'])[60] == 150.0
+    weak_curve = power_curves.load_curve(dbsession.get(ActivityPowerCurve, weak.activity_id), 'power')
+    assert weak_curve[power.STORED_CURVE_DURATIONS[:len(weak_curve)] == 60][0] == 150.0
+
+    strong_id = strong.activity_id
+    response = client.delete(f"/activity/{strong_id}", headers=auth_headers)
+    assert response.status_code == 200
+
+    dbsession.expire_all()
+    user = dbsession.get(User, test_user.id)
+    assert curve_dict(user.power_curve['all'])[20] == 150.0
+    assert dbsession.get(ActivityPowerCurve, strong_id) is None
+
+
+def create_cp_activity(dbsession: Session, user_id: int, cp: float, date: datetime):
+    """Activity whose stored curve follows the 2-parameter model with CP `cp`."""
+    activity, _ = create_power_activity(dbsession, user_id, 0.0, 1, date)
+    durations = power.STORED_CURVE_DURATIONS[power.STORED_CURVE_DURATIONS <= 3600]
+    curve = cp + 20000.0 / durations
+    row = ActivityPowerCurve(activity_id=activity.activity_id, owner_id=user_id, date=date,
+                             version=power.STORED_CURVE_VERSION, max_watts=curve.tobytes())
+    dbsession.add(row)
+    dbsession.flush()
+    power_curves.rebuild_month_bucket(dbsession, user_id, power_curves.month_key(date))
+    return activity, curve
+
+
+def test_power_profile_refits_only_when_envelope_changes(test_user, dbsession):
+    now = datetime.now()
+    create_cp_activity(dbsession, test_user.id, 250.0, now - timedelta(days=5))
+    profile = power_curves.power_profile(dbsession, test_user.id, 'all')
+    assert abs(profile.cp - 250.0) < 1e-6
+    fit = dbsession.exec(select(PowerProfileFit)).one()
+    computed_at = fit.computed_at
+
+    # A weaker activity does not raise the envelope: the stored fit is kept
+    weak, weak_df = create_power_activity(dbsession, test_user.id, 100.0, 60, now - timedelta(days=3))
+    power_curves.store_activity_curve(dbsession, weak, weak_df)
+    power_curves.power_profile(dbsession, test_user.id, 'all')
+    assert dbsession.exec(select(PowerProfileFit)).one().computed_at == computed_at
+
+    # A stronger one raises it and refits at ingest
+    strong, strong_df = create_power_activity(dbsession, test_user.id, 400.0, 1200, now - timedelta(days=1))
+    power_curves.store_activity_curve(dbsession, strong, strong_df)
+    fit = dbsession.exec(select(PowerProfileFit)).one()
+    assert fit.cp > 250.0
+    refitted_at = fit.computed_at
+    assert power_curves.power_profile(dbsession, test_user.id, 'all').cp == fit.cp
+    assert dbsession.exec(select(PowerProfileFit)).one().computed_at == refitted_at
+
+
+def test_power_profile_endpoints(auth_headers, test_user, dbsession, client):
+    create_cp_activity(dbsession, test_user.id, 200.0, datetime(2024, 1, 10))
+    create_cp_activity(dbsession, test_user.id, 260.0, datetime(2024, 3, 10))
+    create_cp_activity(dbsession, test_user.id, 230.0, datetime(2024, 9, 10))
+    dbsession.commit()
+
+    response = client.get("/user/me/power-profile", headers=auth_headers)
+    assert response.status_code == 200
+    assert abs(response.json()['cp'] - 260.0) < 1e-6
+
+    response = client.get("/user/me/power-profile", headers=auth_headers,
+                          params={"start": "2024-06-01T00:00:00"})
+    assert abs(response.json()['cp'] - 230.0) < 1e-6
+    assert client.get("/user/me/power-profile", headers=auth_headers, params={"period": "5y"}).status_code == 400
+
+    history = client.get("/user/me/power-profile/history", headers=auth_headers).json()
+    cps = {entry['month']: round(entry['cp'], 6) for entry in history}
+    # Trailing 3 months windows, months without activity in their window are skipped
+    assert cps == {'2024-01': 200.0, '2024-02': 200.0, '2024-03': 260.0, '2024-04': 260.0, '2024-05': 260.0,
+                   '2024-09': 230.0}
+
+
+def test_best_efforts_locate_activity_and_offset(auth_headers, test_user, dbsession, client):
+    def ride_with_peak(date, base, peak, peak_at):
+        seconds = 600
+        watts = np.full(seconds, base)
+        watts[peak_at:peak_at + 60] = peak
+        return pd.DataFrame({'timestamp': pd.date_range(date, periods=seconds, freq='1s'), 'power': watts})
+
+    # Two activities in a whole month (bucket) and one in the partial edge month
+    rides = {
+        'a': (datetime(2024, 3, 5, 8), ride_with_peak(datetime(2024, 3, 5, 8), 150.0, 400.0, 100)),
+        'b': (datetime(2024, 3, 20, 8), ride_with_peak(datetime(2024, 3, 20, 8), 220.0, 300.0, 10)),
+        'c': (datetime(2024, 4, 2, 8), ride_with_peak(datetime(2024, 4, 2, 8), 100.0, 350.0, 500)),
+    }
+    ids = {}
+    for name, (date, df) in rides.items():
+        activity, _ = create_power_activity(dbsession, test_user.id, 0.0, 1, date)
+        power_curves.store_activity_curve(dbsession, activity, df)
+        ids[name] = activity.activity_id
+    dbsession.commit()
+
+    response = client.get("/user/me/power-curve", headers=auth_headers,
+                          params={"efforts": True, "start": "2024-03-01T00:00:00", "end": "2024-04-15T00:00:00"})
+    assert response.status_code == 200
+    efforts = {e['duration']: e for e in response.json()}
+    assert efforts[60]['activity_id'] == ids['a']
+    assert efforts[60]['max_watts'] == 400.0
+    assert efforts[60]['start_offset'] == 100
+    assert efforts[60]['start_time'] == '2024-03-05T08:01:40Z'
+    assert efforts[600]['activity_id'] == ids['b']
+
+    # Only the edge month activity when the range starts after March
+    efforts = {e['duration']: e for e in power_curves.best_efforts_between(
+        dbsession, test_user.id, datetime(2024, 4, 1, 12))}
+    assert efforts[60]['activity_id'] == ids['c']
+    assert efforts[60]['start_offset'] == 500
+
+
+def test_time_in_zones_endpoint_from_histograms(auth_headers, test_user, dbsession, client):
+    test_user.power_zones = [150, 250]
+    dbsession.add(test_user)
+    rides = [(datetime(2024, 3, 5, 8), 100.0, 600), (datetime(2024, 3, 20, 8), 200.0, 300),
+             (datetime(2024, 4, 2, 8), 300.0, 120)]
+    for date, watts, seconds in rides:
+        activity, df = create_power_activity(dbsession, test_user.id, watts, seconds, date)
+        power_curves.store_activity_curve(dbsession, activity, df)
+    dbsession.commit()
+
+    response = client.get("/users/me/stats/time-in-zones", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"zones": [150, 250], "seconds": [600.0, 300.0, 120.0]}
+
+    # Partial months are summed from the activity histograms
+    response = client.get("/users/me/stats/time-in-zones", headers=auth_headers,
+                          params={"start_date": "2024-03-10", "end_date": "2024-04-02", "zones": "250,150"})
+    assert response.json() == {"zones": [150, 250], "seconds": [0.0, 300.0, 120.0]}
+
+    test_user.power_zones = None
+    dbsession.add(test_user)
+    dbsession.commit()
+    assert client.get("/users/me/stats/time-in-zones", headers=auth_headers).status_code == 400
+
+
+def test_hr_curve_and_zones_from_stored_buckets(auth_headers, test_user, dbsession, client):
+    test_user.hr_zones = [130, 160]
+    dbsession.add(test_user)
+    rides = [(datetime(2024, 3, 5, 8), 120.0, 600), (datetime(2024, 3, 20, 8), 150.0, 300),
+             (datetime(2024, 4, 2, 8), 175.0, 120)]
+    ids = []
+    for date, bpm, seconds in rides:
+        # HR only, no power meter
+        df = pd.DataFrame({'timestamp': pd.date_range(date, periods=seconds, freq='1s'),
+                           'heart_rate': np.full(seconds, bpm)})
+        activity, _ = create_power_activity(dbsession, test_user.id, 0.0, 1, date)
+        power_curves.store_activity_curve(dbsession, activity, df)
+        ids.append(activity.activity_id)
+    dbsession.commit()
+
+    bucket = dbsession.exec(select(UserMonthlyPowerCurve).where(UserMonthlyPowerCurve.month == "2024-03")).one()
+    assert power_curves.load_curve(bucket, 'heart_rate')[0] == 150.0
+
+    response = client.get("/user/me/hr-curve", headers=auth_headers)
+    assert response.status_code == 200
+    curve = {item['duration']: item['max_bpm'] for item in response.json()}
+    assert curve[60] == 175.0
+    assert curve[300] == 150.0
+    assert curve[600] == 120.0
+
+    response = client.get("/user/me/hr-curve", headers=auth_headers,
+                          params={"efforts": True, "end": "2024-04-01T00:00:00"})
+    efforts = {e['duration']: e for e in response.json()}
+    assert efforts[60]['activity_id'] == ids[1]
+    assert efforts[60]['start_time'] == '2024-03-20T08:00:00Z'
+
+    response = client.get("/users/me/stats/time-in-zones", headers=auth_headers, params={"metric": "heart_rate"})
+    assert response.json() == {"zones": [130, 160], "seconds": [600.0, 300.0, 120.0]}
+    assert client.get("/users/me/stats/time-in-zones", headers=auth_headers,
+                      params={"metric": "cadence"}).status_code == 400
+
+
+def test_top_efforts_leaderboard(auth_headers, test_user, dbsession, client):
+    rides = [(datetime(2024, 3, 5, 8), 250.0), (datetime(2024, 5, 20, 8), 300.0),
+             (datetime(2024, 7, 2, 8), 200.0), (datetime(2024, 8, 2, 8), 280.0)]
+    activities = []
+    for date, watts in rides:
+        activity, df = create_power_activity(dbsession, test_user.id, watts, 1300, date)
+        power_curves.store_activity_curve(dbsession, activity, df)
+        activities.append(activity)
+    dbsession.commit()
+
+    response = client.get("/user/me/top-efforts", headers=auth_headers, params={"duration": 1200, "limit": 3})
+    assert response.status_code == 200
+    assert [e['max_watts'] for e in response.json()] == [300.0, 280.0, 250.0]
+    assert response.json()[0]['activity_id'] == activities[1].activity_id
+
+    response = client.get("/user/me/top-efforts", headers=auth_headers,
+                          params={"duration": 1200, "start": "2024-06-01T00:00:00"})
+    assert [e['max_watts'] for e in response.json()] == [280.0, 200.0]
+    assert client.get("/user/me/top-efforts", headers=auth_headers, params={"duration": 7}).status_code == 400
+
+    # Deleting and re-dating activities keep the leaderboard in sync
+    power_curves.remove_activity_curve(dbsession, activities[1])
+    dbsession.delete(activities[1])
+    dbsession.flush()
+    activities[3].date = datetime(2024, 4, 1, 8)
+    power_curves.update_activity_date(dbsession, activities[3])
+    dbsession.commit()
+    efforts = power_curves.top_efforts(dbsession, test_user.id, 1200, start=datetime(2024, 6, 1))
+    assert [e['max_watts'] for e in efforts] == [200.0]
+    assert [e['max_watts'] for e in power_curves.top_efforts(dbsession, test_user.id, 1200)] == [280.0, 250.0, 200.0]
+
+
+def test_top_efforts_of_fit_upload_with_seconds_timestamps(auth_headers, test_user, dbsession, client):
+    # The Go FIT parser produces datetime64[s] timestamps and NaN positions for indoor rides
+    seconds = 1300
+    fit_df = pd.DataFrame({
+        'timestamp': pd.date_range(datetime(2024, 3, 5, 8), periods=seconds, freq='1s').astype('datetime64[s]'),
+        'power': np.full(seconds, 280.0),
+        'distance': np.arange(seconds) * 8.0,
+        'position_lat': np.full(seconds, np.nan),
+        'position_long': np.full(seconds, np.nan),
+    })
+    with patch("app.fit_parsing.extract_data_to_dataframe", return_value=fit_df):
+        response = client.post("/upload_activity", headers=auth_headers,
+                               files={"file": ("indoor.fit", b"fit bytes", "application/octet-stream")})
+    assert response.status_code == 200
+    activity_id = response.json()["activity_id"]
+
+    response = client.get("/user/me/top-efforts", headers=auth_headers, params={"duration": 1200})
+    assert response.status_code == 200
+    [effort] = response.json()
+    assert effort['activity_id'] == activity_id
+    assert effort['max_watts'] == 280.0
+    curve = curve_dict(client.get("/user/me/power-curve", headers=auth_headers).json())
+    assert curve[1200] == 280.0
+
+    summary = client.get(f"/activity/{activity_id}", headers=auth_headers).json()["activity_analysis"]
+    assert summary["total_elapsed_time"] == seconds - 1
+    assert abs(summary["power_summary"]["total_work"] - 280.0 * (seconds - 1) / 1000.0) < 1e-6
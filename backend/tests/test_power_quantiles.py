@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from app.model import ActivityPowerQuantiles
+from app.services import data_processing, power, power_quantiles
+from tests.test_activity_fields import create_rich_activity_in_db
+
+
+def test_stored_quantiles(auth_headers, test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    df = data_processing.deserialize_dataframe(activity.data)
+    assert power_quantiles.stored_quantiles(dbsession, activity.activity_id) is None
+
+    assert client.post("/users/me/stats/recalculate", headers=auth_headers).status_code == 200
+    activity_quantiles, lap_quantiles = power_quantiles.stored_quantiles(dbsession, activity.activity_id)
+    np.testing.assert_allclose(activity_quantiles, np.quantile(df['power'], power.QUANTILE_LEVELS))
+    # The single lap covers the first minute
+    lap_power = df['power'][df['timestamp'] <= df['timestamp'][0] + np.timedelta64(60, 's')]
+    assert lap_quantiles.shape == (1, len(power.QUANTILE_LEVELS))
+    np.testing.assert_allclose(lap_quantiles[0], np.quantile(lap_power, power.QUANTILE_LEVELS))
+
+    # The activity response reads the stored vectors
+    row = dbsession.get(ActivityPowerQuantiles, activity.activity_id)
+    row.quantiles = (activity_quantiles + 1.0).tobytes()
+    row.lap_quantiles = (lap_quantiles + 2.0).tobytes()
+    dbsession.add(row)
+    dbsession.commit()
+    data = client.get(f"/activity/{activity.activity_id}").json()
+    np.testing.assert_allclose(data["activity_analysis"]["power_summary"]["quantiles"], activity_quantiles + 1.0)
+    np.testing.assert_allclose(data["laps"][0]["power_summary"]["quantiles"], lap_quantiles[0] + 2.0)
+
+    # Without laps the power samples are not sorted
+    with patch("app.services.power._sorted_quantiles") as sorted_quantiles:
+        response = client.get(f"/activity/{activity.activity_id}", params={"fields": "quantiles"})
+        assert response.status_code == 200
+        sorted_quantiles.assert_not_called()
+
+    power_quantiles.remove_activity_quantiles(dbsession, activity)
+    dbsession.commit()
+    assert power_quantiles.stored_quantiles(dbsession, activity.activity_id) is None
+
+
+def test_no_quantiles_without_power():
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2025-01-01 10:00:00', periods=3, freq='1s'),
+        'power': np.nan,
+    })
+    assert power_quantiles.compute_quantiles(df) is None
+    assert power_quantiles.compute_quantiles(df.drop(columns=['power'])) is None
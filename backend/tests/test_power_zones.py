@@ -1,7 +1,8 @@
 
 import pytest
+import numpy as np
 import pandas as pd
-from app.services import analysis
+from app.services import analysis, power
 from app import model
 
 def test_calculate_time_in_zones():
@@ -41,16 +42,64 @@ def test_calculate_time_in_zones_no_zones():
     assert result == []
 
 def test_calculate_time_in_zones_irregular_time():
-    # Although the current implementation assumes 1s for robustness or simplicity as per code comments,
-    # let's verify it behaves as implemented (count of rows).
+    # Smart recording: every sample counts for the time until the next one.
     data = {
         'timestamp': pd.date_range(start='2021-01-01 10:00:00', periods=3, freq='2s'), # 2s gaps
         'power': [100, 100, 100]
     }
     df = pd.DataFrame(data)
     zones = [150]
-    # 3 samples, all in Z1.
-    # Implementation says: durations = np.ones(len(df)). So sum should be 3.
+    # 2 s per sample, the last one gets the median interval
     result = analysis.calculate_time_in_zones(df, zones)
-    assert result == [3.0, 0.0]
+    assert result == [6.0, 0.0]
 
+def test_calculate_time_in_zones_caps_pauses():
+    timestamps = pd.to_datetime(['2021-01-01 10:00:00', '2021-01-01 10:00:01',
+                                 '2021-01-01 10:05:00', '2021-01-01 10:00:02'])
+    df = pd.DataFrame({'timestamp': timestamps, 'power': [100, 300, 300, float('nan')]})
+    # Unsorted samples are ordered by time; the 298 s pause counts as MAX_SAMPLE_SECONDS
+    result = analysis.calculate_time_in_zones(df, [150])
+    assert result == [1.0 + power.MAX_SAMPLE_SECONDS, 1.0 + 1.0]
+
+def test_histogram_time_in_zones_matches_direct():
+    rng = np.random.default_rng(0)
+    seconds = np.cumsum(rng.choice([1, 1, 2, 3], size=2000))
+    df = pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(seconds, unit='s'),
+        'power': np.round(rng.normal(220, 90, 2000), 1),
+    })
+    histogram = power.power_histogram(df)
+    for zones in ([150, 200, 250, 300, 350, 400], [100], [0, 250, 251]):
+        np.testing.assert_allclose(power.histogram_time_in_zones(histogram, zones),
+                                   power.calculate_time_in_zones(df, zones))
+
+def test_hr_time_in_zones_skips_missing_heart_rate():
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(start='2021-01-01 10:00:00', periods=4, freq='1s'),
+        'heart_rate': [100, float('nan'), 150, 170],
+    })
+    # Unlike missing power (0 W), samples without HR count for no time
+    result = power.calculate_time_in_zones(df, [140, 160], 'heart_rate')
+    assert result == [1.0, 1.0, 1.0]
+    histogram = power.power_histogram(df, 'heart_rate')
+    assert power.histogram_time_in_zones(histogram, [140, 160]) == result
+
+def test_time_in_zones_seconds_unit_timestamps():
+    # The Go FIT parser produces datetime64[s] timestamps
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(start='2021-01-01 10:00:00', periods=3, freq='2s').astype('datetime64[s]'),
+        'power': [100, 200, 100],
+    })
+    assert power.sample_seconds(df).tolist() == [2.0, 2.0, 2.0]
+    assert analysis.calculate_time_in_zones(df, [150]) == [4.0, 2.0]
+    assert power.histogram_time_in_zones(power.power_histogram(df), [150]) == [4.0, 2.0]
+
+def test_power_histogram_caps_glitches():
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(start='2021-01-01 10:00:00', periods=4, freq='1s'),
+        'power': [200, 65535, 1e9, 250],
+    })
+    histogram = power.power_histogram(df)
+    assert len(histogram) == power.HISTOGRAM_MAX_VALUE + 1
+    assert histogram[-1] == 2.0
+    assert power.histogram_time_in_zones(histogram, [225, 1000]) == power.calculate_time_in_zones(df, [225, 1000])
@@ -0,0 +1,128 @@
+import time
+import tempfile
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.services import power, result_cache
+from tests.test_activity_fields import create_rich_activity_in_db
+
+T0 = datetime(2025, 1, 1, 10)
+T1 = datetime(2025, 1, 2, 10)
+
+
+def make_cache(backend, ttl=0):
+    return result_cache.ResultCache(backend, ttl)
+
+
+@pytest.fixture(params=["memory", "disk"])
+def backend_factory(request, tmp_path):
+    if request.param == "memory":
+        return lambda max_bytes: result_cache.MemoryBackend(max_bytes)
+    return lambda max_bytes: result_cache.DiskBackend(str(tmp_path), max_bytes)
+
+
+def test_get_set_and_key_includes_last_modified(backend_factory):
+    cache = make_cache(backend_factory(1 << 20))
+    assert cache.get("curve", "a", T0) is result_cache._MISSING
+    cache.set([1, 2, 3], "curve", "a", T0)
+    assert cache.get("curve", "a", T0) == [1, 2, 3]
+    assert cache.get("curve", "a", T1) is result_cache._MISSING
+    assert cache.get("curve", "a", T0, "arg") is result_cache._MISSING
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+
+
+def test_lru_eviction_respects_byte_budget(backend_factory):
+    payload = b"x" * 1000
+    cache = make_cache(backend_factory(3500))
+    for i in range(3):
+        cache.set(payload, "blob", str(i), T0)
+    # Touch the first entry so that the second one is the least recently used
+    assert cache.get("blob", "0", T0) == payload
+    cache.set(payload, "blob", "3", T0)
+    assert cache.get("blob", "1", T0) is result_cache._MISSING
+    assert cache.get("blob", "0", T0) == payload
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= 3500
+
+
+def test_ttl_expiration(backend_factory):
+    cache = make_cache(backend_factory(1 << 20), ttl=10)
+    cache.set("value", "gpx", "a", T0)
+    with patch("app.services.result_cache.time.time", return_value=time.time() + 11):
+        assert cache.get("gpx", "a", T0) is result_cache._MISSING
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_activity(backend_factory):
+    cache = make_cache(backend_factory(1 << 20))
+    cache.set(1, "curve", "a", T0)
+    cache.set(2, "gpx", "a", T0)
+    cache.set(3, "curve", "b", T0)
+    cache.invalidate("a")
+    assert cache.get("curve", "a", T0) is result_cache._MISSING
+    assert cache.get("gpx", "a", T0) is result_cache._MISSING
+    assert cache.get("curve", "b", T0) == 3
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_disk_backend_persists():
+    with tempfile.TemporaryDirectory() as directory:
+        make_cache(result_cache.DiskBackend(directory, 1 << 20)).set({"a": 1}, "curve", "a", T0)
+        cache = make_cache(result_cache.DiskBackend(directory, 1 << 20))
+        assert cache.stats()["entries"] == 1
+        assert cache.get("curve", "a", T0) == {"a": 1}
+
+
+def test_cached_result_decorator():
+    calls = []
+
+    @result_cache.cached_result("square")
+    def square(activity_id, last_modified, x, *, session=None):
+        calls.append(x)
+        return x * x
+
+    assert square("a", T0, 3, session=object()) == 9
+    assert square("a", T0, 3, session=object()) == 9
+    assert square("a", T1, 3) == 9
+    assert square("a", None, 3) == 9
+    assert calls == [3, 3, 3]
+
+
+def test_power_curve_cached_and_invalidated(auth_headers, test_user, dbsession, client):
+    activity = create_rich_activity_in_db(dbsession, test_user.id)
+    url = f"/activity/{activity.activity_id}/power-curve"
+    with patch("app.services.power.calculate_power_curve", wraps=power.calculate_power_curve) as calc:
+        first = client.get(url).json()
+        second = client.get(url).json()
+        assert first == second
+        assert calc.call_count == 1
+
+        response = client.patch(f"/activity/{activity.activity_id}", headers=auth_headers, json={"name": "Renamed"})
+        assert response.status_code == 200
+        client.get(url)
+        assert calc.call_count == 2
+
+    stats = result_cache.get_result_cache().stats()
+    assert stats["hits"] == 1
+    assert stats["invalidations"] == 1
+
+
+def test_process_wide_cache_from_environment(monkeypatch):
+    result_cache.set_result_cache(None)
+    assert result_cache.get_result_cache() is None
+    # Overridden values stay until the override is dropped, then the environment decides
+    monkeypatch.setenv("RESULT_CACHE_BACKEND", "memory")
+    assert result_cache.get_result_cache() is None
+    result_cache.get_result_cache.override()
+    cache = result_cache.get_result_cache()
+    assert isinstance(cache.backend, result_cache.MemoryBackend)
+    assert result_cache.get_result_cache() is cache
+    monkeypatch.setenv("RESULT_CACHE_BACKEND", "off")
+    result_cache.get_result_cache.override()
+    assert result_cache.get_result_cache() is None
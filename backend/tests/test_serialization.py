@@ -0,0 +1,30 @@
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from app.services import serialization
+
+
+def test_dumps_nan_and_numpy():
+    payload = {
+        "nan": float("nan"),
+        "inf": np.float64("inf"),
+        "series": np.array([1.5, np.nan]),
+        "count": np.int64(3),
+        "ts": pd.Timestamp("2025-01-01 10:00:00"),
+        "utc": datetime(2025, 1, 1, tzinfo=timezone.utc),
+    }
+    assert json.loads(serialization.dumps(payload)) == {
+        "nan": None,
+        "inf": None,
+        "series": [1.5, None],
+        "count": 3,
+        "ts": "2025-01-01T10:00:00",
+        "utc": "2025-01-01T00:00:00+00:00",
+    }
+
+
+def test_records_matches_pandas():
+    df = pd.DataFrame({"time": [1.0, 2.0], "power": [100.0, 150.5]})
+    columns = {name: df[name].to_numpy() for name in df.columns}
+    assert serialization.records(columns) == df.to_dict(orient="records")
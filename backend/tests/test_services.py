@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 import pandas as pd
 from app import model
 from app.services import data_processing, analysis, maps, activity_crud, elevation
@@ -44,6 +45,37 @@ class TestServices(unittest.TestCase):
         intervals = elevation.compute_elevation_gain_intervals(df, tolerance=1.0, min_elev=2.0)
         self.assertEqual(len(intervals), 0)
         
+    def test_detect_climbs(self):
+        altitude = np.array([10, 12, 15, 14, 16, 13, 17, 18, 16], dtype=float)
+        from_ix, to_ix, gains = elevation.detect_climbs(altitude, tolerance=0.5, min_elev=2.0)
+        np.testing.assert_array_equal(from_ix, [0, 5])
+        np.testing.assert_array_equal(to_ix, [2, 7])
+        np.testing.assert_array_equal(gains, [5.0, 5.0])
+
+    def test_detect_climbs_matches_reference_loop(self):
+        def reference(altitude, tolerance, min_elev):
+            climbs = []
+            high_ix = low_ix = 0
+            for i, h in enumerate(altitude):
+                if h < altitude[low_ix]:
+                    low_ix = i
+                if h > altitude[high_ix]:
+                    high_ix = i
+                if h < (altitude[high_ix] - tolerance):
+                    if low_ix < high_ix and altitude[high_ix] - altitude[low_ix] > min_elev:
+                        climbs.append((low_ix, high_ix, altitude[high_ix] - altitude[low_ix]))
+                    low_ix = high_ix = i
+            return climbs
+
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            altitude = np.cumsum(rng.normal(0, 2, rng.integers(1, 300))).round(1)
+            for tolerance, min_elev in [(0.0, 0.0), (0.5, 1.0), (2.0, 4.0)]:
+                from_ix, to_ix, gains = elevation.detect_climbs(altitude, tolerance, min_elev)
+                self.assertEqual(
+                    list(zip(from_ix.tolist(), to_ix.tolist(), gains.tolist())),
+                    reference(altitude.tolist(), tolerance, min_elev))
+
     def test_compute_elevation_gain(self):
         df = pd.DataFrame({
             'altitude': [10, 12, 15, 14, 16, 13, 17, 18, 16]
@@ -52,7 +84,7 @@ class TestServices(unittest.TestCase):
         self.assertEqual(total_gain, 10.0)
 
 
-    @patch('app.services.maps.StaticMap')
+    @patch('app.services.maps.CachedStaticMap')
     @patch('os.getenv')
     def test_get_activity_map(self, mock_getenv, MockStaticMap):
         mock_getenv.return_value = "400"
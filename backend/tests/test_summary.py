@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import pandas as pd
+from app.services import summary, analysis
+
+class TestSummaryKernel(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 600
+        self.df = pd.DataFrame({
+            'timestamp': pd.date_range('2025-01-01 10:00:00', periods=n, freq='1s'),
+            'distance': np.cumsum(rng.uniform(5, 10, n)),
+            'speed': rng.uniform(5, 10, n),
+            'altitude': np.cumsum(rng.normal(0, 1, n)),
+            'heart_rate': rng.integers(100, 180, n).astype(float),
+            'temperature': rng.uniform(10, 20, n),
+            'power': rng.normal(200, 40, n)
+        })
+        for col in ['speed', 'heart_rate', 'temperature', 'power']:
+            self.df.loc[rng.random(n) < 0.05, col] = np.nan
+
+    def test_matches_pandas_reference(self):
+        df = self.df
+        stats = summary.summarize_activity(df)
+
+        self.assertAlmostEqual(stats['distance'], df['distance'].iloc[-1] / 1000.0)
+        self.assertAlmostEqual(stats['total_elapsed_time'], 599.0)
+        self.assertAlmostEqual(stats['active_time'], 600.0)
+        self.assertAlmostEqual(stats['average_speed'], df['speed'].mean() * 3.6)
+        self.assertEqual(stats['average_heartrate'], int(df['heart_rate'].mean()))
+        self.assertEqual(stats['max_heartrate'], int(df['heart_rate'].max()))
+        self.assertAlmostEqual(stats['average_temperature'], df['temperature'].mean())
+        self.assertAlmostEqual(stats['max_power'], df['power'].max())
+
+        power_summary = stats['power_summary']
+        self.assertAlmostEqual(power_summary.average_power, df['power'].mean())
+        self.assertAlmostEqual(power_summary.median_power, df['power'].median())
+        np.testing.assert_allclose(
+            power_summary.quantiles, df['power'].quantile([i / 100.0 for i in range(101)]))
+        work = (df['power'] * df['timestamp'].diff().dt.total_seconds()).sum() / 1000.0
+        self.assertAlmostEqual(power_summary.total_work, work)
+
+    def test_seconds_unit_timestamps(self):
+        # The Go FIT parser produces datetime64[s] timestamps
+        df = self.df.astype({'timestamp': 'datetime64[s]'})
+        stats = summary.summarize_activity(df)
+        expected = summary.summarize_activity(self.df)
+        self.assertAlmostEqual(stats['total_elapsed_time'], 599.0)
+        self.assertAlmostEqual(stats['power_summary'].total_work, expected['power_summary'].total_work)
+        self.assertGreater(stats['power_summary'].total_work, 100.0)
+        activity_summary = analysis.compute_activity_summary(df)
+        self.assertAlmostEqual(activity_summary.total_elapsed_time, 599.0)
+        self.assertAlmostEqual(activity_summary.power_summary.total_work, expected['power_summary'].total_work)
+
+    def test_unsorted_timestamps(self):
+        shuffled = self.df.sample(frac=1.0, random_state=1)
+        expected = summary.summarize_activity(self.df)['power_summary'].total_work
+        self.assertAlmostEqual(summary.summarize_activity(shuffled)['power_summary'].total_work, expected)
+
+    def test_does_not_mutate_input(self):
+        df = self.df.copy()
+        df['timestamp'] = df['timestamp'].astype(str)
+        before = df.copy()
+        analysis.compute_activity_summary(df)
+        pd.testing.assert_frame_equal(df, before)
+
+    def test_missing_columns(self):
+        stats = summary.summarize_activity(pd.DataFrame({'col1': [1, 2]}))
+        self.assertEqual(stats['distance'], 0.0)
+        self.assertEqual(stats['total_elapsed_time'], 0.0)
+        self.assertEqual(stats['active_time'], 2.0)
+        self.assertIsNone(stats['power_summary'])
+        self.assertIsNone(stats['average_heartrate'])
+
+if __name__ == '__main__':
+    unittest.main()
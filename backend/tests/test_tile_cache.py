@@ -0,0 +1,98 @@
+import io
+import threading
+import time
+
+from PIL import Image
+from staticmap import Line
+
+from app.services import result_cache, tile_cache
+
+
+def png_tile(color="green"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class CountingSource:
+    """Returns the same tile for every request, slowly, and counts the requests."""
+    name = "counting"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def fetch(self, z, x, y):
+        with self._lock:
+            self.requests.append((z, x, y))
+        time.sleep(self.delay)
+        return png_tile()
+
+
+def test_local_source_and_disk_cache(tmp_path):
+    tiles_dir = tmp_path / "tiles" / "3" / "4"
+    tiles_dir.mkdir(parents=True)
+    (tiles_dir / "5.png").write_bytes(b"tile-345")
+    source = tile_cache.tile_source(str(tmp_path / "tiles" / "{z}" / "{x}" / "{y}.png"))
+    assert isinstance(source, tile_cache.LocalTileSource)
+    assert isinstance(tile_cache.tile_source(tile_cache.DEFAULT_TILE_SOURCE), tile_cache.HttpTileSource)
+
+    cache = tile_cache.TileCache(source, result_cache.DiskBackend(str(tmp_path / "cache"), 1 << 20))
+    assert cache.get_many([(3, 4, 5), (3, 4, 6)]) == {(3, 4, 5): b"tile-345", (3, 4, 6): None}
+    # Cached tiles survive the source and a restart
+    (tiles_dir / "5.png").unlink()
+    assert cache.get(3, 4, 5) == b"tile-345"
+    restarted = tile_cache.TileCache(source, result_cache.DiskBackend(str(tmp_path / "cache"), 1 << 20))
+    assert restarted.get(3, 4, 5) == b"tile-345"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["failures"]) == (1, 2, 1)
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    source = CountingSource()
+    tile_size = len(source.fetch(0, 0, 0))
+    backend = result_cache.DiskBackend(str(tmp_path), 2 * tile_size + 200)
+    cache = tile_cache.TileCache(source, backend)
+    cache.get(1, 0, 0)
+    cache.get(1, 0, 1)
+    cache.get(1, 0, 0)
+    cache.get(1, 1, 0)
+    assert backend.evictions == 1
+    source.requests.clear()
+    cache.get_many([(1, 0, 0), (1, 1, 0), (1, 0, 1)])
+    assert source.requests == [(1, 0, 1)]
+
+
+def test_concurrent_misses_fetch_each_tile_once(tmp_path):
+    source = CountingSource(delay=0.05)
+    cache = tile_cache.TileCache(source, result_cache.DiskBackend(str(tmp_path), 1 << 20), workers=4)
+    tiles = [(5, x, y) for x in range(3) for y in range(3)]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_many(tiles))) for _ in range(3)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(source.requests) == tiles
+    assert all(all(r.values()) for r in results)
+    # 9 tiles on 4 workers take 3 rounds, not 9 sequential requests
+    assert time.time() - start < 9 * 0.05
+
+
+def test_cached_static_map_renders_from_cache(tmp_path):
+    source = CountingSource()
+    cache = tile_cache.TileCache(source, result_cache.DiskBackend(str(tmp_path), 1 << 22))
+
+    def render():
+        m = tile_cache.CachedStaticMap(400, 300, 10, tile_cache=cache)
+        m.add_line(Line([(8.0, 47.0), (8.01, 47.01)], 'blue', 3))
+        return m.render()
+
+    image = render()
+    assert image.size == (400, 300)
+    fetched = len(source.requests)
+    assert fetched > 0
+    render()
+    assert len(source.requests) == fetched
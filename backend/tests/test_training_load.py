@@ -0,0 +1,193 @@
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.model import ActivityTable, TrainingLoadSeries
+from app.auth import crypto
+from app.services import data_processing, training_load
+
+
+def ride(watts, seconds, heart_rate=None, start='2025-01-01'):
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=seconds, freq='1s'),
+        'power': np.broadcast_to(watts, seconds).astype(float),
+    })
+    if heart_rate is not None:
+        df['heart_rate'] = float(heart_rate)
+    return df
+
+
+def reference_fold(days, loads, start, end):
+    """CTL/ATL by the day-by-day recurrence."""
+    daily = {}
+    for day, load in zip(days, loads):
+        daily[day] = daily.get(day, 0.0) + load
+    ctl = atl = 0.0
+    out = {}
+    day = min(days)
+    while day <= end:
+        tss = daily.get(day, 0.0)
+        ctl += (tss - ctl) / training_load.CTL_DAYS
+        atl += (tss - atl) / training_load.ATL_DAYS
+        if day >= start:
+            out[day.isoformat()] = (ctl, atl)
+        day += timedelta(days=1)
+    return out
+
+
+def test_normalized_power_matches_pandas_rolling():
+    rng = np.random.default_rng(0)
+    power_1hz = rng.normal(200, 80, 3600).clip(0)
+    expected = (pd.Series(power_1hz).rolling(30).mean().dropna() ** 4).mean() ** 0.25
+    assert abs(training_load.normalized_power(power_1hz) - expected) < 1e-9
+    assert training_load.normalized_power(np.full(20, 200.0)) is None
+
+
+def test_one_hour_at_threshold_is_100_tss():
+    np_watts, intensity, tss = training_load.compute_activity_load(ride(250.0, 3600), ftp=250)
+    assert abs(np_watts - 250.0) < 1e-9
+    assert abs(intensity - 1.0) < 1e-9
+    assert abs(tss - 100.0) < 1e-6
+
+    # Heart rate fallback without FTP
+    np_watts, intensity, tss = training_load.compute_activity_load(
+        ride(0.0, 3600, heart_rate=160), ftp=None, threshold_heartrate=160)
+    assert np_watts is None and intensity is None
+    assert abs(tss - 100.0) < 1e-6
+    assert training_load.compute_activity_load(ride(0.0, 3600), ftp=250) == (None, None, None)
+
+    # The Go FIT parser produces datetime64[s] timestamps
+    seconds_ride = ride(250.0, 3600).astype({'timestamp': 'datetime64[s]'})
+    np_watts, intensity, tss = training_load.compute_activity_load(seconds_ride, ftp=250)
+    assert abs(np_watts - 250.0) < 1e-9
+    assert abs(tss - 100.0) < 1e-6
+
+
+def create_load_activity(dbsession, user_id, day, tss):
+    activity = ActivityTable(
+        activity_id=crypto.generate_random_base64_string(16),
+        name="Load", owner_id=user_id, activity_type="recorded",
+        distance=1.0, active_time=3600.0, elevation_gain=0.0,
+        date=datetime.combine(day, datetime.min.time()) + timedelta(hours=9),
+        last_modified=datetime.now(),
+        data=data_processing.serialize_dataframe(ride(0.0, 10)),
+        tags=None, static_map=None, tss=tss)
+    dbsession.add(activity)
+    dbsession.commit()
+    return activity
+
+
+def test_incremental_updates_match_refold(test_user, dbsession):
+    rng = np.random.default_rng(1)
+    first = date(2025, 1, 1)
+    activities = []
+    # Out of order adds exercise prepending and extending the stored series
+    for offset in rng.permutation(120)[:40]:
+        activity = create_load_activity(dbsession, test_user.id, first + timedelta(days=int(offset)), float(rng.uniform(20, 150)))
+        training_load.add_activity_load(dbsession, activity)
+        activities.append(activity)
+    for activity in activities[:10]:
+        training_load.remove_activity_load(dbsession, activity)
+    kept = activities[10:]
+
+    start, end = first + timedelta(days=30), first + timedelta(days=200)
+    expected = reference_fold([a.date.date() for a in kept], [a.tss for a in kept], start, end)
+    records = training_load.load_between(dbsession, test_user.id, start, end)
+    assert [r['date'] for r in records] == list(expected)
+    for r in records:
+        np.testing.assert_allclose((r['ctl'], r['atl']), expected[r['date']], atol=1e-9)
+    assert r['tsb'] == records[-2]['ctl'] - records[-2]['atl']
+
+    incremental = training_load.load_between(dbsession, test_user.id, start, end)
+    for activity in activities[:10]:
+        dbsession.delete(activity)
+    training_load.rebuild_user_load(dbsession, test_user)
+    rebuilt = training_load.load_between(dbsession, test_user.id, start, end)
+    for a, b in zip(incremental, rebuilt):
+        np.testing.assert_allclose((a['ctl'], a['atl'], a['tss']), (b['ctl'], b['atl'], b['tss']), atol=1e-9)
+
+
+def test_training_load_endpoint_and_delete(auth_headers, test_user, dbsession, client):
+    today = datetime.utcnow().date()
+    activity = create_load_activity(dbsession, test_user.id, today - timedelta(days=3), 100.0)
+    training_load.add_activity_load(dbsession, activity)
+    dbsession.commit()
+
+    response = client.get("/users/me/stats/training-load", headers=auth_headers)
+    assert response.status_code == 200
+    records = response.json()
+    assert len(records) == 90
+    assert records[-1]['date'] == today.isoformat()
+    loaded = {r['date']: r for r in records}[(today - timedelta(days=3)).isoformat()]
+    assert loaded['tss'] == 100.0
+    assert abs(loaded['ctl'] - 100.0 / training_load.CTL_DAYS) < 1e-9
+
+    response = client.delete(f"/activity/{activity.activity_id}", headers=auth_headers)
+    assert response.status_code == 200
+    dbsession.expire_all()
+    records = client.get("/users/me/stats/training-load", headers=auth_headers).json()
+    assert max(r['ctl'] for r in records) < 1e-9
+
+    response = client.get("/users/me/stats/training-load", headers=auth_headers,
+                          params={"start_date": "2025-02-01", "end_date": "2025-01-01"})
+    assert response.status_code == 400
+
+
+def test_upload_stores_training_load(auth_headers, test_user, dbsession, client):
+    test_user.ftp = 250
+    dbsession.add(test_user)
+    dbsession.commit()
+    fit_file_path = Path(__file__).resolve().parent.parent.parent / "examples" / "2024-11-12-065535-ELEMNT ROAM 8055-155-0.fit"
+    with open(fit_file_path, "rb") as f:
+        response = client.post("/upload_activity", headers=auth_headers, files={"file": ("test.fit", f, "application/octet-stream")})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tss"] > 0
+    assert abs(data["intensity_factor"] - data["normalized_power"] / 250) < 1e-9
+    dbsession.expire_all()
+    series = dbsession.get(TrainingLoadSeries, test_user.id)
+    assert abs(np.frombuffer(series.daily_tss).sum() - data["tss"]) < 1e-9
+
+
+def test_rebuild_recomputes_tss_after_threshold_change(test_user, dbsession):
+    test_user.ftp = 250
+    activity = create_load_activity(dbsession, test_user.id, date(2025, 1, 1), None)
+    activity.data = data_processing.serialize_dataframe(ride(250.0, 3600))
+    training_load.apply_activity_load(activity, ride(250.0, 3600), test_user)
+    assert activity.tss_ftp == 250
+    dbsession.add(activity)
+    dbsession.commit()
+    assert abs(activity.tss - 100.0) < 1e-6
+
+    # Unchanged thresholds keep the stored TSS, a new FTP recomputes it
+    activity.tss = 50.0
+    training_load.rebuild_user_load(dbsession, test_user)
+    assert activity.tss == 50.0
+    test_user.ftp = 200
+    training_load.rebuild_user_load(dbsession, test_user)
+    assert abs(activity.tss - 100.0 * (250 / 200) ** 2) < 1e-6
+    assert activity.tss_ftp == 200
+    series = dbsession.get(TrainingLoadSeries, test_user.id)
+    assert abs(np.frombuffer(series.daily_tss).sum() - activity.tss) < 1e-9
+
+
+def test_recalculate_after_ftp_change_refreshes_activity(auth_headers, test_user, dbsession, client):
+    test_user.ftp = 250
+    activity = create_load_activity(dbsession, test_user.id, date(2025, 1, 1), None)
+    activity.data = data_processing.serialize_dataframe(ride(250.0, 3600))
+    training_load.apply_activity_load(activity, ride(250.0, 3600), test_user)
+    dbsession.add(activity)
+    dbsession.commit()
+    url = f"/activity/{activity.activity_id}"
+    first = client.get(url, headers=auth_headers)
+    assert abs(first.json()["activity_base"]["tss"] - 100.0) < 1e-6
+
+    assert client.put("/user/me", headers=auth_headers, json={"ftp": 200}).status_code == 200
+    assert client.post("/users/me/stats/recalculate", headers=auth_headers).status_code == 200
+    # The old ETag no longer matches and the cached response is not served
+    response = client.get(url, headers={**auth_headers, "If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    assert response.headers["etag"] != first.headers["etag"]
+    assert abs(response.json()["activity_base"]["tss"] - 100.0 * (250 / 200) ** 2) < 1e-6